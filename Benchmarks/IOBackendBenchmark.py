@@ -0,0 +1,55 @@
+"""
+Compares the streaming and memory-mapped I/O backends of CryptoManager for several file sizes.
+
+Run from the repository root:
+    python -m Benchmarks.IOBackendBenchmark --sizes 1 16 64 256 --repeat 3
+"""
+import argparse
+import json
+import os
+import tempfile
+from time import perf_counter
+
+from Core.CryptoManager import CryptoManager
+
+
+def _time_backend(backend: str, input_path: str, repeat: int) -> dict:
+    """Returns the best encryption and decryption throughput of a backend in MB/s."""
+    size_mb = os.path.getsize(input_path) / (1024 * 1024)
+    best_encrypt = best_decrypt = float('inf')
+    output_dir = os.path.dirname(input_path)
+    for _ in range(repeat):
+        manager = CryptoManager(io_backend=backend, fsync_output=False)
+        start = perf_counter()
+        encrypted_path = manager.encrypt(input_path, 'benchmark', 1, '')
+        best_encrypt = min(best_encrypt, perf_counter() - start)
+
+        start = perf_counter()
+        decrypted_path = manager.decrypt(encrypted_path, 'benchmark', output_dir)
+        best_decrypt = min(best_decrypt, perf_counter() - start)
+        os.remove(encrypted_path)
+        os.remove(decrypted_path)
+    return {'encrypt_mb_per_s': round(size_mb / best_encrypt, 1), 'decrypt_mb_per_s': round(size_mb / best_decrypt, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the stream and mmap I/O backends.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 16, 64, 256], help='File sizes to test in MiB.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per backend and size, the best one is reported.')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            input_path = os.path.join(directory, 'input.bin')
+            with open(input_path, 'wb') as input_file:
+                for _ in range(size):
+                    input_file.write(os.urandom(1024 * 1024))
+            results.append({'size_mb': size,
+                            'stream': _time_backend('stream', input_path, args.repeat),
+                            'mmap': _time_backend('mmap', input_path, args.repeat)})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Measures GUI startup: importing UI.GUI, building the window and its first render,
+and the cost of the icon lookups done on every progress tick with and without the AssetCache.
+
+Every startup run happens in a fresh interpreter so module and image caches start cold.
+The render step needs a display, it is reported as null without one.
+
+Run from the repository root:
+    python -m Benchmarks.StartupBenchmark --repeat 5 --files 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def _child() -> None:
+    """Runs in a fresh interpreter, prints the timings of one startup as JSON."""
+    timings = {}
+    start = perf_counter()
+    import customtkinter  # noqa: F401
+    timings['import_customtkinter_s'] = perf_counter() - start
+    start = perf_counter()
+    import UI.GUI as GUI
+    timings['import_gui_s'] = perf_counter() - start
+
+    try:
+        start = perf_counter()
+        app = GUI.GUI()
+        timings['build_s'] = perf_counter() - start
+        start = perf_counter()
+        app.update_idletasks()
+        app.update()
+        timings['first_render_s'] = perf_counter() - start
+        timings['images_decoded'] = len(app.assets)
+        app.destroy()
+    except Exception as e:  # Typically TclError when there is no display
+        timings['build_s'] = timings['first_render_s'] = None
+        timings['render_error'] = str(e)
+    print(json.dumps(timings))
+
+
+def _startup(repeat: int) -> dict:
+    """Runs the startup in fresh interpreters and returns the median of every timing."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-m', 'Benchmarks.StartupBenchmark', '--child'],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+
+    results = {}
+    for key, value in runs[0].items():
+        if isinstance(value, float):
+            results[key] = round(statistics.median(run[key] for run in runs), 4)
+        else:
+            results[key] = value
+    return results
+
+
+def _refresh(files: int, ticks: int) -> dict:
+    """Times the icon lookups of one progress tick per file, decoding every time versus the shared cache."""
+    import customtkinter as ctk
+    from PIL import Image
+
+    from UI.AssetCache import AssetCache
+
+    cache = AssetCache()
+    names = ['Working.png', 'Done.png', 'X.png']
+
+    start = perf_counter()
+    for tick in range(ticks):
+        for _ in range(files):
+            # Decoded like AssetCache.image does, Image.open alone only reads the png header
+            with Image.open(os.path.join(cache.icon_dir, names[tick % 3])) as source:
+                source.load()
+                ctk.CTkImage(light_image=source.copy(), size=cache.size)
+    uncached = (perf_counter() - start) / ticks
+
+    start = perf_counter()
+    for tick in range(ticks):
+        for _ in range(files):
+            cache.icon(names[tick % 3])
+    cached = (perf_counter() - start) / ticks
+
+    return {'files': files, 'uncached_tick_s': round(uncached, 6), 'cached_tick_s': round(cached, 6),
+            'speedup': round(uncached / cached, 1) if cached else None}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark GUI import, first render and icon refresh cost.')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreter startups, the median is reported.')
+    parser.add_argument('--files', type=int, default=500, help='Files in the list for the refresh benchmark.')
+    parser.add_argument('--ticks', type=int, default=10, help='Progress ticks timed in the refresh benchmark.')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child()
+        return
+    results = {'startup': _startup(args.repeat), 'refresh': _refresh(args.files, args.ticks)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Measures batch throughput, per-file latency, peak memory and the key derivation share of Core.CryptoManager
+on reproducible synthetic corpora, for every combination of worker count, buffer size and iteration count.
+
+Corpora:
+    tiny  - many files of a few KiB, dominated by per-file overhead and key derivation
+    huge  - a few large files, dominated by the cipher and I/O
+    mixed - log-normally distributed sizes, closer to a real home directory
+
+Every configuration runs headless through Core.BatchRunner, the engine behind the CLI, in a fresh interpreter,
+so peak RSS and key caches do not leak between configurations. The I/O backend is pinned per run, 'stream' by
+default, so --buffer-sizes applies to every file instead of only to those below the memory-mapping threshold. Files are generated from a seeded generator,
+the same arguments give the same corpus. Results are written as JSON to compare versions.
+
+Run from the repository root:
+    python -m Benchmarks.ThroughputBenchmark --corpus tiny mixed --workers 1 8 --iterations 100000 --output results.json
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from time import perf_counter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+CORPORA = ('tiny', 'huge', 'mixed')
+CHUNK_SIZE = 1024 * 1024
+
+
+def make_corpus(name: str, directory: str, args: argparse.Namespace) -> dict:
+    """
+    Writes a synthetic corpus of random, incompressible files.
+
+    Parameters:
+        name                 (str): 'tiny', 'huge' or 'mixed'.
+        directory            (str): Empty directory the files are written to.
+        args (argparse.Namespace): Corpus sizes and the seed.
+
+    Returns:
+        dict: name, files and bytes of the corpus.
+    """
+    rng = random.Random(str(args.seed) + name)
+    if name == 'tiny':
+        sizes = [rng.randint(256, args.tiny_kib * 1024) for _ in range(args.tiny_files)]
+    elif name == 'huge':
+        sizes = [args.huge_mib * 1024 * 1024] * args.huge_files
+    else:
+        # Median of 64 KiB with a long tail, capped so a single outlier cannot dominate the run
+        sizes = [min(int(rng.lognormvariate(11.1, 2.0)), args.mixed_cap_mib * 1024 * 1024) for _ in range(args.mixed_files)]
+
+    for index, size in enumerate(sizes):
+        # Spread over sub-directories like real trees, and keep directory listings small
+        sub_directory = os.path.join(directory, str(index // 1000))
+        os.makedirs(sub_directory, exist_ok=True)
+        with open(os.path.join(sub_directory, 'file' + str(index) + '.bin'), 'wb') as output_file:
+            remaining = size
+            while remaining:
+                chunk = min(CHUNK_SIZE, remaining)
+                output_file.write(rng.randbytes(chunk))
+                remaining -= chunk
+    return {'name': name, 'files': len(sizes), 'bytes': sum(sizes)}
+
+
+def _percentile(values: list[float], percent: float) -> float | None:
+    """Returns the nearest-rank percentile of values, None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(percent / 100 * len(ordered)) - 1))]
+
+
+def _peak_rss() -> int | None:
+    """Returns the peak resident set size of this process in bytes, None where the resource module is missing."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _KDFTimer:
+    """Wraps the key derivation function used by CryptoManager and BatchKey and sums the time spent in it."""
+    def __init__(self):
+        self.derivations = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def install(self) -> None:
+        import Core.BatchKey
+        import Core.CryptoManager
+
+        def _timed(function):
+            def _wrapper(*args, **kwargs):
+                start = perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    elapsed = perf_counter() - start
+                    with self._lock:
+                        self.derivations += 1
+                        self.seconds += elapsed
+            return _wrapper
+
+        for module in (Core.CryptoManager, Core.BatchKey):
+            module.derive_key = _timed(module.derive_key)
+
+    def reset(self) -> dict:
+        """Returns the totals so far and starts counting from zero."""
+        with self._lock:
+            totals = {'derivations': self.derivations, 'seconds': self.seconds}
+            self.derivations, self.seconds = 0, 0.0
+        return totals
+
+
+def _run_mode(mode: str, input_dir: str, output_dir: str, config: dict, kdf: _KDFTimer) -> dict:
+    """Runs one batch and returns its throughput, latency and time split."""
+    from Core.BatchRunner import BatchRunner, collect_files
+
+    jobs = collect_files([input_dir], mode, recursive=True, output_dir=output_dir)
+    runner = BatchRunner(mode, 'benchmark', config['iterations'], config['workers'], not config['per_file_kdf'],
+                         {'buffer_size': config['buffer_size'], 'io_backend': config['io_backend'], 'kdf': config['kdf'],
+                          'fsync_output': False})
+    kdf.reset()
+    start = perf_counter()
+    results = list(runner.run(jobs))
+    wall = perf_counter() - start
+    kdf_totals = kdf.reset()
+
+    failed = [result for result in results if result['status'] != 'ok']
+    if failed:
+        raise RuntimeError(mode + ' failed for ' + failed[0]['input'] + ': ' + failed[0].get('error', ''))
+    latencies = [result['seconds'] for result in results]
+    payload = sum(os.path.getsize(file_path) for file_path, _ in jobs)
+    # Busy time across all workers. A shared batch key is derived lazily inside the first file, so its derivation
+    # is already part of that file's latency
+    busy = sum(latencies)
+    return {'files': len(results), 'bytes': payload, 'seconds': round(wall, 4),
+            'mb_per_s': round(payload / (1024 * 1024) / wall, 2) if wall else None,
+            'files_per_s': round(len(results) / wall, 1) if wall else None,
+            'latency_p50_s': _percentile(latencies, 50), 'latency_p99_s': _percentile(latencies, 99),
+            'latency_max_s': max(latencies, default=None),
+            'kdf': {'derivations': kdf_totals['derivations'], 'seconds': round(kdf_totals['seconds'], 4),
+                    'share': round(kdf_totals['seconds'] / busy, 4) if busy else None},
+            'cipher_io_seconds': round(max(0.0, busy - kdf_totals['seconds']), 4),
+            'peak_rss_bytes': _peak_rss()}
+
+
+def _child(config: dict) -> None:
+    """Runs in a fresh interpreter, encrypts and decrypts a corpus with one configuration and prints the results."""
+    kdf = _KDFTimer()
+    kdf.install()
+    work_dir = tempfile.mkdtemp(prefix='throughput-', dir=config['scratch'])
+    try:
+        encrypted_dir, decrypted_dir = os.path.join(work_dir, 'encrypted'), os.path.join(work_dir, 'decrypted')
+        results = {'encrypt': _run_mode('encrypt', config['corpus'], encrypted_dir, config, kdf)}
+        for mode in config['modes']:
+            if mode != 'encrypt':
+                results[mode] = _run_mode(mode, encrypted_dir, decrypted_dir, config, kdf)
+        if 'encrypt' not in config['modes']:
+            del results['encrypt']
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(json.dumps(results))
+
+
+def _environment() -> dict:
+    """Describes the machine and versions the results were measured with."""
+    try:
+        import Crypto
+        pycryptodome = Crypto.__version__
+    except (ImportError, AttributeError):
+        pycryptodome = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': platform.python_version(), 'pycryptodome': pycryptodome, 'platform': platform.platform(),
+            'machine': platform.machine(), 'cpu_count': os.cpu_count(), 'commit': commit}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark CryptoManager throughput, latency and key derivation cost.')
+    parser.add_argument('--corpus', nargs='+', choices=CORPORA, default=list(CORPORA), help='Corpora to run.')
+    parser.add_argument('--modes', nargs='+', choices=('encrypt', 'decrypt', 'verify'), default=['encrypt', 'decrypt'],
+                        help='Operations to time. Encryption always runs to produce the input of the others.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 4], help='Worker counts to test.')
+    parser.add_argument('--buffer-sizes', type=int, nargs='+', default=[64], metavar='KIB', help='Buffer sizes to test in KiB.')
+    parser.add_argument('--io-backends', nargs='+', choices=('stream', 'mmap', 'pipeline', 'auto'), default=['stream'],
+                        help='I/O backends to test. Buffer sizes only apply to stream and pipeline.')
+    parser.add_argument('--iterations', type=int, nargs='+', default=[100000],
+                        help='Key derivation work factors to test, iterations or the scrypt cost N.')
+    parser.add_argument('--kdf', choices=('pbkdf2', 'pbkdf2-sha256', 'scrypt'), default='pbkdf2', help='Key derivation function.')
+    parser.add_argument('--per-file-kdf', action='store_true', help='Derive a key per file instead of once per batch.')
+    parser.add_argument('--tiny-files', type=int, default=2000, help='Files in the tiny corpus.')
+    parser.add_argument('--tiny-kib', type=int, default=16, help='Largest file of the tiny corpus in KiB.')
+    parser.add_argument('--huge-files', type=int, default=2, help='Files in the huge corpus.')
+    parser.add_argument('--huge-mib', type=int, default=256, help='Size of every file of the huge corpus in MiB.')
+    parser.add_argument('--mixed-files', type=int, default=500, help='Files in the mixed corpus.')
+    parser.add_argument('--mixed-cap-mib', type=int, default=64, help='Largest file of the mixed corpus in MiB.')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the corpus generator.')
+    parser.add_argument('--scratch', default=None, help='Directory for corpora and outputs. Defaults to the system temp dir.')
+    parser.add_argument('--output', default=None, help='Write the results to this file instead of stdout.')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(json.loads(args.child))
+        return
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix='throughput-', dir=args.scratch) as scratch:
+        for name in args.corpus:
+            corpus_dir = os.path.join(scratch, name)
+            corpus = make_corpus(name, corpus_dir, args)
+            for workers in args.workers:
+                for buffer_kib, io_backend in itertools.product(args.buffer_sizes, args.io_backends):
+                    for iterations in args.iterations:
+                        config = {'corpus': corpus_dir, 'scratch': scratch, 'modes': args.modes, 'workers': workers,
+                                  'buffer_size': buffer_kib * 1024, 'io_backend': io_backend, 'iterations': iterations,
+                                  'per_file_kdf': args.per_file_kdf, 'kdf': args.kdf}
+                        output = subprocess.run([sys.executable, '-m', 'Benchmarks.ThroughputBenchmark', '--child',
+                                                 json.dumps(config)], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+                        runs.append({'corpus': corpus, 'workers': workers, 'buffer_kib': buffer_kib, 'io_backend': io_backend,
+                                     'iterations': iterations, 'kdf': args.kdf, 'per_file_kdf': args.per_file_kdf,
+                                     'results': json.loads(output.splitlines()[-1])})
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    report = json.dumps({'environment': _environment(), 'seed': args.seed, 'runs': runs}, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
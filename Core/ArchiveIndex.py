@@ -0,0 +1,290 @@
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from Crypto.Cipher import AES
+
+from Core.BatchRunner import collect_files
+from Core.Codecs import get_codec
+from Core.FileHeader import FileHeader
+from Core.KDF import KDF_NAMES, KDF_SCRYPT, kdf_name, measure
+from Core.Segments import SegmentLayout
+
+HEADER_PROBE_SIZE = 512     # Bytes read at once by inspect_file, enough for every header this app writes
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path           TEXT PRIMARY KEY,
+    size           INTEGER NOT NULL,
+    mtime_ns       INTEGER NOT NULL,
+    version        INTEGER,
+    file_ext       TEXT,
+    iterations     INTEGER,
+    salt           TEXT,
+    batch          INTEGER,
+    segment_size   INTEGER,
+    header_length  INTEGER,
+    plaintext_size INTEGER,
+    error          TEXT,
+    kdf            INTEGER,
+    codec          INTEGER
+);
+'''
+_INDEXES = '''
+DROP INDEX IF EXISTS files_key;
+CREATE INDEX IF NOT EXISTS files_kdf_key ON files (kdf, salt, iterations);
+'''
+_COLUMNS = ('path', 'size', 'mtime_ns', 'version', 'file_ext', 'iterations', 'salt', 'batch',
+            'segment_size', 'header_length', 'plaintext_size', 'error', 'kdf', 'codec')
+# Columns added after the first release, with their type, added to older databases on open
+_ADDED_COLUMNS = (('kdf', 'INTEGER'), ('codec', 'INTEGER'))
+
+
+def inspect_file(path: str, tag_size: int = 16) -> dict:
+    """
+    Reads only the header of an encrypted file and describes it, without touching the payload.
+
+    Parameters:
+        path     (str): Path of the encrypted file.
+        tag_size (int): Size of the GCM tags, used to compute the plaintext size.
+
+    Returns:
+        dict: path, size, mtime_ns, version, file_ext, iterations, salt (hex), batch, segment_size, header_length,
+              plaintext_size, kdf and codec ids, and error, which is set instead of the header fields if the file
+              cannot be parsed.
+    """
+    record = dict.fromkeys(_COLUMNS)
+    record['path'] = path
+    try:
+        with open(path, 'rb', buffering=0) as input_file:
+            stat = os.fstat(input_file.fileno())
+            record['size'], record['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+            probe = input_file.read(HEADER_PROBE_SIZE)
+            try:
+                header = FileHeader.from_bytes(probe)
+            except EOFError:
+                if len(probe) < HEADER_PROBE_SIZE:
+                    raise
+                # Header with unusually large options, fall back to reading it field by field
+                input_file.seek(0)
+                header = FileHeader.from_file(input_file)
+    except (OSError, EOFError, ValueError, UnicodeDecodeError, IndexError) as e:
+        record['size'] = record['size'] or 0
+        record['mtime_ns'] = record['mtime_ns'] or 0
+        record['error'] = str(e) or type(e).__name__
+        return record
+
+    record.update({'version': header.version, 'file_ext': header.file_ext, 'iterations': header.iterations,
+                   'salt': header.salt.hex(), 'batch': int(header.key_salt is not None),
+                   'segment_size': header.segment_size, 'header_length': header.length, 'kdf': header.kdf,
+                   'codec': header.codec})
+    try:
+        if header.segment_size:
+            layout = SegmentLayout.from_encrypted_size(header.length, header.segment_size, tag_size, record['size'])
+            record['plaintext_size'] = layout.plaintext_size
+        elif record['size'] >= header.length + tag_size:
+            record['plaintext_size'] = record['size'] - header.length - tag_size
+        else:
+            record['error'] = 'File is too short for its header.'
+    except ValueError as e:
+        record['error'] = str(e)
+    return record
+
+
+def measure_rates(kdfs: list[int] | None = None, iterations: int = 20000, scrypt_cost: int = 2 ** 12,
+                  cipher_bytes: int = 32 * 1024 * 1024) -> dict:
+    """
+    Measures this machine's key derivation and cipher speed, for run time estimates.
+
+    Key derivation time grows linearly with the work factor for every supported function, the iterations of
+    PBKDF2 and the cost N of scrypt, so one short derivation per function gives its rate.
+
+    Parameters:
+        kdfs     (list[int]): Ids of the key derivation functions to measure. None measures all of them.
+        iterations     (int): PBKDF2 iterations of the measurement.
+        scrypt_cost    (int): scrypt cost N of the measurement.
+        cipher_bytes   (int): Bytes ciphered to measure the cipher.
+
+    Returns:
+        dict: kdf_rates, work factor units per second by key derivation function name, and cipher_bytes_per_s.
+    """
+    kdf_rates = {}
+    for kdf in sorted(set(KDF_NAMES.values()) if kdfs is None else set(kdfs)):
+        work_factor = scrypt_cost if kdf == KDF_SCRYPT else iterations
+        kdf_rates[kdf_name(kdf)] = round(work_factor / max(measure(kdf, work_factor), 1e-9))
+
+    buffer = bytearray(1024 * 1024)
+    cipher = AES.new(bytes(32), AES.MODE_GCM, bytes(12))
+    start = perf_counter()
+    for _ in range(max(1, cipher_bytes // len(buffer))):
+        cipher.decrypt(buffer, output=buffer)
+    cipher_rate = max(1, cipher_bytes // len(buffer)) * len(buffer) / max(perf_counter() - start, 1e-9)
+    return {'kdf_rates': kdf_rates, 'cipher_bytes_per_s': round(cipher_rate)}
+
+
+def _kdf_label(kdf: int) -> str:
+    """Returns the name of a key derivation function id, or the id for functions this version does not know."""
+    try:
+        return kdf_name(kdf)
+    except ValueError:
+        return str(kdf)
+
+
+def _codec_label(codec: int) -> str:
+    """Returns the name of a codec id, 'none' for uncompressed files, or the id for codecs that are not registered."""
+    if not codec:
+        return 'none'
+    try:
+        return get_codec(codec).name
+    except ValueError:
+        return str(codec)
+
+
+class ArchiveIndex:
+    """
+    Persistent SQLite index of the headers of encrypted files.
+
+    update() stats every file and only reads the headers of new or changed files, so re-indexing a large archive
+    costs little more than a directory walk. The index answers planning questions without opening any payload:
+    which files share a key derivation, how many bytes a job covers and how long it should take.
+
+    Attributes:
+        path     (str): Path of the SQLite database.
+        tag_size (int): Size of the GCM tags, used to compute plaintext sizes.
+    """
+    def __init__(self, path: str, tag_size: int = 16):
+        """
+        Initializes the ArchiveIndex, creating the database if needed.
+
+        Parameters:
+            path     (str): Path of the SQLite database.
+            tag_size (int): Size of the GCM tags, used to compute plaintext sizes.
+        """
+        self.path = path
+        self.tag_size = tag_size
+        self._db = sqlite3.connect(path)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(_SCHEMA)
+        self._migrate()
+        self._db.executescript(_INDEXES)
+
+    def _migrate(self) -> None:
+        """Adds the columns of newer versions to a database created by an older one."""
+        existing = {row['name'] for row in self._db.execute('PRAGMA table_info(files)')}
+        missing = [(name, column_type) for name, column_type in _ADDED_COLUMNS if name not in existing]
+        if not missing:
+            return
+        with self._db:
+            for name, column_type in missing:
+                self._db.execute('ALTER TABLE files ADD COLUMN ' + name + ' ' + column_type)
+            # The headers were read without these fields, make the next update read them again
+            self._db.execute('UPDATE files SET mtime_ns = -1')
+
+    def close(self) -> None:
+        """Closes the database."""
+        self._db.close()
+
+    def __enter__(self) -> 'ArchiveIndex':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def update(self, paths: list[str], recursive: bool = True, workers: int = 8) -> dict:
+        """
+        Indexes the .encrypted files found in paths and drops entries of files that disappeared from them.
+
+        Parameters:
+            paths (list[str]): Files and/or directories to index.
+            recursive  (bool): Walk sub-directories of directory inputs.
+            workers     (int): Threads reading headers in parallel, which helps on network file systems.
+
+        Returns:
+            dict: Counts of scanned, indexed (new or changed), unchanged, removed and unreadable files.
+        """
+        files = [os.path.abspath(file_path) for file_path, _ in collect_files(paths, 'decrypt', recursive)]
+        known = {row['path']: (row['size'], row['mtime_ns']) for row in self._db.execute('SELECT path, size, mtime_ns FROM files')}
+
+        changed = []
+        for file_path in files:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            if known.get(file_path) != (stat.st_size, stat.st_mtime_ns):
+                changed.append(file_path)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            records = list(executor.map(lambda file_path: inspect_file(file_path, self.tag_size), changed))
+
+        roots = [os.path.join(os.path.abspath(path), '') for path in paths if os.path.isdir(path)]
+        found = set(files)
+        removed = [path for path in known if path not in found and any(path.startswith(root) for root in roots)]
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO files (' + ', '.join(_COLUMNS) + ') VALUES ('
+                                 + ', '.join('?' * len(_COLUMNS)) + ')',
+                                 [tuple(record[column] for column in _COLUMNS) for record in records])
+            self._db.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in removed])
+        return {'scanned': len(files), 'indexed': len(records), 'unchanged': len(files) - len(changed),
+                'removed': len(removed), 'errors': sum(1 for record in records if record['error'])}
+
+    def files(self) -> list[dict]:
+        """Returns every indexed file."""
+        return [dict(row) for row in self._db.execute('SELECT * FROM files ORDER BY path')]
+
+    def summary(self) -> dict:
+        """Returns file and byte totals, and file counts by format version, extension, segmentation, key derivation and codec."""
+        row = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(plaintext_size), 0), '
+                               'COUNT(error) FROM files').fetchone()
+
+        def _counts(column: str) -> dict:
+            query = 'SELECT ' + column + ', COUNT(*) FROM files WHERE error IS NULL GROUP BY 1 ORDER BY 2 DESC'
+            return {str(key): count for key, count in self._db.execute(query)}
+
+        return {'files': row[0], 'encrypted_bytes': row[1], 'plaintext_bytes': row[2], 'unreadable': row[3],
+                'versions': _counts('version'), 'extensions': _counts('file_ext'),
+                'segmented': _counts('segment_size > 0'),
+                'kdfs': {_kdf_label(int(kdf)) if kdf.isdigit() else 'unknown': count for kdf, count in _counts('kdf').items()},
+                'codecs': {_codec_label(int(codec)) if codec.isdigit() else 'unknown': count
+                           for codec, count in _counts('codec').items()}}
+
+    def key_groups(self) -> list[dict]:
+        """
+        Groups the files by (kdf, salt, iterations), the inputs of the expensive key derivation.
+
+        All files of a group are unlocked by a single derivation when processed through a shared KeyCache,
+        so the number of groups, not the number of files, drives the key derivation cost of a job.
+
+        Returns:
+            list[dict]: kdf (name), salt, iterations, files and plaintext_bytes of every group, largest group first.
+        """
+        query = ('SELECT kdf, salt, iterations, COUNT(*) AS files, SUM(plaintext_size) AS plaintext_bytes FROM files '
+                 'WHERE error IS NULL GROUP BY kdf, salt, iterations ORDER BY files DESC, plaintext_bytes DESC')
+        return [{**dict(row), 'kdf': _kdf_label(row['kdf'] or 0)} for row in self._db.execute(query)]
+
+    def kdfs(self) -> list[int]:
+        """Returns the ids of the key derivation functions used by the indexed files."""
+        return [row[0] or 0 for row in self._db.execute('SELECT DISTINCT kdf FROM files WHERE error IS NULL')]
+
+    def estimate(self, kdf_rates: dict, cipher_bytes_per_s: float, workers: int = 1) -> dict:
+        """
+        Estimates the run time of decrypting or verifying every indexed file.
+
+        Parameters:
+            kdf_rates           (dict): Work factor units per second on one core by key derivation function name,
+                                        see measure_rates.
+            cipher_bytes_per_s (float): Cipher throughput on one core, see measure_rates.
+            workers              (int): Files processed in parallel.
+
+        Returns:
+            dict: key_derivations, kdf_seconds, cipher_seconds and total_seconds.
+        """
+        groups = self.key_groups()
+        # Groups of functions that were not measured, or whose files are unreadable, cannot be estimated
+        kdf_seconds = sum(group['iterations'] / kdf_rates[group['kdf']] for group in groups if group['kdf'] in kdf_rates)
+        cipher_seconds = sum(group['plaintext_bytes'] or 0 for group in groups) / cipher_bytes_per_s
+        workers = max(1, workers)
+        return {'key_derivations': len(groups), 'kdf_seconds': round(kdf_seconds, 3),
+                'cipher_seconds': round(cipher_seconds, 3),
+                'total_seconds': round((kdf_seconds + cipher_seconds) / workers, 3)}
@@ -0,0 +1,173 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import AsyncIterable, Awaitable, Callable
+
+from Core.Codecs import get_codec
+from Core.CryptoManager import CryptoManager
+from Core.FileHeader import FileHeader
+from Core.StreamCipher import StreamDecryptor, StreamEncryptor
+
+OFFLOAD_THRESHOLD = 256 * 1024   # Chunks at least this large are ciphered in the executor instead of on the event loop
+
+
+class AsyncCryptoManager:
+    """
+    Asyncio front end of CryptoManager, streaming from async byte sources to async sinks.
+
+    Sources may be an asyncio.StreamReader (or any object with an async read(n)) or an async iterable of bytes.
+    Sinks may be an asyncio.StreamWriter (or any object with write() and async drain()) or an async callable taking bytes.
+    Key derivation and large chunks run in an executor so the event loop is never blocked, and the number of
+    operations running at once is bounded by a semaphore. The output has the same format as CryptoManager.encrypt,
+    compressed like CryptoManager.encrypt_stream when crypto.compression is set.
+
+    Attributes:
+        crypto (CryptoManager): Provides the cipher settings, key cache and segment size.
+        max_concurrency  (int): Maximum number of encryptions and decryptions running at once.
+        chunk_size       (int): Number of bytes read from StreamReader sources at a time.
+    """
+    def __init__(self, crypto: CryptoManager | None = None, max_concurrency: int = 4, executor: Executor | None = None, chunk_size: int = 65536):
+        """
+        Initializes the AsyncCryptoManager.
+
+        Parameters:
+            crypto (CryptoManager): Provides the cipher settings, key cache and segment size. Defaults to CryptoManager().
+            max_concurrency  (int): Maximum number of encryptions and decryptions running at once.
+            executor    (Executor): Executor for key derivation and large chunks, defaults to the loop's default executor.
+            chunk_size       (int): Number of bytes read from StreamReader sources at a time.
+        """
+        self.crypto = crypto or CryptoManager()
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+        self._executor = executor
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def encrypt_stream(self, source, sink, password: str, iterations: int, file_ext: str = '') -> FileHeader:
+        """
+        Encrypts an async byte source into an async sink.
+
+        Parameters:
+            source         : asyncio.StreamReader or async iterable of plaintext bytes.
+            sink           : asyncio.StreamWriter or async callable receiving encrypted bytes.
+            password  (str): Password to use when deriving key used in cipher.
+            iterations (int): Number of iterations for key generation.
+            file_ext  (str): Extension recorded in the header, used to name the file when decrypting to disk.
+
+        Returns:
+            FileHeader: The header of the encrypted output.
+        """
+        async with self._semaphore:
+            # A stream cannot be sampled beforehand, so it is compressed unconditionally as in CryptoManager.encrypt_stream
+            compression = self.crypto.compression if not self.crypto.segment_size else None
+            codec = get_codec(compression) if compression is not None else None
+            header, key = await self._run(self.crypto._new_header, password, iterations, file_ext, None, codec)
+            encryptor = StreamEncryptor(self.crypto, header, key)
+            compressor = codec.compressor() if codec is not None else None
+
+            def _update(chunk: bytes) -> bytes:
+                return encryptor.update(chunk if compressor is None else compressor.compress(chunk))
+            async for chunk in self._chunks(source):
+                await self._write(sink, await self._process(_update, chunk))
+            if compressor is not None:
+                await self._write(sink, encryptor.update(compressor.flush()))
+            await self._write(sink, encryptor.finalize())
+            return header
+
+    async def decrypt_stream(self, source, sink, password: str) -> FileHeader:
+        """
+        Decrypts an async byte source into an async sink, raises ValueError if the data is not authentic.
+
+        For single stream files the plaintext reaches the sink before the tag at the end is verified,
+        so the sink must discard it if ValueError is raised. Segmented files are verified segment by segment.
+
+        Parameters:
+            source         : asyncio.StreamReader or async iterable of encrypted bytes.
+            sink           : asyncio.StreamWriter or async callable receiving plaintext bytes.
+            password  (str): Password to use when deriving key used in cipher.
+
+        Returns:
+            FileHeader: The header of the encrypted input.
+        """
+        async with self._semaphore:
+            decryptor = StreamDecryptor(self.crypto)
+            async for chunk in self._chunks(source):
+                if decryptor.header is None:
+                    decryptor.update(chunk)
+                    if decryptor.header is not None:
+                        decryptor.start(await self._run(self.crypto._file_key, password, decryptor.header))
+                        await self._decrypt_chunk(decryptor, sink, b'')
+                    continue
+                await self._decrypt_chunk(decryptor, sink, chunk)
+            await self._write(sink, decryptor.finalize())
+            return decryptor.header
+
+    async def encrypt_bytes(self, data: bytes, password: str, iterations: int, file_ext: str = '') -> bytes:
+        """Encrypts bytes held in memory and returns the encrypted file contents."""
+        parts = []
+
+        async def _collect(chunk: bytes) -> None:
+            parts.append(chunk)
+
+        async def _source():
+            yield data
+        await self.encrypt_stream(_source(), _collect, password, iterations, file_ext)
+        return b''.join(parts)
+
+    async def decrypt_bytes(self, data: bytes, password: str) -> bytes:
+        """Decrypts encrypted file contents held in memory, raises ValueError if they are not authentic."""
+        parts = []
+
+        async def _collect(chunk: bytes) -> None:
+            parts.append(chunk)
+
+        async def _source():
+            yield data
+        await self.decrypt_stream(_source(), _collect, password)
+        return b''.join(parts)
+
+    async def _run(self, function: Callable, *args):
+        """Runs a blocking function in the executor."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def _process(self, function: Callable[[bytes], bytes], chunk: bytes) -> bytes:
+        """Ciphers a chunk, in the executor if it is large enough to stall the event loop."""
+        if len(chunk) >= OFFLOAD_THRESHOLD:
+            return await self._run(function, chunk)
+        return function(chunk)
+
+    async def _decrypt_chunk(self, decryptor: StreamDecryptor, sink, chunk: bytes) -> None:
+        """Writes the plaintext of a chunk, compressed files are drained one bounded decompressed piece at a time."""
+        output = await self._process(decryptor.update, chunk)
+        while output:
+            await self._write(sink, output)
+            if decryptor.header.codec:
+                output = await self._run(decryptor.update, b'')
+            else:
+                output = decryptor.update(b'')
+
+    async def _chunks(self, source) -> AsyncIterable[bytes]:
+        """Yields the chunks of a StreamReader-like object or an async iterable."""
+        if hasattr(source, 'read'):
+            while True:
+                chunk = await source.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        elif hasattr(source, '__aiter__'):
+            async for chunk in source:
+                if chunk:
+                    yield chunk
+        else:
+            raise TypeError('source must be a StreamReader or an async iterable of bytes.')
+
+    @staticmethod
+    async def _write(sink, data: bytes) -> None:
+        """Writes to a StreamWriter-like object or an async callable."""
+        if not data:
+            return
+        if hasattr(sink, 'drain'):
+            sink.write(data)
+            await sink.drain()
+        else:
+            result: Awaitable | None = sink(data)
+            if result is not None:
+                await result
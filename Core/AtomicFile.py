@@ -0,0 +1,86 @@
+import os
+import re
+import secrets
+
+PARTIAL_SUFFIX = '.partial'
+_TEMP_NAME = re.compile(r'\..+\.[0-9a-f]{8}' + re.escape(PARTIAL_SUFFIX))
+
+
+def fsync_path(path: str) -> None:
+    """Flushes a file, or the entries of a directory, to stable storage."""
+    flags = (os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0)) if os.path.isdir(path) else os.O_RDONLY
+    try:
+        fd = os.open(path, flags)
+    except OSError:
+        # Directories cannot be opened on Windows, os.replace is already durable there
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def is_temp_name(name: str) -> bool:
+    """Returns whether a file name is one of the temporary names AtomicOutput creates."""
+    return _TEMP_NAME.fullmatch(name) is not None
+
+
+class AtomicOutput:
+    """
+    Writes a file under a temporary name in its final directory and moves it into place on success.
+
+    Used as a context manager returning the temporary path. On a clean exit the file is fsynced and renamed over
+    the final path with os.replace, so readers see either the previous file or the complete new one, never a
+    partial or unauthenticated one. On an exception the temporary file is deleted, unless keep_on_error is set.
+
+    Attributes:
+        path      (str): Final path of the file.
+        temp_path (str): Path the file is written to.
+    """
+    def __init__(self, path: str, temp_path: str | None = None, keep_on_error: bool = False, fsync: bool = True):
+        """
+        Initializes the AtomicOutput.
+
+        Parameters:
+            path           (str): Final path of the file.
+            temp_path      (str): Fixed temporary path, such as the partial file of a resumable encryption.
+                                  A unique name in the directory of path is created if None.
+            keep_on_error (bool): Keep the temporary file when the block raises, so it can be resumed.
+            fsync         (bool): Flush the file and its directory to stable storage before and after the rename.
+        """
+        self.path = path
+        self.temp_path = temp_path
+        self.keep_on_error = keep_on_error
+        self.fsync = fsync
+
+    def __enter__(self) -> str:
+        if self.temp_path is None:
+            directory, name = os.path.split(os.path.abspath(self.path))
+            while True:
+                temp_path = os.path.join(directory, '.' + name + '.' + secrets.token_hex(4) + PARTIAL_SUFFIX)
+                try:
+                    # Created like open(path, 'wb') would, so the final file gets the usual permissions
+                    os.close(os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+                except FileExistsError:
+                    continue
+                self.temp_path = temp_path
+                break
+        return self.temp_path
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        if exc_type is not None:
+            if not self.keep_on_error:
+                try:
+                    os.remove(self.temp_path)
+                except FileNotFoundError:
+                    pass
+            return False
+
+        if self.fsync:
+            fsync_path(self.temp_path)
+        os.replace(self.temp_path, self.path)
+        if self.fsync:
+            fsync_path(os.path.dirname(os.path.abspath(self.path)))
+        return False
@@ -0,0 +1,92 @@
+import json
+import os
+
+
+class BatchJournal:
+    """
+    Append-only record of the files a batch finished, so a rerun can skip them.
+
+    Every completed file is one JSON line with the mode, the input and output paths and the size and modification
+    time of both, flushed and fsynced as soon as the file is done. Entries are kept per output directory, a run
+    writing somewhere else processes the file again. Outputs are only moved into place once complete
+    and, when decrypting, authenticated, so a recorded output whose size and modification time are unchanged is
+    known to be good without reading it or deriving its key. A torn last line from a crash is ignored.
+
+    Attributes:
+        path (str): Path of the journal file.
+    """
+    def __init__(self, path: str):
+        """
+        Initializes the BatchJournal and loads the entries already recorded.
+
+        Parameters:
+            path (str): Path of the journal file, created on the first record.
+        """
+        self.path = path
+        self._entries: dict[tuple[str, str, str], dict] = {}
+        self._file = None
+        try:
+            with open(path, 'r', encoding='utf-8') as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                        self._entries[self._key(entry['mode'], entry['input'], entry['output'])] = entry
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _key(mode: str, input_path: str, output_path: str) -> tuple[str, str, str]:
+        return mode, os.path.abspath(input_path), os.path.dirname(os.path.abspath(output_path))
+
+    @staticmethod
+    def _stat(path: str) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def completed(self, mode: str, input_path: str, output_dir: str = '') -> dict | None:
+        """
+        Returns the entry of a file finished by an earlier run, None if it has to be processed.
+
+        A file only counts as finished if it was written to the same output directory and neither its input
+        nor its output changed since it was recorded.
+
+        Parameters:
+            mode        (str): 'encrypt' or 'decrypt'.
+            input_path  (str): Path of the input file.
+            output_dir  (str): Directory this run writes the output to, empty for next to the input file.
+        """
+        output_dir = output_dir or os.path.dirname(os.path.abspath(input_path))
+        entry = self._entries.get(self._key(mode, input_path, os.path.join(output_dir, os.path.basename(input_path))))
+        if entry is None:
+            return None
+        if self._stat(entry['input']) != tuple(entry['input_stat']) or self._stat(entry['output']) != tuple(entry['output_stat']):
+            return None
+        return entry
+
+    def record(self, mode: str, input_path: str, output_path: str) -> None:
+        """Records a finished file, durably, before the next one is reported."""
+        input_stat, output_stat = self._stat(input_path), self._stat(output_path)
+        if input_stat is None or output_stat is None:
+            return
+        entry = {'mode': mode, 'input': os.path.abspath(input_path), 'output': os.path.abspath(output_path),
+                 'input_stat': input_stat, 'output_stat': output_stat}
+        self._entries[self._key(mode, entry['input'], entry['output'])] = entry
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            # Start on a new line if the previous run died in the middle of one
+            if self._file.tell() > 0:
+                self._file.write('\n')
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Closes the journal file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
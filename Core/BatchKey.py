@@ -0,0 +1,82 @@
+import threading
+
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
+from Crypto.Random import get_random_bytes
+
+from Core.KDF import derive_key, kdf_id
+
+HKDF_CONTEXT = b'File-Encryption-App file key'
+
+
+def derive_subkey(master_key: bytes, key_salt: bytes, key_length: int = 32) -> bytes:
+    """
+    Derives the key of a single file from a batch master key.
+
+    Parameters:
+        master_key (bytes): Key derived once per batch from the password.
+        key_salt   (bytes): Random salt stored in the header of the file.
+        key_length   (int): Length of the key to derive.
+
+    Returns:
+        bytes             : A byte string that can be used as a key.
+    """
+    return HKDF(master_key, key_length, key_salt, SHA256, context=HKDF_CONTEXT)
+
+
+class BatchKey:
+    """
+    Master key shared by all files of one encryption batch.
+
+    The expensive password derivation runs once, on first use, and every file gets its own key
+    through a cheap HKDF step over a random per-file salt.
+
+    Attributes:
+        salt      (bytes): Salt used in derivation of the master key, stored in the header of every file.
+        iterations  (int): Number of iterations for derivation of the master key, the cost parameter N for scrypt.
+        key_length  (int): Length of the master key and file keys.
+        kdf         (int): Id of the key derivation function of the master key, see Core.KDF.
+    """
+    def __init__(self, password: str, iterations: int, salt_length: int = 32, key_length: int = 32, kdf: str = 'pbkdf2'):
+        """
+        Initializes the BatchKey.
+
+        Parameters:
+            password    (str): User password for key generation.
+            iterations  (int): Number of iterations for key generation.
+            salt_length (int): Length of the salt to use for the master key.
+            key_length  (int): Length of the master key and file keys.
+            kdf         (str): Name of the key derivation function of the master key, see Core.KDF.
+        """
+        self.kdf = kdf_id(kdf)
+        self.salt = get_random_bytes(salt_length)
+        self.iterations = iterations
+        self.key_length = key_length
+        self._password = password
+        self._master_key: bytes | None = None
+        self._lock = threading.Lock()
+
+    def master_key(self) -> bytes:
+        """Returns the master key, deriving it on first call. Safe to call from several threads."""
+        with self._lock:
+            if self._master_key is None:
+                self._master_key = derive_key(self._password, self.salt, self.iterations, self.kdf, self.key_length)
+                self._password = ''
+            return self._master_key
+
+    def __getstate__(self) -> dict:
+        """Pickles the derived master key instead of the password, so worker processes do not derive it again."""
+        state = self.__dict__.copy()
+        state['_master_key'] = self.master_key()
+        state['_password'] = ''
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """Restores a pickled BatchKey with a new lock."""
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def derive_file_key(self, key_salt: bytes) -> bytes:
+        """Returns the key of the file with the given per-file salt."""
+        return derive_subkey(self.master_key(), key_salt, self.key_length)
@@ -0,0 +1,315 @@
+import fnmatch
+import os
+import threading
+from time import perf_counter
+from typing import Callable, Iterator
+
+from Core.AtomicFile import PARTIAL_SUFFIX, is_temp_name
+from Core.BatchJournal import BatchJournal
+from Core.BatchKey import BatchKey
+from Core.Checkpoint import JOURNAL_SUFFIX
+from Core.CryptoManager import CryptoManager
+from Core.Instrumentation import BatchMetrics, profile_call
+from Core.KeyCache import KeyCache
+from Core.Progress import ProgressBoard, ProgressMonitor
+from Core.Scheduler import DEFAULT_MAX_INFLIGHT_BYTES, BatchScheduler
+
+# Checkpoint journals and partial outputs of resumable encryptions
+APP_FILE_SUFFIXES = ('.encrypted' + JOURNAL_SUFFIX, '.encrypted' + JOURNAL_SUFFIX + '.tmp', '.encrypted' + PARTIAL_SUFFIX)
+
+
+def collect_files(paths: list[str], mode: str, recursive: bool = False, include: list[str] | None = None,
+                  exclude: list[str] | None = None, output_dir: str = '') -> list[tuple[str, str]]:
+    """
+    Expands the given paths into a list of (file_path, output_dir) jobs.
+
+    Directories are walked (recursively if requested) and their files filtered by the include and exclude globs.
+    When an output_dir is given, files found inside a directory keep their relative location below output_dir
+    so that files with the same name in different sub-directories do not overwrite each other.
+
+    Parameters:
+        paths      (list[str]): Files and/or directories to process.
+        mode             (str): 'encrypt', 'decrypt' or 'verify', used to skip files that do not fit the operation.
+        recursive       (bool): Walk sub-directories of directory inputs.
+        include    (list[str]): Globs matched against file names, a file must match one of them. None matches all.
+        exclude    (list[str]): Globs matched against file names, a file matching any of them is skipped.
+        output_dir       (str): Directory where output files will be saved. If empty, writes next to input files.
+
+    Returns:
+        list[tuple[str, str]]: Jobs as (file_path, output_dir) pairs, in a stable order without duplicates.
+    """
+    def _wanted(file_path: str) -> bool:
+        name = os.path.basename(file_path)
+        # Only the working files this app creates, a user's own notes.checkpoint is encrypted like any other file
+        if name.endswith(APP_FILE_SUFFIXES) or is_temp_name(name):
+            return False
+        is_encrypted = os.path.splitext(name)[1] == '.encrypted'
+        if (mode == 'encrypt') == is_encrypted:
+            return False
+        if include and not any(fnmatch.fnmatch(name, pattern) for pattern in include):
+            return False
+        if exclude and any(fnmatch.fnmatch(name, pattern) for pattern in exclude):
+            return False
+        return True
+
+    jobs = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                if not recursive:
+                    dirs.clear()
+                for name in sorted(names):
+                    file_path = os.path.join(root, name)
+                    if file_path in seen or not _wanted(file_path):
+                        continue
+                    job_output = output_dir
+                    if output_dir != '':
+                        job_output = os.path.normpath(os.path.join(output_dir, os.path.relpath(root, path)))
+                    seen.add(file_path)
+                    jobs.append((file_path, job_output))
+        elif os.path.isfile(path) and path not in seen:
+            # Files named explicitly are only subject to the operation check, not the globs
+            name = os.path.basename(path)
+            if (mode == 'encrypt') == (os.path.splitext(name)[1] == '.encrypted'):
+                continue
+            seen.add(path)
+            jobs.append((path, output_dir))
+    return jobs
+
+
+_process_key_cache: KeyCache | None = None
+AUTHENTICATION_ERROR = 'Authentication failed, wrong password or corrupted file.'
+
+
+def error_message(mode: str, error: ValueError) -> str:
+    """
+    Returns the message reported for a ValueError raised while processing a file.
+
+    A failed tag check while decrypting or verifying means a wrong password or a corrupted file, PyCryptodome
+    reports it as 'MAC check failed'. Every other ValueError, such as a truncated file or a bad parameter,
+    is reported as it is.
+    """
+    if mode != 'encrypt' and str(error) == 'MAC check failed':
+        return AUTHENTICATION_ERROR
+    return str(error) or type(error).__name__
+
+
+def run_job(job: dict) -> dict:
+    """
+    Processes a single file and returns its result record.
+
+    Module level so it can run in a worker process. Jobs without a key_cache, as sent to worker processes,
+    use a key cache shared by all jobs of that process.
+
+    Parameters:
+        job (dict): mode, input, output_dir, password, iterations, batch_key, crypto_options, board, slot
+                    and optionally key_cache.
+
+    Returns:
+        dict: The result record of the file.
+    """
+    global _process_key_cache
+    key_cache = job.get('key_cache')
+    if key_cache is None:
+        if _process_key_cache is None:
+            _process_key_cache = KeyCache()
+        key_cache = _process_key_cache
+    board = job['board']
+    reporter = board.reporter(job['slot']) if board is not None else None
+
+    mode, file_path, output_dir = job['mode'], job['input'], job['output_dir']
+    start = perf_counter()
+    result = {'mode': mode, 'input': file_path}
+    crypto = None
+    try:
+        if reporter is not None:
+            reporter.start(os.path.getsize(file_path))
+        if output_dir != '' and mode != 'verify':
+            os.makedirs(output_dir, exist_ok=True)
+        crypto = CryptoManager(key_cache=key_cache, **job['crypto_options'])
+        crypto.progress_reporter = reporter
+        if mode == 'encrypt':
+            result['output'] = crypto.encrypt(file_path, job['password'], job['iterations'], output_dir, job['batch_key'])
+        elif mode == 'verify':
+            result['plaintext_bytes'] = crypto.verify(file_path, job['password'])
+        else:
+            result['output'] = crypto.decrypt(file_path, job['password'], output_dir)
+        result['status'] = 'ok'
+        result['bytes'] = os.path.getsize(file_path)
+        result['buffer_size'] = crypto.buffer_size_used
+        if crypto.pipeline_stats:
+            result['pipeline'] = crypto.pipeline_stats
+        if crypto.codec_used:
+            result['codec'] = crypto.codec_used
+    except ValueError as e:
+        result['status'] = 'error'
+        result['error'] = error_message(mode, e)
+    except OSError as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    if crypto is not None and crypto.last_metrics is not None:
+        result['metrics'] = crypto.last_metrics
+    if reporter is not None:
+        reporter.finish(result['status'] == 'ok')
+    result['seconds'] = round(perf_counter() - start, 6)
+    return result
+
+
+class BatchRunner:
+    """
+    Runs encryption or decryption over many files without any UI.
+
+    Attributes:
+        mode        (str): 'encrypt', 'decrypt' or 'verify'. Verifying authenticates files without writing anything.
+        password    (str): Password to use when deriving keys used in cipher.
+        iterations  (int): Number of iterations for key generation, only used for encryption.
+        workers     (int): Maximum number of files processed in parallel.
+        shared_key (bool): Derive one master key per batch and a cheap subkey per file when encrypting.
+        crypto_options (dict): Keyword arguments passed to every CryptoManager, such as segment_size.
+        scheduler (BatchScheduler): Orders the files largest first on a thread or process pool.
+        key_cache (KeyCache): Cache of derived keys shared by all worker threads.
+        board (ProgressBoard): Progress of the files of the running batch, None when no batch is running.
+        journal_path (str): Optional BatchJournal of finished files, which a rerun skips.
+        metrics (BatchMetrics): Phase timers of all files, when crypto_options turn on instrument, else None.
+    """
+    def __init__(self, mode: str, password: str, iterations: int = 100000, workers: int | None = None, shared_key: bool = True,
+                 crypto_options: dict | None = None, backend: str = 'thread', max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+                 journal_path: str | None = None):
+        """
+        Initializes the BatchRunner.
+
+        Parameters:
+            mode        (str): 'encrypt', 'decrypt' or 'verify'. Verifying authenticates files without writing anything.
+            password    (str): Password to use when deriving keys used in cipher.
+            iterations  (int): Number of iterations for key generation, only used for encryption.
+            workers     (int): Maximum number of files processed in parallel. Defaults to the cpu count.
+            shared_key (bool): Derive one master key per batch and a cheap subkey per file when encrypting.
+            crypto_options (dict): Keyword arguments passed to every CryptoManager, such as segment_size.
+            backend     (str): 'thread' or 'process' pool. Every process keeps its own key cache.
+            max_inflight_bytes (int): Maximum total size of the files being processed at once.
+            journal_path (str): Optional BatchJournal of finished files. Files it lists as done and unchanged are
+                                reported as 'skipped' without being read, the others are recorded once they finish.
+        """
+        if mode not in ('encrypt', 'decrypt', 'verify'):
+            raise ValueError('Unknown mode: ' + mode)
+        self.mode = mode
+        self.password = password
+        self.iterations = iterations
+        self.workers = workers or os.cpu_count() or 4
+        self.shared_key = shared_key
+        self.crypto_options = dict(crypto_options or {})
+        self.scheduler = BatchScheduler(backend, self.workers, max_inflight_bytes)
+        self.key_cache = KeyCache()
+        self.board: ProgressBoard | None = None
+        self.journal_path = journal_path
+        self.metrics = BatchMetrics() if self.crypto_options.get('instrument') else None
+
+    def run(self, jobs: list[tuple[str, str]], on_progress: Callable[[dict], None] | None = None,
+            progress_interval: float = 0.5) -> Iterator[dict]:
+        """
+        Processes all jobs, largest file first.
+
+        Parameters:
+            jobs (list[tuple[str, str]]): Jobs as (file_path, output_dir) pairs, see collect_files.
+            on_progress       (Callable): Called from a watcher thread with the aggregate figures of ProgressMonitor.poll,
+                                          every progress_interval seconds and once more when the batch ends.
+            progress_interval    (float): Seconds between two on_progress calls.
+
+        Returns:
+            Iterator[dict]: One result record per job, skipped files first, then in order of completion.
+        """
+        journal = BatchJournal(self.journal_path) if self.journal_path else None
+        try:
+            yield from self._run(jobs, journal, on_progress, progress_interval)
+        finally:
+            if journal is not None:
+                journal.close()
+
+    def _run(self, jobs: list[tuple[str, str]], journal: BatchJournal | None, on_progress: Callable[[dict], None] | None,
+             progress_interval: float) -> Iterator[dict]:
+        """Skips the files the journal lists as done, then processes and records the others."""
+        if journal is not None:
+            remaining = []
+            for file_path, output_dir in jobs:
+                entry = journal.completed(self.mode, file_path, output_dir)
+                if entry is None:
+                    remaining.append((file_path, output_dir))
+                else:
+                    yield {'mode': self.mode, 'input': file_path, 'output': entry['output'], 'status': 'skipped'}
+            jobs = remaining
+        if not jobs:
+            return
+        batch_key = None
+        if self.mode == 'encrypt' and self.shared_key and len(jobs) > 1:
+            batch_key = BatchKey(self.password, self.iterations, kdf=self.crypto_options.get('kdf', 'pbkdf2'))
+
+        self.board = ProgressBoard(len(jobs))
+        tasks, sizes = [], []
+        for slot, (file_path, output_dir) in enumerate(jobs):
+            tasks.append(self._task(file_path, output_dir, batch_key, slot))
+            try:
+                sizes.append(os.path.getsize(file_path))
+            except OSError:
+                sizes.append(0)
+            self.board.set(slot, 0, sizes[-1])
+
+        monitor = watcher = None
+        stop = threading.Event()
+        if on_progress is not None:
+            monitor = ProgressMonitor(self.board, on_update=on_progress, min_interval=progress_interval)
+            watcher = threading.Thread(target=self._watch, args=(monitor, stop, progress_interval), daemon=True)
+            watcher.start()
+        try:
+            for result in self.scheduler.run(run_job, tasks, sizes):
+                if journal is not None and result['status'] == 'ok' and 'output' in result:
+                    journal.record(self.mode, result['input'], result['output'])
+                if self.metrics is not None and 'metrics' in result:
+                    self.metrics.add(result['metrics'], result['status'])
+                yield result
+        finally:
+            if watcher is not None:
+                stop.set()
+                watcher.join()
+                monitor.poll(force=True)
+            board, self.board = self.board, None
+            board.close()
+
+    def _task(self, file_path: str, output_dir: str, batch_key: BatchKey | None, slot: int) -> dict:
+        """Returns the job of one file for run_job."""
+        task = {'mode': self.mode, 'input': file_path, 'output_dir': output_dir, 'password': self.password,
+                'iterations': self.iterations, 'batch_key': batch_key, 'crypto_options': self.crypto_options,
+                'board': self.board, 'slot': slot}
+        if self.scheduler.backend == 'thread':
+            task['key_cache'] = self.key_cache
+        return task
+
+    def profile(self, file_path: str, output_dir: str = '', profile_path: str | None = None,
+                trace_memory: bool = False) -> dict:
+        """
+        Processes a single file on the calling thread under cProfile, and optionally tracemalloc.
+
+        Parameters:
+            file_path     (str): File to process.
+            output_dir    (str): Directory where the output file will be saved. If empty, writes next to the input file.
+            profile_path  (str): Optional file the pstats data is dumped to.
+            trace_memory (bool): Also trace allocations.
+
+        Returns:
+            dict: The result record of the file, with the report of profile_call under 'profile'.
+        """
+        task = self._task(file_path, output_dir, None, 0)
+        task['board'] = None
+        task['key_cache'] = self.key_cache
+        result, report = profile_call(run_job, task, profile_path=profile_path, trace_memory=trace_memory)
+        if self.metrics is not None and 'metrics' in result:
+            self.metrics.add(result['metrics'], result['status'])
+        result['profile'] = report
+        return result
+
+    @staticmethod
+    def _watch(monitor: ProgressMonitor, stop: threading.Event, interval: float) -> None:
+        """Polls the progress board until the batch ends."""
+        while not stop.wait(interval):
+            monitor.poll()
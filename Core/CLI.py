@@ -0,0 +1,381 @@
+import argparse
+import getpass
+import json
+import os
+import sys
+from time import perf_counter
+
+from Core.ArchiveIndex import ArchiveIndex, measure_rates
+from Core.BatchRunner import BatchRunner, collect_files, error_message
+from Core.Codecs import codec_names
+from Core.CryptoManager import CryptoManager
+from Core.IncrementalSync import IncrementalSync
+from Core.KDF import KDF_NAMES, calibrate, check_work_factor, default_work_factor
+from Core.TreeArchive import ARCHIVE_SEGMENT_SIZE, TreeArchive
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    """Builds the argument parser for the command line interface."""
+    parser = argparse.ArgumentParser(prog='python -m Core', description='Encrypt or decrypt files without the GUI.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    helps = {'encrypt': 'Encrypt files and directories.', 'decrypt': 'Decrypt files and directories.',
+             'verify': 'Authenticate encrypted files without writing any plaintext.'}
+    for command in ('encrypt', 'decrypt', 'verify'):
+        writes = command != 'verify'
+        sub = commands.add_parser(command, help=helps[command])
+        sub.add_argument('paths', nargs='+', help='Files and/or directories to ' + command + '. "-" reads stdin'
+                         + (' and writes stdout.' if writes else '.'))
+        if writes:
+            sub.add_argument('-o', '--output-dir', default='', help='Directory for output files. Defaults to next to each input file.')
+        sub.add_argument('-r', '--recursive', action='store_true', help='Walk sub-directories of directory inputs.')
+        sub.add_argument('-i', '--include', action='append', help='Only process files matching this glob. Can be repeated.')
+        sub.add_argument('-e', '--exclude', action='append', help='Skip files matching this glob. Can be repeated.')
+        sub.add_argument('-j', '--workers', type=int, default=None, help='Number of files processed in parallel. Defaults to the cpu count.')
+        sub.add_argument('--backend', choices=('thread', 'process'), default='thread',
+                         help='Run files on a thread pool (default) or a process pool. Files are always scheduled largest first.')
+        sub.add_argument('--max-inflight', type=int, default=4096, metavar='MIB',
+                         help='Maximum total size of the files being processed at once, in MiB.')
+        sub.add_argument('--buffer-size', default='64', metavar='KIB|auto',
+                         help='Read/write chunk size in KiB, or "auto" to tune it per file (default 64).')
+        if writes:
+            sub.add_argument('--segment-workers', type=int, default=1, metavar='N',
+                             help='Threads processing the segments of one segmented file in parallel.')
+            sub.add_argument('--io-backend', choices=('auto', 'stream', 'mmap', 'pipeline'), default='auto',
+                             help='Buffered streaming, memory-mapped I/O, overlapped reader/cipher/writer threads, '
+                                  'or a choice between stream and mmap by file size (default).')
+            sub.add_argument('--pipeline-depth', type=int, default=4, metavar='N', help='Chunks queued between pipeline stages.')
+            sub.add_argument('--journal', metavar='PATH',
+                             help='Record finished files in this journal and skip the files it lists as done and unchanged.')
+            sub.add_argument('--no-fsync', action='store_true',
+                             help='Do not flush outputs to stable storage before moving them into place. Faster, but a '
+                                  'power loss can leave an empty or partial file at the output path.')
+        sub.add_argument('--progress', action='store_true',
+                         help='Write aggregate progress (bytes, MB/s, ETA, file counts) as JSON lines to stderr.')
+        sub.add_argument('--metrics', metavar='PATH',
+                         help='Time key derivation, reads, cipher, writes and tag handling of every file, add the timings '
+                              'to the output records and write the batch totals in the Prometheus text format to PATH '
+                              '("-" for stderr).')
+        sub.add_argument('--profile', metavar='PATH',
+                         help='Process only the first file, on the main thread under cProfile. The pstats data is written '
+                              'to PATH and the top functions to stderr.')
+        sub.add_argument('--trace-memory', action='store_true',
+                         help='With --profile, also trace allocations and report the peak and the top allocation sites.')
+        sub.add_argument('--password-env', metavar='VAR', help='Read the password from this environment variable instead of prompting.')
+        sub.add_argument('--password-file', metavar='PATH', help='Read the password from the first line of this file instead of prompting.')
+        if command == 'encrypt':
+            sub.add_argument('-n', '--iterations', type=int, default=None,
+                             help='Number of iterations for key generation, the cost N (a power of two) for scrypt. '
+                                  'Defaults to 100000 for pbkdf2, 600000 for pbkdf2-sha256 and 32768 for scrypt.')
+            sub.add_argument('--kdf', choices=list(KDF_NAMES), default='pbkdf2',
+                             help='Key derivation function. pbkdf2 (HMAC-SHA1) files can be read by every version of the app.')
+            sub.add_argument('--calibrate', type=int, default=None, metavar='MS',
+                             help='Measure this machine and pick the work factor that makes one key derivation take MS '
+                                  'milliseconds, instead of --iterations.')
+            sub.add_argument('--ext', default='', help='Extension recorded in the header when encrypting stdin, e.g. ".csv".')
+            sub.add_argument('--per-file-kdf', action='store_true', help='Run the full key derivation for every file instead of once per batch.')
+            sub.add_argument('--segment-size', type=int, default=0, metavar='KIB',
+                             help='Write the seekable segmented format with segments of this many KiB. 0 writes a single GCM stream.')
+            sub.add_argument('--resume', action='store_true',
+                             help='Checkpoint progress next to each output and continue interrupted encryptions. '
+                                  'Implies the segmented format.')
+            sub.add_argument('--compress', choices=codec_names(), default=None,
+                             help='Compress files before encrypting them. Files that look incompressible are stored as is, '
+                                  'stdin is always compressed. '
+                                  'Not used with the segmented format.')
+
+    index = commands.add_parser('index', help='Record the headers of encrypted files in an index, without a password.')
+    index.add_argument('paths', nargs='+', help='Encrypted files and/or directories to index.')
+    index.add_argument('--db', required=True, help='Path of the SQLite index, created if missing.')
+    index.add_argument('-r', '--recursive', action='store_true', help='Walk sub-directories of directory inputs.')
+    index.add_argument('-j', '--workers', type=int, default=8, help='Threads reading headers in parallel.')
+
+    plan = commands.add_parser('plan', help='Summarize an index: key derivation groups and estimated run time.')
+    plan.add_argument('--db', required=True, help='Path of the SQLite index written by the index command.')
+    plan.add_argument('-j', '--workers', type=int, default=None, help='Files processed in parallel. Defaults to the cpu count.')
+    plan.add_argument('--groups', type=int, default=20, metavar='N', help='Number of key derivation groups to list.')
+
+    pack = commands.add_parser('pack', help='Pack a directory tree into one encrypted archive.')
+    pack.add_argument('source', help='Directory to pack.')
+    pack.add_argument('-o', '--output', required=True, help='Path of the archive, e.g. backup.tree.encrypted.')
+    pack.add_argument('-i', '--include', action='append', help='Only pack files matching this glob. Can be repeated.')
+    pack.add_argument('-e', '--exclude', action='append', help='Skip files matching this glob. Can be repeated.')
+    pack.add_argument('-j', '--workers', type=int, default=8, help='Threads reading small files ahead.')
+    pack.add_argument('-n', '--iterations', type=int, default=None,
+                      help='Number of iterations for key generation, the cost N for scrypt. Defaults to the --kdf default.')
+    pack.add_argument('--kdf', choices=list(KDF_NAMES), default='pbkdf2', help='Key derivation function.')
+    pack.add_argument('--calibrate', type=int, default=None, metavar='MS',
+                      help='Pick the work factor that makes the key derivation take MS milliseconds, instead of --iterations.')
+    pack.add_argument('--segment-size', type=int, default=ARCHIVE_SEGMENT_SIZE // 1024, metavar='KIB',
+                      help='Segment size in KiB. Smaller segments make extracting single small members cheaper.')
+    pack.add_argument('--no-fsync', action='store_true', help='Do not flush the archive to stable storage before moving it into place.')
+
+    listing = commands.add_parser('list', help='List the members of an archive written by pack.')
+    listing.add_argument('archive', help='Path of the archive.')
+
+    unpack = commands.add_parser('unpack', help='Extract an archive written by pack, or some of its members.')
+    unpack.add_argument('archive', help='Path of the archive.')
+    unpack.add_argument('-m', '--member', action='append', dest='members',
+                        help='Member to extract, a directory selects everything below it. Can be repeated. Defaults to all.')
+    unpack.add_argument('-o', '--output-dir', required=True, help='Directory the tree is extracted to.')
+    unpack.add_argument('--fsync', action='store_true', help='Flush every extracted file to stable storage.')
+
+    sync = commands.add_parser('sync', help='Encrypt a directory into an output directory, only re-encrypting what changed.')
+    sync.add_argument('source', help='Directory to encrypt, walked recursively.')
+    sync.add_argument('-o', '--output-dir', required=True, help='Directory of the encrypted files.')
+    sync.add_argument('--manifest', default=None, metavar='PATH',
+                      help='Manifest of the previous run. Defaults to .sync-manifest.json in the output directory.')
+    sync.add_argument('-i', '--include', action='append', help='Only encrypt files matching this glob. Can be repeated.')
+    sync.add_argument('-e', '--exclude', action='append', help='Skip files matching this glob. Can be repeated.')
+    sync.add_argument('-j', '--workers', type=int, default=None,
+                      help='Threads scanning and files encrypted in parallel. Defaults to the cpu count.')
+    sync.add_argument('--backend', choices=('thread', 'process'), default='thread', help='Encrypt on a thread or process pool.')
+    sync.add_argument('-n', '--iterations', type=int, default=None,
+                      help='Number of iterations for key generation, the cost N for scrypt. Defaults to the --kdf default.')
+    sync.add_argument('--kdf', choices=list(KDF_NAMES), default='pbkdf2', help='Key derivation function.')
+    sync.add_argument('--keep-deleted', action='store_true', help='Keep the outputs of source files that no longer exist.')
+    sync.add_argument('--dry-run', action='store_true', help='Only report what would be encrypted or deleted.')
+    sync.add_argument('--no-fsync', action='store_true', help='Do not flush outputs to stable storage before moving them into place.')
+
+    for sub in (pack, listing, unpack, sync):
+        sub.add_argument('--password-env', metavar='VAR', help='Read the password from this environment variable instead of prompting.')
+        sub.add_argument('--password-file', metavar='PATH', help='Read the password from the first line of this file instead of prompting.')
+    return parser
+
+
+def _read_password(args: argparse.Namespace) -> str:
+    """Returns the password from the environment, a file or an interactive prompt."""
+    if args.password_env:
+        password = os.environ.get(args.password_env, '')
+    elif args.password_file:
+        with open(args.password_file, 'r', encoding='utf-8') as password_file:
+            password = password_file.readline().rstrip('\r\n')
+    else:
+        password = getpass.getpass('Password: ')
+    if not password:
+        raise SystemExit('A password is required.')
+    return password
+
+
+def _run_stdio(args: argparse.Namespace, password: str, crypto_options: dict) -> int:
+    """Encrypts or decrypts stdin to stdout, or verifies stdin, the result record is written to stderr."""
+    crypto = CryptoManager(**crypto_options)
+    result = {'mode': args.command, 'input': '-', 'output': '-'}
+    try:
+        if args.command == 'encrypt':
+            crypto.encrypt_stream(sys.stdin.buffer, sys.stdout.buffer, password, args.iterations, args.ext)
+            if crypto.codec_used:
+                result['codec'] = crypto.codec_used
+        elif args.command == 'verify':
+            del result['output']
+            with open(os.devnull, 'wb') as discard:
+                crypto.decrypt_stream(sys.stdin.buffer, discard, password)
+        else:
+            crypto.decrypt_stream(sys.stdin.buffer, sys.stdout.buffer, password)
+        sys.stdout.buffer.flush()
+        result['status'] = 'ok'
+    except (ValueError, OSError) as e:
+        result['status'] = 'error'
+        result['error'] = error_message(args.command, e)
+        if isinstance(e, BrokenPipeError):
+            # The reader went away, keep the interpreter from failing again when it flushes stdout on exit
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    print(json.dumps(result), file=sys.stderr, flush=True)
+    return 0 if result['status'] == 'ok' else 1
+
+
+def _run_index(args: argparse.Namespace) -> int:
+    """Updates or summarizes an ArchiveIndex, only headers are read so no password is needed."""
+    with ArchiveIndex(args.db) as index:
+        if args.command == 'index':
+            print(json.dumps({'update': True, **index.update(args.paths, args.recursive, args.workers)}), flush=True)
+            print(json.dumps({'summary': True, **index.summary()}), flush=True)
+            return 0
+
+        workers = args.workers or os.cpu_count() or 4
+        rates = measure_rates(index.kdfs())
+        groups = index.key_groups()
+        print(json.dumps({'summary': True, **index.summary()}), flush=True)
+        print(json.dumps({'estimate': True, 'workers': workers, **rates,
+                          **index.estimate(rates['kdf_rates'], rates['cipher_bytes_per_s'], workers)}), flush=True)
+        for group in groups[:args.groups]:
+            print(json.dumps({'key_group': True, **group}), flush=True)
+    return 0
+
+
+def _run_archive(args: argparse.Namespace, password: str) -> int:
+    """Packs, lists or extracts a TreeArchive, writing one JSON object per member or result to stdout."""
+    if args.command == 'pack':
+        if args.calibrate:
+            args.iterations = calibrate(args.kdf, args.calibrate / 1000)
+        elif args.iterations is None:
+            args.iterations = default_work_factor(args.kdf)
+        crypto = CryptoManager(segment_size=args.segment_size * 1024, kdf=args.kdf, fsync_output=not args.no_fsync)
+        start = perf_counter()
+        try:
+            result = TreeArchive.create(args.source, args.output, password, args.iterations, crypto, args.workers,
+                                        args.include, args.exclude)
+        except (OSError, ValueError) as e:
+            print(json.dumps({'summary': True, 'status': 'error', 'error': str(e)}), flush=True)
+            return 1
+        print(json.dumps({'summary': True, **result, 'seconds': round(perf_counter() - start, 3)}), flush=True)
+        return 1 if result['errors'] else 0
+
+    try:
+        archive = TreeArchive(args.archive, password)
+    except (OSError, ValueError) as e:
+        print(json.dumps({'summary': True, 'status': 'error', 'error': str(e)}), flush=True)
+        return 1
+    with archive:
+        if args.command == 'list':
+            for member in archive.members:
+                print(json.dumps(member), flush=True)
+            return 0
+        try:
+            result = archive.extract(args.output_dir, args.members, args.fsync)
+        except (KeyError, ValueError) as e:
+            print(json.dumps({'summary': True, 'status': 'error', 'error': str(e).strip('"\'')}), flush=True)
+            return 1
+    print(json.dumps({'summary': True, 'status': 'ok', **result}), flush=True)
+    return 0
+
+
+def _run_sync(args: argparse.Namespace, password: str) -> int:
+    """Runs an IncrementalSync, writing one JSON object per file and a summary to stdout."""
+    iterations = args.iterations or default_work_factor(args.kdf)
+    try:
+        sync = IncrementalSync(args.source, args.output_dir, password, iterations, args.manifest, args.workers,
+                               args.include, args.exclude, {'kdf': args.kdf, 'fsync_output': not args.no_fsync}, args.backend, not args.keep_deleted)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    start = perf_counter()
+    failed = 0
+    if args.dry_run:
+        for check in sync.scan():
+            sync.stats[check['status']] = sync.stats.get(check['status'], 0) + 1
+            print(json.dumps({'path': check['path'], 'output': check['output'], 'status': check['status']}), flush=True)
+    else:
+        for result in sync.run():
+            failed += result['status'] == 'error'
+            print(json.dumps(result), flush=True)
+    print(json.dumps({'summary': True, **sync.stats, 'failed': failed, 'seconds': round(perf_counter() - start, 3)}), flush=True)
+    return 1 if failed else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Entry point of the command line interface.
+
+    Writes one JSON object per processed file to stdout, followed by a summary object.
+    The summary of verify also counts the authenticated bytes and lists the files that failed.
+
+    Parameters:
+        argv (list[str]): Arguments to parse, defaults to sys.argv.
+
+    Returns:
+        int: Exit code, 0 if every file succeeded and 1 otherwise.
+    """
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'kdf', None) and getattr(args, 'iterations', None) is not None:
+        try:
+            check_work_factor(args.kdf, args.iterations)
+        except ValueError as e:
+            parser.error('-n/--iterations: ' + str(e))
+    if args.command in ('index', 'plan'):
+        return _run_index(args)
+    password = _read_password(args)
+    if args.command in ('pack', 'list', 'unpack'):
+        return _run_archive(args, password)
+    if args.command == 'sync':
+        return _run_sync(args, password)
+
+    crypto_options = {}
+    if args.command != 'verify':
+        crypto_options.update({'segment_workers': max(1, args.segment_workers), 'io_backend': args.io_backend,
+                               'pipeline_depth': args.pipeline_depth})
+    if args.buffer_size == 'auto':
+        crypto_options['auto_buffer'] = True
+    else:
+        crypto_options['buffer_size'] = int(args.buffer_size) * 1024
+    if getattr(args, 'segment_size', 0):
+        crypto_options['segment_size'] = args.segment_size * 1024
+    if getattr(args, 'resume', False):
+        crypto_options['resumable'] = True
+    if getattr(args, 'compress', None):
+        crypto_options['compression'] = args.compress
+    if args.metrics:
+        crypto_options['instrument'] = True
+    if getattr(args, 'no_fsync', False):
+        crypto_options['fsync_output'] = False
+    if args.command == 'encrypt':
+        crypto_options['kdf'] = args.kdf
+        if args.calibrate:
+            args.iterations = calibrate(args.kdf, args.calibrate / 1000)
+            print(json.dumps({'kdf': args.kdf, 'calibrated_iterations': args.iterations}), file=sys.stderr, flush=True)
+        elif args.iterations is None:
+            args.iterations = default_work_factor(args.kdf)
+    if args.paths == ['-']:
+        return _run_stdio(args, password, crypto_options)
+
+    output_dir = getattr(args, 'output_dir', '')
+    jobs = collect_files(args.paths, args.command, args.recursive, args.include, args.exclude, output_dir)
+    # collect_files skips paths that do not exist, they are reported as failed files
+    missing = [path for path in dict.fromkeys(args.paths) if not os.path.exists(path)]
+    runner = BatchRunner(args.command, password, getattr(args, 'iterations', 100000), args.workers,
+                         not getattr(args, 'per_file_kdf', False), crypto_options, args.backend, args.max_inflight * 1024 * 1024,
+                         getattr(args, 'journal', None))
+
+    on_progress = None
+    if args.progress:
+        def on_progress(stats: dict) -> None:
+            print(json.dumps({'progress': True, **stats}), file=sys.stderr, flush=True)
+
+    if args.profile:
+        jobs = jobs[:1]
+        results = []
+        if jobs:
+            result = runner.profile(jobs[0][0], jobs[0][1], args.profile, args.trace_memory)
+            print(result['profile'].pop('profile'), file=sys.stderr, flush=True)
+            results.append(result)
+    else:
+        results = runner.run(jobs, on_progress)
+
+    failed = skipped = 0
+    failed_files, verified_bytes = [], 0
+    for path in missing:
+        failed += 1
+        failed_files.append(path)
+        print(json.dumps({'mode': args.command, 'input': path, 'status': 'error', 'error': 'No such file or directory.'}),
+              flush=True)
+    start = perf_counter()
+    for result in results:
+        if result['status'] == 'skipped':
+            skipped += 1
+        elif result['status'] != 'ok':
+            failed += 1
+            failed_files.append(result['input'])
+        else:
+            verified_bytes += result.get('plaintext_bytes', 0)
+        print(json.dumps(result), flush=True)
+    # Worker processes keep their own key caches, only the shared cache of the thread backend is reported
+    key_cache = runner.key_cache.stats() if args.backend == 'thread' else None
+    summary = {'summary': True, 'files': len(jobs) + len(missing), 'failed': failed, 'skipped': skipped, 'key_cache': key_cache}
+    if args.command == 'verify':
+        seconds = perf_counter() - start
+        summary.update({'verified': len(jobs) + len(missing) - failed, 'plaintext_bytes': verified_bytes, 'seconds': round(seconds, 3),
+                        'mb_per_s': round(verified_bytes / (1024 * 1024) / seconds, 1) if seconds else None,
+                        'failed_files': failed_files})
+    if runner.metrics is not None:
+        summary['metrics'] = runner.metrics.snapshot()
+        if args.metrics == '-':
+            sys.stderr.write(runner.metrics.to_prometheus())
+        else:
+            with open(args.metrics, 'w', encoding='utf-8') as metrics_file:
+                metrics_file.write(runner.metrics.to_prometheus())
+    print(json.dumps(summary), flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
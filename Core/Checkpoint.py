@@ -0,0 +1,93 @@
+import json
+import os
+from time import monotonic
+
+JOURNAL_SUFFIX = '.checkpoint'
+DEFAULT_CHECKPOINT_INTERVAL = 5.0
+
+
+class CheckpointJournal:
+    """
+    Small JSON journal next to a partially written segmented file, recording how many segments are on disk.
+
+    The output is fsynced before the journal is replaced, so the journal never counts a segment that could be lost.
+    The journal also records the header of the output and the size and modification time of the input,
+    a restart only resumes if they are unchanged. They can match a rewritten input, so CryptoManager also
+    checks the last completed segment against the input before resuming.
+
+    Attributes:
+        path       (str): Path of the journal, the output path followed by '.checkpoint'.
+        interval (float): Minimum seconds between two checkpoints.
+    """
+    def __init__(self, output_path: str, interval: float = DEFAULT_CHECKPOINT_INTERVAL):
+        """
+        Initializes the CheckpointJournal.
+
+        Parameters:
+            output_path (str): Path of the encrypted file being written.
+            interval  (float): Minimum seconds between two checkpoints, the first and the forced ones are always written.
+        """
+        self.path = output_path + JOURNAL_SUFFIX
+        self.interval = interval
+        self._state: dict = {}
+        self._last = 0.0
+
+    def read(self) -> dict | None:
+        """Returns the recorded state, None if there is no readable journal."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as journal_file:
+                state = json.load(journal_file)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(state, dict) or not {'input_size', 'input_mtime_ns', 'header', 'segments'} <= state.keys():
+            return None
+        return state
+
+    @staticmethod
+    def matches(state: dict, input_path: str) -> bool:
+        """Returns whether the input file is the one the journal was written for."""
+        try:
+            stat = os.stat(input_path)
+        except OSError:
+            return False
+        return state['input_size'] == stat.st_size and state['input_mtime_ns'] == stat.st_mtime_ns
+
+    def start(self, input_path: str, header_bytes: bytes, segments: int = 0) -> None:
+        """Begins journaling the encryption of input_path, nothing is written until the first checkpoint."""
+        stat = os.stat(input_path)
+        self._state = {'input_size': stat.st_size, 'input_mtime_ns': stat.st_mtime_ns,
+                       'header': header_bytes.hex(), 'segments': segments}
+        self._last = 0.0
+
+    def checkpoint(self, output_file, segments: int, force: bool = False) -> None:
+        """
+        Records that the first segments of the output are complete, at most once per interval unless forced.
+
+        Parameters:
+            output_file     : Open output file, flushed and fsynced before the journal is written.
+            segments   (int): Number of leading segments fully written.
+            force     (bool): Write even if the interval has not elapsed.
+        """
+        now = monotonic()
+        if not force and self._last and now - self._last < self.interval:
+            return
+        self._last = now
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        self._state['segments'] = segments
+
+        # Replace atomically, a crash while writing leaves the previous journal intact
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as journal_file:
+            json.dump(self._state, journal_file)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(temp_path, self.path)
+
+    def remove(self) -> None:
+        """Deletes the journal once the output is complete."""
+        for path in (self.path, self.path + '.tmp'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
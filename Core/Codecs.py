@@ -0,0 +1,142 @@
+import lzma
+import math
+import os
+import zlib
+from collections import Counter
+from typing import Callable, Iterator
+
+from Assets.File_Icons import FILE_ICONS
+
+# Icon categories of Assets.File_Icons whose formats are already compressed
+INCOMPRESSIBLE_ICONS = ('Image.png', 'Video.png', 'Audio.png', 'Archive.png')
+SAMPLE_SIZE = 64 * 1024         # Bytes sampled from the middle of a file to estimate its entropy
+ENTROPY_THRESHOLD = 7.5         # Bits per byte above which a sample is considered incompressible
+DECOMPRESS_LIMIT = 1024 * 1024  # Maximum bytes produced per decompression call, bounds memory on highly compressed data
+
+
+class Decompressor:
+    """
+    Streaming decompressor with bounded output per step.
+
+    Attributes:
+        eof (bool): Whether the end of the compressed stream was reached.
+    """
+    def __init__(self, decompress: Callable, pending: Callable[[object], bool], state):
+        self._decompress = decompress
+        self._pending = pending
+        self._state = state
+
+    @property
+    def eof(self) -> bool:
+        return self._state.eof
+
+    def decompress(self, data) -> Iterator[bytes]:
+        """Yields the decompressed chunks of data, each at most DECOMPRESS_LIMIT bytes."""
+        try:
+            chunk = self._decompress(self._state, data)
+            while True:
+                if chunk:
+                    yield chunk
+                # A full chunk may leave output buffered inside the library even when all input was consumed
+                if self._state.eof or not (self._pending(self._state) or len(chunk) >= DECOMPRESS_LIMIT):
+                    return
+                chunk = self._decompress(self._state, b'')
+        except (zlib.error, lzma.LZMAError, EOFError) as e:
+            raise ValueError('Compressed data is corrupted: ' + str(e))
+
+    def finish(self) -> None:
+        """Raises ValueError if the compressed stream ended early."""
+        if not self._state.eof:
+            raise ValueError('Compressed data is truncated.')
+
+
+class Codec:
+    """
+    A streaming compression format, identified in file headers by a one byte id.
+
+    Attributes:
+        codec_id (int): Id stored in the header.
+        name     (str): Name used in settings and on the command line.
+    """
+    def __init__(self, codec_id: int, name: str, compressor: Callable[[], object], decompressor: Callable[[], Decompressor]):
+        """
+        Initializes the Codec.
+
+        Parameters:
+            codec_id        (int): Id stored in the header, 1 to 255.
+            name            (str): Name used in settings and on the command line.
+            compressor (Callable): Returns a new object with compress(data) and flush() methods.
+            decompressor (Callable): Returns a new Decompressor.
+        """
+        if not 0 < codec_id < 256:
+            raise ValueError('Codec ids must be between 1 and 255.')
+        self.codec_id = codec_id
+        self.name = name
+        self.compressor = compressor
+        self.decompressor = decompressor
+
+
+def _zlib_decompress(state, data) -> bytes:
+    # Input left over by the previous bounded call is kept in unconsumed_tail and must be fed again
+    return state.decompress(state.unconsumed_tail + bytes(data) if state.unconsumed_tail else data, DECOMPRESS_LIMIT)
+
+
+def _lzma_decompress(state, data) -> bytes:
+    return state.decompress(data, DECOMPRESS_LIMIT)
+
+
+_CODECS: dict[int, Codec] = {}
+_CODEC_NAMES: dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """Makes a codec available for compression and for decrypting files that use it."""
+    if codec.codec_id in _CODECS or codec.name in _CODEC_NAMES:
+        raise ValueError('A codec with id ' + str(codec.codec_id) + ' or name ' + codec.name + ' is already registered.')
+    _CODECS[codec.codec_id] = codec
+    _CODEC_NAMES[codec.name] = codec
+
+
+def get_codec(key: int | str) -> Codec:
+    """Returns a registered codec by id or name, raises ValueError if there is none."""
+    codec = _CODECS.get(key) if isinstance(key, int) else _CODEC_NAMES.get(key)
+    if codec is None:
+        raise ValueError('Unsupported compression codec: ' + str(key))
+    return codec
+
+
+def codec_names() -> list[str]:
+    """Returns the names of the registered codecs."""
+    return sorted(_CODEC_NAMES)
+
+
+register_codec(Codec(1, 'zlib', lambda: zlib.compressobj(6),
+                     lambda: Decompressor(_zlib_decompress, lambda state: bool(state.unconsumed_tail), zlib.decompressobj())))
+register_codec(Codec(2, 'lzma', lambda: lzma.LZMACompressor(preset=1),
+                     lambda: Decompressor(_lzma_decompress, lambda state: not state.needs_input and not state.eof,
+                                          lzma.LZMADecompressor())))
+
+
+def sample_entropy(input_path: str, sample_size: int = SAMPLE_SIZE) -> float:
+    """Returns the Shannon entropy in bits per byte of a sample from the middle of a file."""
+    with open(input_path, 'rb') as input_file:
+        size = os.fstat(input_file.fileno()).st_size
+        input_file.seek(max(0, size // 2 - sample_size // 2))
+        sample = input_file.read(sample_size)
+    if not sample:
+        return 0.0
+    total = len(sample)
+    return -sum(count / total * math.log2(count / total) for count in Counter(sample).values())
+
+
+def is_compressible(input_path: str) -> bool:
+    """
+    Returns whether compressing a file is likely to pay off.
+
+    Files whose extension Assets.File_Icons maps to an image, video, audio or archive icon are already compressed.
+    Other files are sampled, and a sample close to 8 bits of entropy per byte means encrypted or compressed data.
+    """
+    icon = FILE_ICONS.get(os.path.splitext(input_path)[1].lower())
+    if icon is not None and os.path.basename(icon) in INCOMPRESSIBLE_ICONS:
+        return False
+    return sample_entropy(input_path) < ENTROPY_THRESHOLD
@@ -1,11 +1,30 @@
+import mmap
 import os
+import queue
 import struct
-from time import sleep
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import perf_counter, sleep
 
 from Crypto.Cipher import AES
-from Crypto.Protocol.KDF import PBKDF2
 from Crypto.Random import get_random_bytes
 
+from Core.AtomicFile import PARTIAL_SUFFIX, AtomicOutput
+from Core.BatchKey import BatchKey, derive_subkey
+from Core.BufferTuner import choose_buffer_size
+from Core.Checkpoint import DEFAULT_CHECKPOINT_INTERVAL, CheckpointJournal
+from Core.Codecs import Codec, get_codec, is_compressible
+from Core.FileHeader import OPT_CODEC, OPT_KDF, OPT_KEY_SALT, OPT_SEGMENT_SIZE, FileHeader
+from Core.Instrumentation import OperationMetrics, instrumented, read_size, write_size
+from Core.KDF import derive_key, kdf_id
+from Core.KeyCache import KeyCache
+from Core.Progress import ProgressReporter
+from Core.Segments import DEFAULT_SEGMENT_SIZE, MAX_SEGMENT_SIZE, NONCE_PREFIX_LENGTH, SegmentLayout, segment_nonce
+from Core.StreamCipher import StreamDecryptor, StreamEncryptor
+
+MMAP_THRESHOLD = 64 * 1024 * 1024   # Files at least this large use memory-mapped I/O in 'auto' mode
+MMAP_CHUNK_SIZE = 8 * 1024 * 1024   # Bytes ciphered per call between progress updates in memory-mapped I/O
+
 
 class CryptoManager:
     """
@@ -18,8 +37,30 @@ class CryptoManager:
         nonce_length (int): Length of the nonce to use for cipher.
         buffer_size  (int): Size of buffer for reading of files.
         tag_size     (int): Size of tag for verification.
+        auto_buffer (bool): Pick the buffer size per file from file size, filesystem block size and a calibration probe.
+        buffer_size_used (int): Buffer size used for the last file processed.
+        key_cache (KeyCache): Optional cache of derived keys, shared between CryptoManagers of a batch.
+        segment_size (int): If not 0, encrypt into independently authenticated segments of this size (seekable format).
+        segment_workers (int): Number of threads processing segments of one segmented file in parallel.
+        io_backend   (str): 'stream' for buffered reads and writes, 'mmap' for memory-mapped files, 'pipeline' for reads,
+                            ciphering and writes overlapped on three threads, or 'auto' to pick stream or mmap by file size.
+        pipeline_depth (int): Number of chunks queued between the stages of the 'pipeline' backend.
+        pipeline_stats (dict): Queue depth and stage timings of the last file processed with the 'pipeline' backend.
+        progress_reporter (ProgressReporter): Optional, receives the processed byte count, throttled.
+        resumable   (bool): Journal the progress of encryptions so an interrupted one continues where it stopped.
+        checkpoint_interval (float): Minimum seconds between two checkpoints of a resumable encryption.
+        fsync_output (bool): Flush every output file to stable storage before moving it to its final path.
+        compression  (str): Name of the codec compressing files before encryption, see Core.Codecs, or None.
+        codec_used   (str): Codec the last file was encrypted or decrypted with, None if it was not compressed.
+        instrument  (bool): Time the phases of every path based operation, see Core.Instrumentation.
+        last_metrics (dict): Phase timers and byte counters of the last operation when instrumented, else None.
+        kdf          (int): Id of the key derivation function of new files, see Core.KDF.
     """
-    def __init__(self, key_length: int = 32, salt_length: int = 32, nonce_length: int = 12, buffer_size: int = 65536, tag_size: int = 16):
+    def __init__(self, key_length: int = 32, salt_length: int = 32, nonce_length: int = 12, buffer_size: int = 65536, tag_size: int = 16,
+                 key_cache: KeyCache | None = None, segment_size: int = 0, segment_workers: int = 1, io_backend: str = 'auto',
+                 auto_buffer: bool = False, pipeline_depth: int = 4, resumable: bool = False,
+                 checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL, fsync_output: bool = True,
+                 compression: str | None = None, instrument: bool = False, kdf: str = 'pbkdf2'):
         """
         Initializes the CryptoManager.
 
@@ -29,33 +70,89 @@ class CryptoManager:
             nonce_length (int): Length of the nonce to use for cipher.
             buffer_size  (int): Size of buffer for reading of files.
             tag_size     (int): Size of tag for verification.
+            key_cache (KeyCache): Optional cache of derived keys, shared between CryptoManagers of a batch.
+            segment_size (int): If not 0, encrypt into independently authenticated segments of this size (seekable format).
+            segment_workers (int): Number of threads processing segments of one segmented file in parallel.
+            io_backend   (str): 'stream' for buffered reads and writes, 'mmap' for memory-mapped files, 'pipeline' for reads,
+                                ciphering and writes overlapped on three threads, or 'auto' to pick stream or mmap by file size.
+            auto_buffer (bool): Pick the buffer size per file from file size, filesystem block size and a calibration probe.
+            pipeline_depth (int): Number of chunks queued between the stages of the 'pipeline' backend.
+            resumable   (bool): Journal the progress of encryptions so an interrupted one continues where it stopped.
+                                Needs the segmented format, DEFAULT_SEGMENT_SIZE is used if segment_size is 0.
+            checkpoint_interval (float): Minimum seconds between two checkpoints of a resumable encryption.
+            fsync_output (bool): Flush every output file to stable storage before moving it to its final path.
+            compression  (str): Name of the codec compressing files before encryption, see Core.Codecs, or None.
+                                Only used for the single stream format, files that look incompressible are not compressed.
+            instrument  (bool): Time key derivation, reads, cipher, writes and tag handling of encrypt, decrypt
+                                and verify, the results are left in last_metrics. Costs nothing when off.
+            kdf          (str): Key derivation function of new files: 'pbkdf2' (HMAC-SHA1, readable by every version),
+                                'pbkdf2-sha256' or 'scrypt', see Core.KDF. Decryption uses the one named in the header.
         """
+        if io_backend not in ('stream', 'mmap', 'pipeline', 'auto'):
+            raise ValueError('Unknown io_backend: ' + io_backend)
+        if compression is not None:
+            get_codec(compression)
         self.key_length = key_length
         self.salt_length = salt_length
         self.nonce_length = nonce_length
-        self.ext_len = 3
         self.buffer_size = buffer_size
         self.tag_size = tag_size
+        self.key_cache = key_cache
+        if not 0 <= segment_size <= MAX_SEGMENT_SIZE:
+            raise ValueError('segment_size must be between 0 and ' + str(MAX_SEGMENT_SIZE) + ' bytes.')
+        self.segment_size = segment_size or (DEFAULT_SEGMENT_SIZE if resumable else 0)
+        self.segment_workers = segment_workers
+        self.io_backend = io_backend
+        self.auto_buffer = auto_buffer
+        self.buffer_size_used = buffer_size
+        self.pipeline_depth = max(1, pipeline_depth)
+        self.pipeline_stats: dict = {}
+        self.progress_reporter: ProgressReporter | None = None
         self.progress = 0.0
+        self.resumable = resumable
+        self.checkpoint_interval = checkpoint_interval
+        self.fsync_output = fsync_output
+        self.compression = compression
+        self.codec_used: str | None = None
+        self.instrument = instrument
+        self.last_metrics: dict | None = None
+        self._metrics: OperationMetrics | None = None
+        self.kdf = kdf_id(kdf)
 
-    def _derive_key(self, password: str, salt: bytes, iterations: int) -> bytes:
+    def _derive_key(self, password: str, salt: bytes, iterations: int, kdf: int = 0) -> bytes:
         """
-        Derives key used for cipher using a password and a salt
+        Derives key used for cipher using a password and a salt.
+        If a key cache is set, a key derived before with the same inputs is reused.
         
         Parameters:
             password   (str): User password for key generation.
             salt       (bytes): Random salt used for key generation.
-            iterations (int): Number of iterations for key generation.
+            iterations (int): Number of iterations for key generation, the cost parameter N for scrypt.
+            kdf        (int): Id of the key derivation function, see Core.KDF.
 
         Returns:
             bytes           : A byte string that can be used as a key.
         
         """
-        return PBKDF2(password, salt, dkLen=self.key_length, count=iterations)
+        def _derive() -> bytes:
+            return derive_key(password, salt, iterations, kdf, self.key_length)
+
+        if self._metrics is not None:
+            _derive = self._metrics.timed(_derive, 'kdf')
+
+        if self.key_cache is None:
+            return _derive()
+        return self.key_cache.get_or_derive(password, salt, iterations, _derive, kdf)
     
     def get_progress(self) -> float:
         """Returns the progress (float) of the current crypto operation"""
         return self.progress
+
+    def _set_progress(self, done: int, total: int) -> None:
+        """Records the processed byte count of the current crypto operation."""
+        self.progress = done / total if total else 1.0
+        if self.progress_reporter is not None:
+            self.progress_reporter.update(done, total)
     
     def _construct_file_name(self, input_path: str, output_dir: str, file_ext: str) -> str:
         """
@@ -86,37 +183,63 @@ class CryptoManager:
 
         return output_path
     
-    def encrypt(self, input_path: str, password: str, iterations: int, output_dir: str) -> None:
+    @instrumented('encrypt')
+    def encrypt(self, input_path: str, password: str, iterations: int, output_dir: str, batch_key: BatchKey | None = None) -> str:
         """
         Encrypts a file using AES GCM.
+
+        With a batch_key, the salt and iterations of the batch are used and the file key is derived from the
+        batch master key with a per-file salt, which is recorded in a version 2 header.
+        If self.segment_size is set, the file is written in the segmented format, see _parse_segments.
+        The output is written to a temporary file next to output_path and only moved there once complete.
+        If self.resumable is set and a checkpoint journal of an interrupted encryption of the same input exists,
+        the last completed segment is verified and encryption continues after it, see _resume.
             
         Parameters:
-            input_path (str): Path to the file to be encrypted.
-            password   (str): Password to use when deriving key used in cipher.
-            iterations (int): Number of iterations for key generation.
-            output_dir (str): Directory where encrypted files will be saved. If empty, writes next to input file.
+            input_path     (str): Path to the file to be encrypted.
+            password       (str): Password to use when deriving key used in cipher.
+            iterations     (int): Number of iterations for key generation.
+            output_dir     (str): Directory where encrypted files will be saved. If empty, writes next to input file.
+            batch_key (BatchKey): Optional master key shared by all files of a batch, replaces password and iterations.
 
         Returns:
-            None
+            output_path (str): The output path of the encrypted file.
             
         """
-        salt:  bytes = get_random_bytes(self.salt_length)
-        nonce: bytes = get_random_bytes(self.nonce_length)
-        key:   bytes = self._derive_key(password, salt, iterations)
-        
-        cipher = AES.new(key, AES.MODE_GCM, nonce)
-
         if output_dir != '':
             output_path = output_dir + '/' + os.path.basename(input_path) + '.encrypted'
         else:
             output_path = input_path + '.encrypted'
 
-        self._parse_files('encrypt', cipher, input_path, output_path, salt, nonce, iterations)
+        # A resumable encryption keeps its partial output under a fixed name, so a restart can find it
+        journal = CheckpointJournal(output_path, self.checkpoint_interval) if self.resumable else None
+        partial_path = output_path + PARTIAL_SUFFIX if journal is not None else None
+        resumed = self._resume(journal, input_path, partial_path, password) if journal is not None else None
+        if resumed is not None:
+            header, key, start = resumed
+        else:
+            codec = self._choose_codec(input_path)
+            header, key = self._new_header(password, iterations, os.path.splitext(input_path)[1], batch_key, codec)
+            start = 0
+
+        self.codec_used = None
+        with AtomicOutput(output_path, partial_path, journal is not None, self.fsync_output) as temp_path:
+            if header.segment_size:
+                self._parse_segments('encrypt', key, input_path, temp_path, header, journal, start)
+            elif header.codec:
+                self._parse_compressed('encrypt', self._new_cipher(key, header), input_path, temp_path, header)
+            else:
+                self._parse_files('encrypt', self._new_cipher(key, header), input_path, temp_path, header)
+        if journal is not None:
+            journal.remove()
+        return output_path
 
 
-    def decrypt(self, input_path, password: str, output_dir: str) -> None:
+    @instrumented('decrypt')
+    def decrypt(self, input_path, password: str, output_dir: str) -> str:
         """
         Extracts metadata and decrypts a file using AES GCM.
+        The plaintext is written to a temporary file and only moved to the output path once it is authenticated.
 
         Parameters:
             input_path (str): Path to the file to be decrypted.
@@ -124,50 +247,603 @@ class CryptoManager:
             output_dir (str): Directory where decrypted files will be saved. If empty, writes next to input file.
 
         Returns:
-            None          
+            output_path (str): The output path of the decrypted file.
         
         """
+        header = self.read_header(input_path)
+        output_path = self._construct_file_name(input_path, output_dir, header.file_ext)
+
+        key: bytes = self._file_key(password, header)
+        self.codec_used = None
+        with AtomicOutput(output_path, fsync=self.fsync_output) as temp_path:
+            if header.segment_size:
+                self._parse_segments('decrypt', key, input_path, temp_path, header)
+            elif header.codec:
+                self._parse_compressed('decrypt', self._new_cipher(key, header), input_path, temp_path, header)
+            else:
+                self._parse_files('decrypt', self._new_cipher(key, header), input_path, temp_path, header)
+        return output_path
+
+    @instrumented('verify')
+    def verify(self, input_path: str, password: str) -> int:
+        """
+        Authenticates an encrypted file without writing any plaintext, raises ValueError if it is not authentic.
+
+        The ciphertext is streamed through GCM into a reused scratch buffer and the tag is checked at the end,
+        or every segment is checked for the segmented format, so only the input is read and no output is written.
+
+        Parameters:
+            input_path (str): Path to the file to be verified.
+            password   (str): Password to use when deriving key used in cipher.
+
+        Returns:
+            int: Number of plaintext bytes authenticated, compressed bytes for compressed files.
+        """
+        header = self.read_header(input_path)
+        key: bytes = self._file_key(password, header)
+        if header.segment_size:
+            return self._verify_segments(key, input_path, header)
+        return self._verify_stream(self._new_cipher(key, header), input_path, header)
+
+    def _verify_stream(self, cipher, input_path: str, header: FileHeader) -> int:
+        """Feeds the ciphertext of a single stream file to its cipher and verifies the tag."""
+        with open(input_path, 'rb') as input_file:
+            input_file = self._instrument_files(input_file)[0]
+            total_size = os.fstat(input_file.fileno()).st_size - header.length - self.tag_size
+            if total_size < 0:
+                raise ValueError(input_path + ' is too short to contain an encrypted file.')
+            buffer_size = choose_buffer_size(input_path, total_size) if self.auto_buffer else self.buffer_size
+            self.buffer_size_used = buffer_size
+            buffer, scratch = bytearray(buffer_size), bytearray(buffer_size)
+            view, scratch_view = memoryview(buffer), memoryview(scratch)
+            input_file.seek(header.length)
+            total_read = 0
+            while total_read < total_size:
+                to_read = min(buffer_size, total_size - total_read)
+                read = input_file.readinto(view[:to_read])
+                if not read:
+                    raise ValueError(input_path + ' is truncated.')
+                cipher.decrypt(view[:read], output=scratch_view[:read])
+                total_read += read
+                self._set_progress(total_read, total_size)
+            cipher.verify(input_file.read(self.tag_size))
+        self._set_progress(total_size, total_size)
+        return total_size
+
+    def _verify_segments(self, key: bytes, input_path: str, header: FileHeader) -> int:
+        """Verifies every segment of a segmented file, decrypting into a reused scratch buffer."""
         with open(input_path, 'rb') as input_file:
-            salt:  bytes = input_file.read(32)
-            nonce: bytes = input_file.read(12)
-            iterations = int.from_bytes(input_file.read(4), byteorder='big', signed=False)
-            self.ext_len = int.from_bytes(input_file.read(1), 'big')
-            file_ext = input_file.read(self.ext_len).decode('utf-8')
-            output_path = self._construct_file_name(input_path, output_dir, file_ext)
+            input_file = self._instrument_files(input_file)[0]
+            layout = SegmentLayout.from_encrypted_size(header.length, header.segment_size, self.tag_size,
+                                                       os.fstat(input_file.fileno()).st_size)
+            # The header is not authenticated yet, size the buffers from the file rather than from its segment size
+            segment_size = min(header.segment_size, layout.plaintext_size)
+            self.buffer_size_used = segment_size
+            buffer, scratch = bytearray(segment_size + self.tag_size), bytearray(segment_size)
+            view, scratch_view = memoryview(buffer), memoryview(scratch)
+            input_file.seek(header.length)
+            for index in range(layout.count):
+                length = layout.plain_length(index)
+                if input_file.readinto(view[:length + self.tag_size]) != length + self.tag_size:
+                    raise ValueError('Segment ' + str(index) + ' is truncated.')
+                cipher = self._segment_cipher(key, header, index, index == layout.count - 1)
+                cipher.decrypt_and_verify(view[:length], view[length:length + self.tag_size], output=scratch_view[:length])
+                self._set_progress(layout.plain_offset(index) + length, layout.plaintext_size)
+        return layout.plaintext_size
 
-        key: bytes = self._derive_key(password, salt, iterations)   
-        cipher = AES.new(key, AES.MODE_GCM, nonce)
+    def encrypt_bytes(self, data, password: str, iterations: int, file_ext: str = '', batch_key: BatchKey | None = None) -> bytes:
+        """
+        Encrypts bytes held in memory, producing the same format as encrypt.
 
-        self._parse_files('decrypt', cipher, input_path, output_path, salt, nonce, iterations)
+        Parameters:
+            data  (bytes-like): Plaintext, bytes, bytearray or memoryview.
+            password     (str): Password to use when deriving key used in cipher.
+            iterations   (int): Number of iterations for key generation.
+            file_ext     (str): Extension recorded in the header, used to name the file when decrypting to disk.
+            batch_key (BatchKey): Optional master key shared by all files of a batch, replaces password and iterations.
 
-    
-    def _parse_files(self, mode: str, cipher, input_path: str, output_path: str, salt: bytes, nonce: bytes, iterations: int) -> None:
+        Returns:
+            bytes: The encrypted file contents.
+        """
+        header, key = self._new_header(password, iterations, file_ext, batch_key)
+        encryptor = StreamEncryptor(self, header, key)
+        return encryptor.update(data) + encryptor.finalize()
+
+    def decrypt_bytes(self, data, password: str) -> bytes:
+        """
+        Decrypts encrypted file contents held in memory. The plaintext is only returned once it is authenticated.
+
+        Parameters:
+            data (bytes-like): Encrypted file contents, bytes, bytearray or memoryview.
+            password    (str): Password to use when deriving key used in cipher.
+
+        Returns:
+            bytes: The plaintext.
+        """
+        decryptor = StreamDecryptor(self)
+        decryptor.update(data)
+        if decryptor.header is None:
+            raise ValueError('Data is too short to contain an encrypted file.')
+        decryptor.start(self._file_key(password, decryptor.header))
+        return b''.join(decryptor.chunks(b'')) + decryptor.finalize()
+
+    def encrypt_stream(self, input_stream, output_stream, password: str, iterations: int, file_ext: str = '',
+                       batch_key: BatchKey | None = None) -> FileHeader:
+        """
+        Encrypts a binary file-like object into another one, such as sys.stdin.buffer into sys.stdout.buffer.
+        With compression set, the stream is compressed unconditionally since it cannot be sampled beforehand.
+
+        Parameters:
+            input_stream      : Readable binary file-like object.
+            output_stream     : Writable binary file-like object.
+            password     (str): Password to use when deriving key used in cipher.
+            iterations   (int): Number of iterations for key generation.
+            file_ext     (str): Extension recorded in the header, used to name the file when decrypting to disk.
+            batch_key (BatchKey): Optional master key shared by all files of a batch, replaces password and iterations.
+
+        Returns:
+            FileHeader: The header of the encrypted output.
+        """
+        codec = get_codec(self.compression) if self.compression is not None and not self.segment_size else None
+        self.codec_used = codec.name if codec is not None else None
+        header, key = self._new_header(password, iterations, file_ext, batch_key, codec)
+        encryptor = StreamEncryptor(self, header, key)
+        compressor = codec.compressor() if codec is not None else None
+        while True:
+            chunk = input_stream.read(self.buffer_size)
+            if not chunk:
+                break
+            output_stream.write(encryptor.update(chunk if compressor is None else compressor.compress(chunk)))
+        if compressor is not None:
+            output_stream.write(encryptor.update(compressor.flush()))
+        output_stream.write(encryptor.finalize())
+        return header
+
+    def decrypt_stream(self, input_stream, output_stream, password: str) -> FileHeader:
+        """
+        Decrypts a binary file-like object into another one, raises ValueError if the data is not authentic.
+
+        For single stream files the plaintext is written before the tag at the end is verified,
+        so the output must be discarded if ValueError is raised. Segmented files are verified segment by segment.
+
+        Parameters:
+            input_stream      : Readable binary file-like object.
+            output_stream     : Writable binary file-like object.
+            password     (str): Password to use when deriving key used in cipher.
+
+        Returns:
+            FileHeader: The header of the encrypted input.
+        """
+        decryptor = StreamDecryptor(self)
+        while True:
+            chunk = input_stream.read(self.buffer_size)
+            if not chunk:
+                break
+            for plaintext in decryptor.chunks(chunk):
+                output_stream.write(plaintext)
+            if decryptor.header is not None and not decryptor.started:
+                decryptor.start(self._file_key(password, decryptor.header))
+                for plaintext in decryptor.chunks(b''):
+                    output_stream.write(plaintext)
+        output_stream.write(decryptor.finalize())
+        return decryptor.header
+
+    def _new_header(self, password: str, iterations: int, file_ext: str, batch_key: BatchKey | None = None,
+                    codec: Codec | None = None) -> tuple[FileHeader, bytes]:
+        """
+        Creates the header of a new encrypted file and derives its key.
+
+        Parameters:
+            password       (str): Password to use when deriving key used in cipher.
+            iterations     (int): Number of iterations for key generation.
+            file_ext       (str): Extension of the original file, including the dot.
+            batch_key (BatchKey): Optional master key shared by all files of a batch, replaces password and iterations.
+            codec        (Codec): Optional codec the plaintext is compressed with, recorded in the header.
+
+        Returns:
+            tuple[FileHeader, bytes]: The header and the key of the file.
+        """
+        options = {}
+        if self.segment_size:
+            nonce: bytes = get_random_bytes(NONCE_PREFIX_LENGTH)
+            options[OPT_SEGMENT_SIZE] = self.segment_size.to_bytes(4, 'big')
+        else:
+            nonce: bytes = get_random_bytes(self.nonce_length)
+        if codec is not None:
+            options[OPT_CODEC] = codec.codec_id.to_bytes(1, 'big')
+
+        kdf = batch_key.kdf if batch_key is not None else self.kdf
+        if kdf:
+            options[OPT_KDF] = kdf.to_bytes(1, 'big')
+
+        if batch_key is not None:
+            key_salt: bytes = get_random_bytes(self.salt_length)
+            options[OPT_KEY_SALT] = key_salt
+            header = FileHeader(batch_key.salt, nonce, batch_key.iterations, file_ext, 2, options)
+            derive_file_key = batch_key.derive_file_key
+            if self._metrics is not None:
+                # The first file of a batch also pays for the master key derivation
+                derive_file_key = self._metrics.timed(derive_file_key, 'kdf')
+            key: bytes = derive_file_key(key_salt)
+        else:
+            salt: bytes = get_random_bytes(self.salt_length)
+            header = FileHeader(salt, nonce, iterations, file_ext, 2 if options else 1, options)
+            key: bytes = self._derive_key(password, salt, iterations, kdf)
+        return header, key
+
+    def decrypt_range(self, input_path: str, password: str, offset: int, length: int) -> bytes:
+        """
+        Decrypts part of a file written in the segmented format, only reading the segments holding the range.
+
+        Parameters:
+            input_path (str): Path to the file to be decrypted.
+            password   (str): Password to use when deriving key used in cipher.
+            offset     (int): Offset of the first plaintext byte to return.
+            length     (int): Number of plaintext bytes to return, fewer are returned at the end of the file.
+
+        Returns:
+            bytes           : The authenticated plaintext of the range.
+        """
+        if offset < 0 or length < 0:
+            raise ValueError('offset and length must not be negative.')
+        header = self.read_header(input_path)
+        if not header.segment_size:
+            raise ValueError(input_path + ' is not in the segmented format, random access is not possible.')
+        key: bytes = self._file_key(password, header)
+
+        with open(input_path, 'rb') as input_file:
+            input_file.seek(0, 2)
+            layout = SegmentLayout.from_encrypted_size(header.length, header.segment_size, self.tag_size, input_file.tell())
+            parts = []
+            for index in layout.segments_for_range(offset, length):
+                input_file.seek(layout.encrypted_offset(index))
+                plaintext = self._open_segment(key, header, layout, index, input_file.read(layout.plain_length(index) + self.tag_size))
+                start = max(offset - layout.plain_offset(index), 0)
+                end = min(offset + length - layout.plain_offset(index), len(plaintext))
+                parts.append(plaintext[start:end])
+        return b''.join(parts)
+
+    def _resume(self, journal: CheckpointJournal, input_path: str, partial_path: str, password: str) -> tuple[FileHeader, bytes, int] | None:
+        """
+        Prepares to continue an interrupted encryption from its checkpoint journal.
+
+        The key is not journaled, it is derived again from the password and the header of the partial output.
+        The last completed segment is decrypted to check the password and the data on disk before anything is appended,
+        and compared with the input. If the input no longer holds that plaintext, encryption starts over with a new header.
+
+        Parameters:
+            journal (CheckpointJournal): Journal of the output.
+            input_path            (str): Path to the file to be encrypted.
+            partial_path          (str): Path to the partial encrypted file.
+            password              (str): Password to use when deriving key used in cipher.
+
+        Returns:
+            tuple[FileHeader, bytes, int]: Header, key and number of completed segments,
+                                           None if there is nothing to resume and encryption must start over.
+        """
+        state = journal.read()
+        if state is None or not journal.matches(state, input_path):
+            return None
+        try:
+            header_bytes = bytes.fromhex(state['header'])
+            header = FileHeader.from_bytes(header_bytes)
+            with open(partial_path, 'rb') as output_file:
+                if output_file.read(len(header_bytes)) != header_bytes:
+                    return None
+        except (OSError, ValueError, EOFError):
+            return None
+        if not header.segment_size:
+            return None
+
+        key: bytes = self._file_key(password, header)
+        layout = SegmentLayout(header.length, header.segment_size, self.tag_size, state['input_size'])
+        start = min(int(state['segments']), layout.count)
+        if start > 0:
+            with open(partial_path, 'rb') as output_file:
+                output_file.seek(layout.encrypted_offset(start - 1))
+                data = output_file.read(layout.plain_length(start - 1) + self.tag_size)
+            try:
+                plaintext = self._open_segment(key, header, layout, start - 1, data)
+            except ValueError:
+                raise ValueError('Checkpoint of ' + partial_path + ' could not be verified, '
+                                 'the password is wrong or the partial output is corrupted.')
+            # Size and modification time can match a rewritten input. Continuing would encrypt new plaintext
+            # under the nonces of the old one, so the input must still hold what was encrypted
+            try:
+                with open(input_path, 'rb') as input_file:
+                    input_file.seek(layout.plain_offset(start - 1))
+                    if input_file.read(layout.plain_length(start - 1)) != plaintext:
+                        return None
+            except OSError:
+                return None
+        return header, key, start
+
+    def _file_key(self, password: str, header: FileHeader) -> bytes:
+        """Derives the key of an encrypted file from the password and its header."""
+        key: bytes = self._derive_key(password, header.salt, header.iterations, header.kdf)
+        if header.key_salt is not None:
+            key = derive_subkey(key, header.key_salt, self.key_length)
+        return key
+
+    def read_header(self, input_path: str) -> FileHeader:
+        """Reads the header of an encrypted file."""
+        with open(input_path, 'rb') as input_file:
+            try:
+                return FileHeader.from_file(input_file)
+            except EOFError:
+                raise ValueError(input_path + ' is not a valid encrypted file.')
+
+    def _new_cipher(self, key: bytes, header: FileHeader):
+        """Creates the AES GCM cipher for a file and authenticates its header."""
+        cipher = AES.new(key, AES.MODE_GCM, header.nonce, mac_len=self.tag_size)
+        associated_data = header.associated_data()
+        if associated_data:
+            cipher.update(associated_data)
+        return cipher if self._metrics is None else self._metrics.cipher(cipher)
+
+    def _instrument_files(self, *files) -> tuple:
+        """Returns the files wrapped to time their reads and writes when an operation is instrumented, else as they are."""
+        if self._metrics is None:
+            return files
+        return tuple(self._metrics.file(file_object) for file_object in files)
+
+
+    def _segment_cipher(self, key: bytes, header: FileHeader, index: int, last: bool):
+        """Creates the AES GCM cipher of one segment, the header is authenticated with every segment."""
+        cipher = AES.new(key, AES.MODE_GCM, segment_nonce(header.nonce, index, last), mac_len=self.tag_size)
+        cipher.update(header.associated_data())
+        return cipher if self._metrics is None else self._metrics.cipher(cipher)
+
+    def _seal_segment(self, key: bytes, header: FileHeader, index: int, last: bool, plaintext) -> bytes:
+        """Encrypts one segment and returns its ciphertext followed by its tag."""
+        ciphertext, tag = self._segment_cipher(key, header, index, last).encrypt_and_digest(plaintext)
+        return ciphertext + tag
+
+    def _open_segment(self, key: bytes, header: FileHeader, layout: SegmentLayout, index: int, data) -> bytes:
+        """Decrypts and verifies one segment, raises ValueError if it is not authentic."""
+        if len(data) != layout.plain_length(index) + self.tag_size:
+            raise ValueError('Segment ' + str(index) + ' is truncated.')
+        cipher = self._segment_cipher(key, header, index, index == layout.count - 1)
+        split = len(data) - self.tag_size
+        return cipher.decrypt_and_verify(data[:split], data[split:])
+
+    def _parse_segments(self, mode: str, key: bytes, input_path: str, output_path: str, header: FileHeader,
+                        journal: CheckpointJournal | None = None, start: int = 0) -> None:
+        """
+        Performs encryption or decryption of a file in the segmented format.
+        Every segment is verified before it is written, so corruption is detected at the segment it happens in.
+
+        Parameters:
+            mode             (str): Encryption or Decryption mode
+            key            (bytes): Key of the file.
+            input_path       (str): Path to the file being encrypted or decrypted.
+            output_path      (str): Path to the output file of encryption or decryption.
+            header    (FileHeader): Header of the encrypted file, written on encryption and skipped on decryption.
+            journal (CheckpointJournal): Optional, records the completed segments while encrypting.
+            start            (int): Number of segments already encrypted in output_path, they are kept as they are.
+
+        Returns:
+            None
+        """
+        self.buffer_size_used = header.segment_size
+        with open(input_path, 'rb') as input_file, open(output_path, 'r+b' if start else 'wb') as output_file:
+            input_file, output_file = self._instrument_files(input_file, output_file)
+            input_file.seek(0, 2)
+            if mode == 'encrypt':
+                layout = SegmentLayout(header.length, header.segment_size, self.tag_size, input_file.tell())
+                if start:
+                    output_file.truncate(layout.encrypted_offset(start))
+                    output_file.seek(layout.encrypted_offset(start))
+                else:
+                    output_file.write(header.to_bytes())
+                input_file.seek(layout.plain_offset(start))
+                if journal is not None:
+                    journal.start(input_path, header.to_bytes(), start)
+                    journal.checkpoint(output_file, start, force=True)
+            else:
+                layout = SegmentLayout.from_encrypted_size(header.length, header.segment_size, self.tag_size, input_file.tell())
+                input_file.seek(header.length)
+            self._set_progress(min(layout.plain_offset(start), layout.plaintext_size), layout.plaintext_size)
+
+            if self.segment_workers > 1 and layout.count - start > 1:
+                self._parse_segments_parallel(mode, key, input_file, output_file, header, layout, journal, start)
+                return
+
+            for index in range(start, layout.count):
+                if mode == 'encrypt':
+                    plaintext = input_file.read(layout.plain_length(index))
+                    output_file.write(self._seal_segment(key, header, index, index == layout.count - 1, plaintext))
+                    if journal is not None:
+                        journal.checkpoint(output_file, index + 1)
+                else:
+                    data = input_file.read(layout.plain_length(index) + self.tag_size)
+                    output_file.write(self._open_segment(key, header, layout, index, data))
+                self._set_progress(layout.plain_offset(index) + layout.plain_length(index), layout.plaintext_size)
+
+    def _parse_segments_parallel(self, mode: str, key: bytes, input_file, output_file, header: FileHeader, layout: SegmentLayout,
+                                 journal: CheckpointJournal | None = None, start: int = 0) -> None:
+        """
+        Processes the segments of one file in a thread pool.
+        The output is preallocated and every segment is written at its own offset, so segments may finish in any order.
+        PyCryptodome releases the GIL while ciphering, so the threads run on separate cores.
+
+        Parameters:
+            mode               (str): Encryption or Decryption mode
+            key              (bytes): Key of the file.
+            input_file              : Open input file.
+            output_file             : Open output file, the header is already written when encrypting.
+            header      (FileHeader): Header of the encrypted file.
+            layout   (SegmentLayout): Layout of the segments.
+            journal (CheckpointJournal): Optional, records the completed segments while encrypting.
+            start              (int): Index of the first segment to process.
+
+        Returns:
+            None
+        """
+        output_file.flush()
+        output_file.truncate(layout.encrypted_size if mode == 'encrypt' else layout.plaintext_size)
+        input_fd, output_fd = input_file.fileno(), output_file.fileno()
+        io_lock = threading.Lock()
+
+        def _read_at(size: int, offset: int) -> bytes:
+            if hasattr(os, 'pread'):
+                return os.pread(input_fd, size, offset)
+            with io_lock:
+                os.lseek(input_fd, offset, os.SEEK_SET)
+                return os.read(input_fd, size)
+
+        def _write_at(data: bytes, offset: int) -> None:
+            view = memoryview(data)
+            while view:
+                if hasattr(os, 'pwrite'):
+                    written = os.pwrite(output_fd, view, offset)
+                else:
+                    with io_lock:
+                        os.lseek(output_fd, offset, os.SEEK_SET)
+                        written = os.write(output_fd, view)
+                view = view[written:]
+                offset += written
+
+        if self._metrics is not None:
+            _read_at = self._metrics.timed(_read_at, 'read', read_size)
+            _write_at = self._metrics.timed(_write_at, 'write', write_size)
+
+        def _process(index: int) -> int:
+            last = index == layout.count - 1
+            if mode == 'encrypt':
+                plaintext = _read_at(layout.plain_length(index), layout.plain_offset(index))
+                _write_at(self._seal_segment(key, header, index, last, plaintext), layout.encrypted_offset(index))
+            else:
+                data = _read_at(layout.plain_length(index) + self.tag_size, layout.encrypted_offset(index))
+                _write_at(self._open_segment(key, header, layout, index, data), layout.plain_offset(index))
+            return index
+
+        # Segments finish out of order, the journal records the completed prefix
+        completed = set()
+        prefix = start
+
+        def _collect(finished) -> None:
+            nonlocal prefix
+            for future in finished:
+                completed.add(future.result())
+            while prefix in completed:
+                completed.remove(prefix)
+                prefix += 1
+            if journal is not None and mode == 'encrypt':
+                journal.checkpoint(output_file, prefix)
+
+        # Bound the number of queued segments so memory use does not grow with the file size
+        max_pending = self.segment_workers * 2
+        done = start
+        with ThreadPoolExecutor(max_workers=self.segment_workers) as executor:
+            pending = set()
+            for index in range(start, layout.count):
+                pending.add(executor.submit(_process, index))
+                if len(pending) >= max_pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    _collect(finished)
+                    done += len(finished)
+                    self._set_progress(min(done * layout.segment_size, layout.plaintext_size), layout.plaintext_size)
+            _collect(wait(pending)[0])
+        self._set_progress(layout.plaintext_size, layout.plaintext_size)
+
+    def _choose_codec(self, input_path: str) -> Codec | None:
+        """Returns the codec to compress a file with, None if compression is off, not possible or not worth it."""
+        if self.compression is None or self.segment_size:
+            # Segments must map to fixed plaintext offsets for random access, so they are never compressed
+            return None
+        try:
+            return get_codec(self.compression) if is_compressible(input_path) else None
+        except OSError:
+            return None
+
+    def _parse_compressed(self, mode: str, cipher, input_path: str, output_path: str, header: FileHeader) -> None:
+        """
+        Variant of _parse_files with a compression stage in front of the cipher.
+        Encryption compresses every chunk read before ciphering it, decryption deciphers and then decompresses,
+        with a bounded amount of output per step. Progress counts the bytes read from the input.
+
+        Parameters:
+            mode             (str): Encryption or Decryption mode
+            cipher              : The AES GCM cipher of the file.
+            input_path       (str): Path to the file being encrypted or decrypted.
+            output_path      (str): Path to the output file of encryption or decryption.
+            header    (FileHeader): Header of the encrypted file, written on encryption and skipped on decryption.
+
+        Returns:
+            None
+        """
+        codec = get_codec(header.codec)
+        self.codec_used = codec.name
+        self.buffer_size_used = self.buffer_size
+        with open(input_path, 'rb') as input_file, open(output_path, 'wb') as output_file:
+            input_file, output_file = self._instrument_files(input_file, output_file)
+            input_size = os.fstat(input_file.fileno()).st_size
+            total_read = 0
+            if mode == 'encrypt':
+                output_file.write(header.to_bytes())
+                compressor = codec.compressor()
+                while True:
+                    chunk = input_file.read(self.buffer_size)
+                    if not chunk:
+                        break
+                    compressed = compressor.compress(chunk)
+                    if compressed:
+                        output_file.write(cipher.encrypt(compressed))
+                    total_read += len(chunk)
+                    self._set_progress(total_read, input_size)
+                output_file.write(cipher.encrypt(compressor.flush()))
+                output_file.write(cipher.digest())
+                self._set_progress(input_size, input_size)
+                return
+
+            total_size = input_size - header.length - self.tag_size
+            if total_size < 0:
+                raise ValueError(input_path + ' is too short to contain an encrypted file.')
+            input_file.seek(header.length)
+            decompressor = codec.decompressor()
+            while total_read < total_size:
+                chunk = input_file.read(min(self.buffer_size, total_size - total_read))
+                if not chunk:
+                    raise ValueError(input_path + ' is truncated.')
+                for plaintext in decompressor.decompress(cipher.decrypt(chunk)):
+                    output_file.write(plaintext)
+                total_read += len(chunk)
+                self._set_progress(total_read, total_size)
+            cipher.verify(input_file.read(self.tag_size))
+            decompressor.finish()
+            self._set_progress(total_size, total_size)
+
+    def _parse_files(self, mode: str, cipher, input_path: str, output_path: str, header: FileHeader) -> None:
         """
         Peforms the reading and writing process of the encryption or decryption. 
-        Parses the input file in self.buffer_size chunks, encrypting or decrypting them, and writing the result to an output file.
+        Parses the input file in self.buffer_size chunks (or a tuned size with auto_buffer), encrypting or decrypting them, and writing the result to an output file.
 
         Parameters:
-            mode        (str): Encryption or Decryption mode
-            input_path  (str): Path to the file being encrypted or decrypted.
-            output_path (str): Path to the output file of encryption or decryption.
-            salt      (bytes): Salt used in key derivation, to be written in encrypted file.
-            nonce     (bytes): Nonce used in cipher creation, to be written in encrypted file.
+            mode             (str): Encryption or Decryption mode
+            cipher              : The AES GCM cipher of the file.
+            input_path       (str): Path to the file being encrypted or decrypted.
+            output_path      (str): Path to the output file of encryption or decryption.
+            header    (FileHeader): Header of the encrypted file, written on encryption and skipped on decryption.
 
         Returns:
             None
         
         """
+        input_size = os.path.getsize(input_path)
+        if self._use_mmap(mode, input_size, header):
+            self.buffer_size_used = MMAP_CHUNK_SIZE
+            self._parse_files_mmap(mode, cipher, input_path, output_path, header)
+            return
+
+        buffer_size = choose_buffer_size(input_path, input_size) if self.auto_buffer else self.buffer_size
+        self.buffer_size_used = buffer_size
+
         with open(input_path, 'rb') as input_file, open(output_path, 'wb') as output_file:
+            input_file, output_file = self._instrument_files(input_file, output_file)
             if mode == 'encrypt':
                 # Write metadata
-                output_file.write(salt)
-                output_file.write(nonce)
-                output_file.write(iterations.to_bytes(4, byteorder="big", signed=False))
-
-                file_ext = os.path.splitext(input_path)[1].encode('utf-8')
-                ext_len = len(file_ext).to_bytes(1, 'big')
-                output_file.write(ext_len)
-                output_file.write(file_ext)
+                output_file.write(header.to_bytes())
 
             # Seek end of file and determine file_size
             input_file.seek(0, 2)
@@ -178,24 +854,15 @@ class CryptoManager:
                 input_file.seek(0, 0)
             if mode == 'decrypt': 
                 # Subtract metadata to determine file size
-                # 4 is the number of iterations in bytes
-                # 1 is the extension length in bytes
-                total_size = total_size - self.salt_length - self.nonce_length - self.tag_size - 4 - 1 - self.ext_len
-                input_file.seek(self.salt_length + self.nonce_length + 4 + 1 + self.ext_len)
+                total_size = total_size - header.length - self.tag_size
+                if total_size < 0:
+                    raise ValueError(input_path + ' is too short to contain an encrypted file.')
+                input_file.seek(header.length)
 
-            # Actual bytes parsing
-            total_read = 0
-            while True:
-                to_read = min(self.buffer_size, total_size - total_read) if mode == 'decrypt' else self.buffer_size
-                chunk = input_file.read(to_read)
-                if not chunk:
-                    break
-                if mode == 'encrypt':
-                    output_file.write(cipher.encrypt(chunk))
-                elif mode == 'decrypt':
-                    output_file.write(cipher.decrypt(chunk))
-                total_read += len(chunk)
-                self.progress = total_read / total_size
+            if self.io_backend == 'pipeline':
+                self._run_pipeline(mode, cipher, input_file, output_file, total_size, buffer_size)
+            else:
+                self._run_loop(mode, cipher, input_file, output_file, total_size, buffer_size)
 
             if mode == 'encrypt':
                 # Write tag
@@ -204,4 +871,215 @@ class CryptoManager:
             elif mode == 'decrypt':
                 # Verify tag
                 tag = input_file.read(self.tag_size)
-                cipher.verify(tag)
\ No newline at end of file
+                cipher.verify(tag)
+            self._set_progress(total_size, total_size)
+
+    def _run_loop(self, mode: str, cipher, input_file, output_file, total_size: int, buffer_size: int) -> None:
+        """Ciphers total_size bytes from input_file to output_file on the calling thread."""
+        # Actual bytes parsing, reusing the same buffers for every chunk so the loop does not allocate
+        buffer = bytearray(buffer_size)
+        output_buffer = bytearray(buffer_size)
+        view, output_view = memoryview(buffer), memoryview(output_buffer)
+        process = cipher.encrypt if mode == 'encrypt' else cipher.decrypt
+        total_read = 0
+        while True:
+            to_read = min(buffer_size, total_size - total_read) if mode == 'decrypt' else buffer_size
+            read = input_file.readinto(view if to_read == buffer_size else view[:to_read])
+            if not read:
+                break
+            if read == buffer_size:
+                process(view, output=output_view)
+                output_file.write(output_view)
+            else:
+                process(view[:read], output=output_view[:read])
+                output_file.write(output_view[:read])
+            total_read += read
+            self._set_progress(total_read, total_size)
+
+    def _run_pipeline(self, mode: str, cipher, input_file, output_file, total_size: int, buffer_size: int) -> None:
+        """
+        Ciphers total_size bytes from input_file to output_file with overlapped I/O.
+
+        A reader thread fills buffers from a fixed pool, the calling thread ciphers them in place and a writer thread
+        drains them back to the pool. Reads, AES and writes overlap since file I/O and PyCryptodome release the GIL.
+        Queue depths and stage timings are stored in self.pipeline_stats.
+
+        Parameters:
+            mode         (str): Encryption or Decryption mode
+            cipher          : The AES GCM cipher of the file.
+            input_file      : Open input file, positioned at the start of the data.
+            output_file     : Open output file.
+            total_size   (int): Number of bytes to cipher.
+            buffer_size  (int): Size of every chunk.
+
+        Returns:
+            None
+        """
+        free_buffers: queue.Queue = queue.Queue()
+        for _ in range(self.pipeline_depth * 2 + 1):
+            free_buffers.put(memoryview(bytearray(buffer_size)))
+        read_queue: queue.Queue = queue.Queue(maxsize=self.pipeline_depth)
+        write_queue: queue.Queue = queue.Queue(maxsize=self.pipeline_depth)
+        timings = {'read': 0.0, 'cipher': 0.0, 'write': 0.0, 'cipher_wait': 0.0}
+        depth_samples = {'read': 0, 'write': 0, 'max_read': 0, 'max_write': 0, 'count': 0}
+        errors = []
+
+        def _reader() -> None:
+            try:
+                remaining = total_size
+                # Stop early once the writer failed, its buffers may not come back
+                while remaining > 0 and not errors:
+                    buffer = free_buffers.get()
+                    start = perf_counter()
+                    read = input_file.readinto(buffer[:min(buffer_size, remaining)])
+                    timings['read'] += perf_counter() - start
+                    if not read:
+                        free_buffers.put(buffer)
+                        break
+                    remaining -= read
+                    read_queue.put((buffer, read))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                read_queue.put(None)
+
+        def _writer() -> None:
+            try:
+                while True:
+                    item = write_queue.get()
+                    if item is None:
+                        return
+                    buffer, size = item
+                    if not errors:
+                        start = perf_counter()
+                        output_file.write(buffer[:size])
+                        timings['write'] += perf_counter() - start
+                    free_buffers.put(buffer)
+            except BaseException as e:
+                errors.append(e)
+                # Keep draining, returning the buffers, so neither the cipher stage nor the reader is blocked
+                while True:
+                    item = write_queue.get()
+                    if item is None:
+                        return
+                    free_buffers.put(item[0])
+
+        reader = threading.Thread(target=_reader, daemon=True)
+        writer = threading.Thread(target=_writer, daemon=True)
+        reader.start()
+        writer.start()
+
+        process = cipher.encrypt if mode == 'encrypt' else cipher.decrypt
+        total_read = 0
+        try:
+            while True:
+                start = perf_counter()
+                item = read_queue.get()
+                timings['cipher_wait'] += perf_counter() - start
+                if item is None:
+                    break
+                if errors:
+                    free_buffers.put(item[0])
+                    break
+                read_depth, write_depth = read_queue.qsize(), write_queue.qsize()
+                depth_samples['read'] += read_depth
+                depth_samples['write'] += write_depth
+                depth_samples['max_read'] = max(depth_samples['max_read'], read_depth)
+                depth_samples['max_write'] = max(depth_samples['max_write'], write_depth)
+                depth_samples['count'] += 1
+
+                buffer, size = item
+                start = perf_counter()
+                process(buffer[:size], output=buffer[:size])
+                timings['cipher'] += perf_counter() - start
+                write_queue.put((buffer, size))
+                total_read += size
+                self._set_progress(total_read, total_size)
+        finally:
+            write_queue.put(None)
+            writer.join()
+            if reader.is_alive():
+                # Only happens if the cipher stage failed, unblock the reader so it can finish
+                while reader.is_alive():
+                    try:
+                        free_buffers.put(read_queue.get(timeout=0.1)[0])
+                    except (queue.Empty, TypeError):
+                        pass
+            reader.join()
+
+        count = max(depth_samples['count'], 1)
+        stage_times = {'read': timings['read'], 'cipher': timings['cipher'], 'write': timings['write']}
+        self.pipeline_stats = {
+            'queue_depth': self.pipeline_depth,
+            'chunks': depth_samples['count'],
+            'avg_read_queue': round(depth_samples['read'] / count, 2),
+            'avg_write_queue': round(depth_samples['write'] / count, 2),
+            'max_read_queue': depth_samples['max_read'],
+            'max_write_queue': depth_samples['max_write'],
+            'read_seconds': round(timings['read'], 6),
+            'cipher_seconds': round(timings['cipher'], 6),
+            'write_seconds': round(timings['write'], 6),
+            'cipher_wait_seconds': round(timings['cipher_wait'], 6),
+            # No stage did any work on an empty input
+            'bottleneck': max(stage_times, key=stage_times.get) if depth_samples['count'] else None,
+        }
+        if errors:
+            raise errors[0]
+
+    def _use_mmap(self, mode: str, input_size: int, header: FileHeader) -> bool:
+        """Returns whether a file is processed with memory-mapped I/O, empty inputs or outputs cannot be mapped."""
+        if self.io_backend in ('stream', 'pipeline'):
+            return False
+        data_size = input_size if mode == 'encrypt' else input_size - header.length - self.tag_size
+        if data_size <= 0:
+            return False
+        return self.io_backend == 'mmap' or input_size >= MMAP_THRESHOLD
+
+    def _parse_files_mmap(self, mode: str, cipher, input_path: str, output_path: str, header: FileHeader) -> None:
+        """
+        Memory-mapped variant of _parse_files.
+        The input is mapped read-only and the output is preallocated to its final size and mapped writable,
+        so the cipher reads from and writes to the mappings directly without intermediate buffers.
+
+        Parameters:
+            mode             (str): Encryption or Decryption mode
+            cipher              : The AES GCM cipher of the file.
+            input_path       (str): Path to the file being encrypted or decrypted.
+            output_path      (str): Path to the output file of encryption or decryption.
+            header    (FileHeader): Header of the encrypted file, written on encryption and skipped on decryption.
+
+        Returns:
+            None
+        """
+        with open(input_path, 'rb') as input_file, open(output_path, 'w+b') as output_file:
+            input_size = os.fstat(input_file.fileno()).st_size
+            if mode == 'encrypt':
+                data_start, data_size = 0, input_size
+                output_start, output_size = header.length, header.length + input_size + self.tag_size
+            else:
+                data_start, data_size = header.length, input_size - header.length - self.tag_size
+                if data_size < 0:
+                    raise ValueError(input_path + ' is too short to contain an encrypted file.')
+                output_start, output_size = 0, data_size
+            output_file.truncate(output_size)
+
+            with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as input_map, \
+                 mmap.mmap(output_file.fileno(), output_size, access=mmap.ACCESS_WRITE) as output_map:
+                input_view, output_view = memoryview(input_map), memoryview(output_map)
+                try:
+                    if mode == 'encrypt':
+                        output_view[:header.length] = header.to_bytes()
+                    process = cipher.encrypt if mode == 'encrypt' else cipher.decrypt
+                    for done in range(0, data_size, MMAP_CHUNK_SIZE):
+                        size = min(MMAP_CHUNK_SIZE, data_size - done)
+                        process(input_view[data_start + done:data_start + done + size],
+                                output=output_view[output_start + done:output_start + done + size])
+                        self._set_progress(done + size, data_size)
+
+                    if mode == 'encrypt':
+                        output_view[output_size - self.tag_size:] = cipher.digest()
+                    else:
+                        cipher.verify(bytes(input_view[input_size - self.tag_size:]))
+                finally:
+                    input_view.release()
+                    output_view.release()
@@ -0,0 +1,167 @@
+from typing import BinaryIO, Callable
+
+MAGIC = b'FEAPP'
+VERSION = 2
+
+# Option tags of version 2 headers
+OPT_KEY_SALT = 1        # Per-file HKDF salt, the key is derived from a batch master key
+OPT_SEGMENT_SIZE = 2    # Plaintext size of a segment (4 bytes), the file is in the segmented format
+OPT_CODEC = 3           # Id of the compression codec (1 byte) the plaintext was compressed with before encryption
+OPT_KDF = 4             # Id of the key derivation function (1 byte), see Core.KDF, PBKDF2-HMAC-SHA1 if absent
+
+
+class FileHeader:
+    """
+    Metadata stored at the start of every encrypted file.
+
+    Version 1 (legacy) layout:
+        salt (32) | nonce (12) | iterations (4) | ext_len (1) | ext
+
+    Version 2 layout:
+        MAGIC (5) | version (1) | salt_len (1) | salt | nonce_len (1) | nonce | iterations (4) | ext_len (1) | ext
+        | option_count (1) | option_count * (tag (1) | length (2) | value)
+
+    Version 1 files start with a random salt, so they are told apart from version 2 files by the magic bytes.
+    The header of a version 2 file is authenticated as associated data of the cipher.
+
+    Attributes:
+        salt       (bytes): Salt used in key derivation.
+        nonce      (bytes): Nonce used in cipher creation.
+        iterations   (int): Number of iterations for key generation, the cost parameter N for scrypt.
+        file_ext     (str): Extension of the original file, including the dot.
+        version      (int): Header version, 1 or 2.
+        options     (dict): Version 2 options as {tag: value}.
+    """
+    def __init__(self, salt: bytes, nonce: bytes, iterations: int, file_ext: str, version: int = 1, options: dict[int, bytes] | None = None):
+        """
+        Initializes the FileHeader.
+
+        Parameters:
+            salt       (bytes): Salt used in key derivation.
+            nonce      (bytes): Nonce used in cipher creation.
+            iterations   (int): Number of iterations for key generation.
+            file_ext     (str): Extension of the original file, including the dot.
+            version      (int): Header version, 1 or 2.
+            options     (dict): Version 2 options as {tag: value}.
+        """
+        if version == 1 and options:
+            raise ValueError('Version 1 headers do not support options.')
+        self.salt = salt
+        self.nonce = nonce
+        self.iterations = iterations
+        self.file_ext = file_ext
+        self.version = version
+        self.options = dict(options or {})
+        self._raw = self._serialize()
+
+    @property
+    def length(self) -> int:
+        """Returns the size of the header in bytes."""
+        return len(self._raw)
+
+    @property
+    def key_salt(self) -> bytes | None:
+        """Returns the per-file HKDF salt, or None if the key is derived directly from the password."""
+        return self.options.get(OPT_KEY_SALT)
+
+    @property
+    def segment_size(self) -> int:
+        """Returns the segment size of a segmented file, or 0 for a single GCM stream."""
+        value = self.options.get(OPT_SEGMENT_SIZE)
+        return int.from_bytes(value, 'big') if value else 0
+
+    @property
+    def codec(self) -> int:
+        """Returns the id of the compression codec, see Core.Codecs, or 0 if the plaintext is not compressed."""
+        value = self.options.get(OPT_CODEC)
+        return value[0] if value else 0
+
+    @property
+    def kdf(self) -> int:
+        """Returns the id of the key derivation function, see Core.KDF, 0 (PBKDF2-HMAC-SHA1) if it is not set."""
+        value = self.options.get(OPT_KDF)
+        return value[0] if value else 0
+
+    def associated_data(self) -> bytes:
+        """Returns the bytes to authenticate with the cipher, empty for version 1 headers."""
+        return self._raw if self.version >= 2 else b''
+
+    def to_bytes(self) -> bytes:
+        """Returns the serialized header."""
+        return self._raw
+
+    def _serialize(self) -> bytes:
+        """Serializes the header according to its version."""
+        ext = self.file_ext.encode('utf-8')
+        if len(ext) > 255:
+            raise ValueError('File extension is too long.')
+        fields = [self.iterations.to_bytes(4, byteorder='big', signed=False), len(ext).to_bytes(1, 'big'), ext]
+        if self.version == 1:
+            return self.salt + self.nonce + b''.join(fields)
+
+        parts = [MAGIC, VERSION.to_bytes(1, 'big'),
+                 len(self.salt).to_bytes(1, 'big'), self.salt,
+                 len(self.nonce).to_bytes(1, 'big'), self.nonce]
+        parts.extend(fields)
+        parts.append(len(self.options).to_bytes(1, 'big'))
+        for tag, value in sorted(self.options.items()):
+            parts.append(tag.to_bytes(1, 'big'))
+            parts.append(len(value).to_bytes(2, 'big'))
+            parts.append(value)
+        return b''.join(parts)
+
+    @classmethod
+    def read(cls, read: Callable[[int], bytes]) -> 'FileHeader':
+        """
+        Parses a header using a read callable.
+
+        Parameters:
+            read (Callable): Called with a byte count, must return exactly that many bytes or raise EOFError.
+
+        Returns:
+            FileHeader: The parsed header.
+        """
+        start = read(len(MAGIC) + 1)
+        if start[:len(MAGIC)] != MAGIC:
+            # Legacy header, the bytes already read are the start of the salt
+            salt = start + read(32 - len(start))
+            nonce = read(12)
+            iterations = int.from_bytes(read(4), byteorder='big', signed=False)
+            file_ext = read(read(1)[0]).decode('utf-8')
+            return cls(salt, nonce, iterations, file_ext)
+
+        if start[-1] != VERSION:
+            raise ValueError('Unsupported file format version: ' + str(start[-1]))
+        salt = read(read(1)[0])
+        nonce = read(read(1)[0])
+        iterations = int.from_bytes(read(4), byteorder='big', signed=False)
+        file_ext = read(read(1)[0]).decode('utf-8')
+        options = {}
+        for _ in range(read(1)[0]):
+            tag = read(1)[0]
+            options[tag] = read(int.from_bytes(read(2), 'big'))
+        return cls(salt, nonce, iterations, file_ext, VERSION, options)
+
+    @classmethod
+    def from_file(cls, input_file: BinaryIO) -> 'FileHeader':
+        """Parses a header from the current position of a binary file object."""
+        def _read(size: int) -> bytes:
+            data = input_file.read(size)
+            if len(data) != size:
+                raise EOFError('File is too short to contain a header.')
+            return data
+        return cls.read(_read)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'FileHeader':
+        """Parses a header from the start of a bytes object, raises EOFError if data is incomplete."""
+        view = memoryview(data)
+        position = 0
+
+        def _read(size: int) -> bytes:
+            nonlocal position
+            if position + size > len(view):
+                raise EOFError('Not enough data to contain a header.')
+            position += size
+            return bytes(view[position - size:position])
+        return cls.read(_read)
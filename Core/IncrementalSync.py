@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+
+from Core.AtomicFile import AtomicOutput
+from Core.BatchRunner import BatchRunner, collect_files
+
+MANIFEST_NAME = '.sync-manifest.json'   # Default manifest file, kept in the output directory
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(path: str) -> str:
+    """Returns the BLAKE2b-128 hex digest of a file. hashlib releases the GIL, so files hash in parallel on threads."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as input_file:
+        while True:
+            chunk = input_file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SyncManifest:
+    """
+    Record of the last synchronization of a source directory: for every file, relative to the source, its size,
+    modification time and content hash, and the path, size and modification time of its encrypted output.
+
+    Attributes:
+        path   (str): Path of the manifest file.
+        files (dict): Entries by relative posix path.
+    """
+    def __init__(self, path: str):
+        """
+        Initializes the SyncManifest and loads it if it exists.
+
+        Parameters:
+            path (str): Path of the manifest file.
+        """
+        self.path = path
+        self.files: dict[str, dict] = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            raise ValueError(path + ' is not a valid sync manifest.')
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError('Unsupported sync manifest version: ' + str(manifest.get('version')))
+        self.files = manifest['files']
+
+    def save(self) -> None:
+        """Writes the manifest atomically, an interrupted save leaves the previous one in place."""
+        with AtomicOutput(self.path) as temp_path, open(temp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.files}, manifest_file, separators=(',', ':'))
+
+
+class IncrementalSync:
+    """
+    Keeps an output directory of encrypted files in step with a source directory, re-encrypting only what changed.
+
+    A scan stats every source file in parallel and compares it with the manifest of the previous run. Files with the
+    same size and modification time, whose output is still the one that was written, are skipped without being read.
+    Files whose modification time changed but whose size did not are hashed, so a touched but unchanged file is not
+    re-encrypted. Added and changed files, and files whose output was deleted or replaced, go through BatchRunner.
+    Outputs of source files that no longer exist are deleted.
+
+    Attributes:
+        source_dir (str): Directory being encrypted.
+        output_dir (str): Directory of the encrypted files, the source layout is kept below it.
+        manifest (SyncManifest): Manifest of the previous run, updated as files finish.
+        runner (BatchRunner): Encrypts the files that need it.
+        delete    (bool): Delete outputs whose source is gone.
+        stats     (dict): Counts of the last run by outcome.
+    """
+    def __init__(self, source_dir: str, output_dir: str, password: str, iterations: int, manifest_path: str | None = None,
+                 workers: int | None = None, include: list[str] | None = None, exclude: list[str] | None = None,
+                 crypto_options: dict | None = None, backend: str = 'thread', delete: bool = True):
+        """
+        Initializes the IncrementalSync.
+
+        Parameters:
+            source_dir     (str): Directory to encrypt, walked recursively.
+            output_dir     (str): Directory of the encrypted files.
+            password       (str): Password to use when deriving keys used in cipher.
+            iterations     (int): Number of iterations for key generation.
+            manifest_path  (str): Path of the manifest. Defaults to MANIFEST_NAME in output_dir.
+            workers        (int): Threads scanning and files encrypted in parallel. Defaults to the cpu count.
+            include  (list[str]): Globs matched against file names, a file must match one of them. None matches all.
+            exclude  (list[str]): Globs matched against file names, a file matching any of them is skipped.
+            crypto_options (dict): Keyword arguments passed to every CryptoManager, see BatchRunner.
+            backend        (str): 'thread' or 'process' pool for encryption.
+            delete        (bool): Delete outputs whose source is gone.
+        """
+        if not os.path.isdir(source_dir):
+            raise ValueError(source_dir + ' is not a directory.')
+        if not output_dir:
+            raise ValueError('An output directory is required.')
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.include = include
+        self.exclude = exclude
+        self.delete = delete
+        self.manifest = SyncManifest(manifest_path or os.path.join(output_dir, MANIFEST_NAME))
+        self.runner = BatchRunner('encrypt', password, iterations, workers, True, crypto_options, backend)
+        self.stats: dict[str, int] = {}
+
+    def _check(self, relative_path: str, file_path: str, output_path: str) -> dict:
+        """Classifies one source file against the manifest, runs on a scan thread."""
+        check = {'path': relative_path, 'input': file_path, 'output': output_path, 'stat': _stat(file_path)}
+        entry = self.manifest.files.get(relative_path)
+        if check['stat'] is None:
+            check['status'] = 'vanished'
+            return check
+        if entry is None:
+            check['status'] = 'added'
+        elif entry['output'] != output_path or _stat(output_path) != tuple(entry['output_stat']):
+            check['status'] = 'missing_output'
+        elif check['stat'] == tuple(entry['stat']):
+            check['status'] = 'unchanged'
+            return check
+        else:
+            check['status'] = 'changed'
+        try:
+            check['hash'] = file_hash(file_path)
+        except OSError:
+            check['status'] = 'vanished'
+            return check
+        # Same size and content, only the modification time moved
+        if check['status'] == 'changed' and check['stat'][0] == entry['stat'][0] and check['hash'] == entry['hash']:
+            check['status'] = 'touched'
+        return check
+
+    def scan(self) -> list[dict]:
+        """
+        Compares the source directory with the manifest, without encrypting anything.
+
+        Returns:
+            list[dict]: One dict per source file with path, input, output, stat and a status of 'unchanged',
+                        'touched', 'added', 'changed', 'missing_output' or 'vanished', and one per manifest entry
+                        without a source file with the status 'removed'.
+        """
+        jobs = collect_files([self.source_dir], 'encrypt', True, self.include, self.exclude, self.output_dir)
+        manifest_path = os.path.abspath(self.manifest.path)
+        work = []
+        for file_path, job_output in jobs:
+            if os.path.abspath(file_path) == manifest_path:
+                continue
+            relative_path = os.path.relpath(file_path, self.source_dir).replace(os.sep, '/')
+            work.append((relative_path, file_path, os.path.join(job_output, os.path.basename(file_path) + '.encrypted')))
+        with ThreadPoolExecutor(max_workers=self.runner.workers) as executor:
+            checks = list(executor.map(lambda item: self._check(*item), work))
+
+        present = {check['path'] for check in checks}
+        for relative_path, entry in self.manifest.files.items():
+            if relative_path not in present:
+                checks.append({'path': relative_path, 'input': os.path.join(self.source_dir, *relative_path.split('/')),
+                               'output': entry['output'], 'status': 'removed'})
+        return checks
+
+    def _remove_output(self, output_path: str) -> None:
+        """Deletes an output and the directories below output_dir it leaves empty."""
+        try:
+            os.remove(output_path)
+        except FileNotFoundError:
+            pass
+        root = os.path.abspath(self.output_dir)
+        directory = os.path.dirname(os.path.abspath(output_path))
+        while directory != root and directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    def run(self, on_progress: Callable[[dict], None] | None = None) -> Iterator[dict]:
+        """
+        Scans, encrypts what changed and deletes stale outputs. The manifest is saved when the run ends,
+        also if it is interrupted, with the files finished so far.
+
+        Parameters:
+            on_progress (Callable): Progress callback of the encryption, see BatchRunner.run.
+
+        Returns:
+            Iterator[dict]: One record per file. Encrypted files get the BatchRunner result, unchanged files
+                            the status 'skipped' and deleted outputs the status 'deleted'.
+        """
+        checks = self.scan()
+        self.stats = {}
+        for check in checks:
+            self.stats[check['status']] = self.stats.get(check['status'], 0) + 1
+        pending = {}
+        try:
+            for check in checks:
+                entry = self.manifest.files.get(check['path'])
+                if check['status'] == 'unchanged':
+                    yield {'mode': 'encrypt', 'input': check['input'], 'output': check['output'], 'status': 'skipped'}
+                elif check['status'] == 'touched':
+                    entry['stat'] = list(check['stat'])
+                    yield {'mode': 'encrypt', 'input': check['input'], 'output': check['output'], 'status': 'skipped'}
+                elif check['status'] == 'removed' and self.delete:
+                    self._remove_output(check['output'])
+                    del self.manifest.files[check['path']]
+                    yield {'mode': 'encrypt', 'input': check['input'], 'output': check['output'], 'status': 'deleted'}
+                elif check['status'] in ('added', 'changed', 'missing_output'):
+                    pending[check['input']] = check
+
+            jobs = [(check['input'], os.path.dirname(check['output'])) for check in pending.values()]
+            for result in self.runner.run(jobs, on_progress):
+                check = pending[result['input']]
+                if result['status'] == 'ok':
+                    # The stat of the scan is recorded, a file modified while it was encrypted is picked up next run
+                    self.manifest.files[check['path']] = {'stat': list(check['stat']), 'hash': check['hash'],
+                                                          'output': result['output'],
+                                                          'output_stat': list(_stat(result['output']) or (0, 0))}
+                result['sync'] = check['status']
+                yield result
+        finally:
+            if os.path.dirname(self.manifest.path):
+                os.makedirs(os.path.dirname(self.manifest.path), exist_ok=True)
+            self.manifest.save()
@@ -0,0 +1,251 @@
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import tracemalloc
+from time import perf_counter
+from typing import Callable
+
+PHASES = ('kdf', 'read', 'cipher', 'write', 'finalize')
+
+
+class OperationMetrics:
+    """
+    Phase timers and byte counters of one encryption, decryption or verification.
+
+    CryptoManager only creates one when instrumentation is on, and then wraps the files and ciphers of the operation
+    with the timed proxies below. With instrumentation off nothing is wrapped, the hot loops run unchanged.
+    Time not spent in any phase, such as compression or progress reporting, shows up as 'other'.
+
+    Attributes:
+        mode     (str): 'encrypt', 'decrypt' or 'verify'.
+        seconds (dict): Seconds spent in every phase.
+        calls   (dict): Number of calls of every phase.
+        bytes   (dict): Bytes handled by every phase.
+    """
+    def __init__(self, mode: str):
+        """
+        Initializes the OperationMetrics and starts its clock.
+
+        Parameters:
+            mode (str): 'encrypt', 'decrypt' or 'verify'.
+        """
+        self.mode = mode
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.bytes = dict.fromkeys(PHASES, 0)
+        self._start = perf_counter()
+        self._total: float | None = None
+        # Pipeline and segment worker threads report concurrently
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float, size: int = 0) -> None:
+        """Adds one call of a phase."""
+        with self._lock:
+            self.seconds[phase] += seconds
+            self.calls[phase] += 1
+            self.bytes[phase] += size
+
+    def timed(self, function: Callable, phase: str, size: Callable | None = None) -> Callable:
+        """
+        Returns function wrapped to add its run time to a phase.
+
+        Parameters:
+            function (Callable): Function to time.
+            phase         (str): Phase the time is added to.
+            size     (Callable): Optional, returns the bytes handled from the positional arguments and the result.
+        """
+        def _timed(*args, **kwargs):
+            start = perf_counter()
+            result = function(*args, **kwargs)
+            self.add(phase, perf_counter() - start, size(args, result) if size is not None else 0)
+            return result
+        return _timed
+
+    def file(self, file_object) -> 'TimedFile':
+        """Returns file_object with its reads and writes timed."""
+        return TimedFile(file_object, self)
+
+    def cipher(self, cipher) -> 'TimedCipher':
+        """Returns cipher with its operations timed."""
+        return TimedCipher(cipher, self)
+
+    def finish(self) -> None:
+        """Stops the clock of the operation."""
+        self._total = perf_counter() - self._start
+
+    def to_dict(self) -> dict:
+        """Returns the timers and counters as a JSON friendly dict."""
+        total = self._total if self._total is not None else perf_counter() - self._start
+        with self._lock:
+            phases = {phase: {'seconds': round(self.seconds[phase], 6), 'calls': self.calls[phase],
+                              'bytes': self.bytes[phase]} for phase in PHASES if self.calls[phase]}
+            other = total - sum(self.seconds.values())
+        # Threaded phases overlap, their sum can exceed the wall time
+        phases['other'] = {'seconds': round(max(0.0, other), 6)}
+        return {'mode': self.mode, 'seconds': round(total, 6), 'phases': phases}
+
+
+def instrumented(mode: str) -> Callable:
+    """
+    Decorates a method of an object with instrument, _metrics and last_metrics attributes, see CryptoManager.
+
+    When instrument is on, the method runs with a fresh OperationMetrics in _metrics and its dict is left in
+    last_metrics, even if the method raised. When it is off, the only cost is one attribute check.
+    """
+    def _decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def _wrapper(self, *args, **kwargs):
+            if not self.instrument:
+                return method(self, *args, **kwargs)
+            self._metrics = OperationMetrics(mode)
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._metrics.finish()
+                self.last_metrics = self._metrics.to_dict()
+                self._metrics = None
+        return _wrapper
+    return _decorator
+
+
+def read_size(args: tuple, result) -> int:
+    """Size callback of timed, for read functions returning bytes or a count."""
+    return result if isinstance(result, int) else len(result)
+
+
+def write_size(args: tuple, result) -> int:
+    """Size callback of timed, for write functions taking the data first."""
+    return result if isinstance(result, int) else len(args[0])
+
+
+def _first_size(args: tuple, result) -> int:
+    return len(args[0]) if args else 0
+
+
+class TimedFile:
+    """File proxy timing read, readinto and write, every other attribute is passed through."""
+    def __init__(self, file_object, metrics: OperationMetrics):
+        self._file = file_object
+        self.read = metrics.timed(file_object.read, 'read', read_size)
+        self.readinto = metrics.timed(file_object.readinto, 'read', read_size)
+        self.write = metrics.timed(file_object.write, 'write', write_size)
+
+    def __getattr__(self, name: str):
+        return getattr(self._file, name)
+
+
+class TimedCipher:
+    """Cipher proxy timing the bulk operations as 'cipher' and the tag operations as 'finalize'."""
+    def __init__(self, cipher, metrics: OperationMetrics):
+        self._cipher = cipher
+        for name in ('encrypt', 'decrypt', 'encrypt_and_digest', 'decrypt_and_verify'):
+            setattr(self, name, metrics.timed(getattr(cipher, name), 'cipher', _first_size))
+        self.digest = metrics.timed(cipher.digest, 'finalize')
+        self.verify = metrics.timed(cipher.verify, 'finalize')
+
+    def __getattr__(self, name: str):
+        return getattr(self._cipher, name)
+
+
+class BatchMetrics:
+    """
+    Aggregate of the OperationMetrics of a batch, by mode.
+
+    Fed with the dicts of OperationMetrics.to_dict, so operations that ran in worker processes are counted too.
+    """
+    def __init__(self):
+        self._operations: dict[tuple[str, str], list] = {}
+        self._phases: dict[tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: dict, status: str = 'ok') -> None:
+        """Adds the metrics of one operation, see OperationMetrics.to_dict."""
+        with self._lock:
+            operation = self._operations.setdefault((record['mode'], status), [0, 0.0])
+            operation[0] += 1
+            operation[1] += record['seconds']
+            for phase, values in record['phases'].items():
+                totals = self._phases.setdefault((record['mode'], phase), [0.0, 0, 0])
+                totals[0] += values['seconds']
+                totals[1] += values.get('calls', 0)
+                totals[2] += values.get('bytes', 0)
+
+    def snapshot(self) -> dict:
+        """Returns the totals by mode as a JSON friendly dict."""
+        result: dict = {}
+        with self._lock:
+            for (mode, status), (count, seconds) in self._operations.items():
+                entry = result.setdefault(mode, {'operations': {}, 'seconds': 0.0, 'phases': {}})
+                entry['operations'][status] = count
+                entry['seconds'] = round(entry['seconds'] + seconds, 6)
+            for (mode, phase), (seconds, calls, size) in self._phases.items():
+                result.setdefault(mode, {'operations': {}, 'seconds': 0.0, 'phases': {}})['phases'][phase] = {
+                    'seconds': round(seconds, 6), 'calls': calls, 'bytes': size}
+        return result
+
+    def to_prometheus(self, prefix: str = 'file_encryption') -> str:
+        """Returns the totals in the Prometheus text exposition format, for example for a node exporter textfile."""
+        lines = []
+
+        def _metric(name: str, help_text: str, samples: list[tuple[dict, float]]) -> None:
+            lines.append('# HELP ' + prefix + '_' + name + ' ' + help_text)
+            lines.append('# TYPE ' + prefix + '_' + name + ' counter')
+            for labels, value in samples:
+                label_text = ','.join(key + '="' + str(labels[key]) + '"' for key in sorted(labels))
+                lines.append(prefix + '_' + name + '{' + label_text + '} ' + str(round(value, 6) if isinstance(value, float) else value))
+
+        with self._lock:
+            operations = sorted(self._operations.items())
+            phases = sorted(self._phases.items())
+        _metric('operations_total', 'Files processed.',
+                [({'mode': mode, 'status': status}, count) for (mode, status), (count, _) in operations])
+        _metric('operation_seconds_total', 'Time spent processing files.',
+                [({'mode': mode, 'status': status}, seconds) for (mode, status), (_, seconds) in operations])
+        _metric('phase_seconds_total', 'Time spent in each phase of processing files.',
+                [({'mode': mode, 'phase': phase}, totals[0]) for (mode, phase), totals in phases])
+        _metric('phase_calls_total', 'Calls of each phase.',
+                [({'mode': mode, 'phase': phase}, totals[1]) for (mode, phase), totals in phases if phase != 'other'])
+        _metric('phase_bytes_total', 'Bytes handled by each phase.',
+                [({'mode': mode, 'phase': phase}, totals[2]) for (mode, phase), totals in phases if phase != 'other'])
+        return '\n'.join(lines) + '\n'
+
+
+def profile_call(function: Callable, *args, profile_path: str | None = None, trace_memory: bool = False,
+                 top: int = 15) -> tuple[object, dict]:
+    """
+    Runs function(*args) under cProfile and optionally tracemalloc.
+
+    Parameters:
+        function (Callable): Function to profile.
+        profile_path  (str): Optional file the pstats data is dumped to, for snakeviz or pstats.
+        trace_memory (bool): Also trace allocations, which slows the call down considerably.
+        top           (int): Number of functions and allocation sites reported.
+
+    Returns:
+        tuple[object, dict]: The result of the call and a report with the top functions by cumulative time
+                             and, when tracing memory, the peak traced memory and the top allocation sites.
+    """
+    profiler = cProfile.Profile()
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        result = profiler.runcall(function, *args)
+    finally:
+        snapshot = peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    if profile_path:
+        profiler.dump_stats(profile_path)
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(top)
+    report = {'profile': text.getvalue(), 'profile_path': profile_path}
+    if snapshot is not None:
+        report['peak_traced_bytes'] = peak
+        report['top_allocations'] = [{'site': str(stat.traceback), 'bytes': stat.size, 'count': stat.count}
+                                     for stat in snapshot.statistics('lineno')[:top]]
+    return result, report
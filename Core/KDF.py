@@ -0,0 +1,127 @@
+import hashlib
+from time import perf_counter
+
+from Crypto.Protocol.KDF import scrypt
+
+# Key derivation functions, the id is stored in the OPT_KDF header option, files without it use PBKDF2-HMAC-SHA1
+KDF_PBKDF2_SHA1 = 0
+KDF_PBKDF2_SHA256 = 1
+KDF_SCRYPT = 2
+KDF_NAMES = {'pbkdf2': KDF_PBKDF2_SHA1, 'pbkdf2-sha256': KDF_PBKDF2_SHA256, 'scrypt': KDF_SCRYPT}
+
+# Default work factors: iterations for PBKDF2, the cost parameter N for scrypt
+DEFAULT_WORK_FACTORS = {KDF_PBKDF2_SHA1: 100000, KDF_PBKDF2_SHA256: 600000, KDF_SCRYPT: 2 ** 15}
+SCRYPT_R = 8                        # Block size of scrypt, memory use is 128 * SCRYPT_R * N bytes
+SCRYPT_P = 1                        # Parallelization of scrypt
+MAX_SCRYPT_N = 2 ** 20              # 1 GiB of memory per derivation, headers asking for more are rejected
+DEFAULT_TARGET_SECONDS = 0.5        # Derivation time calibrate aims for
+CALIBRATION_SECONDS = 0.05          # Minimum duration of a calibration measurement
+
+_calibrations: dict[tuple[int, float], int] = {}
+
+
+def kdf_id(kdf: str | int) -> int:
+    """Returns the id of a key derivation function given by name or id, raises ValueError if it is unknown."""
+    if isinstance(kdf, int):
+        if kdf not in KDF_NAMES.values():
+            raise ValueError('Unsupported key derivation function: ' + str(kdf))
+        return kdf
+    if kdf not in KDF_NAMES:
+        raise ValueError('Unknown key derivation function: ' + kdf + '. Choose one of ' + ', '.join(KDF_NAMES) + '.')
+    return KDF_NAMES[kdf]
+
+
+def kdf_name(kdf: int) -> str:
+    """Returns the name of a key derivation function id."""
+    return next(name for name, value in KDF_NAMES.items() if value == kdf_id(kdf))
+
+
+def default_work_factor(kdf: str | int) -> int:
+    """Returns the default iterations, or scrypt cost, of a key derivation function."""
+    return DEFAULT_WORK_FACTORS[kdf_id(kdf)]
+
+
+def check_work_factor(kdf: str | int, work_factor: int) -> None:
+    """Raises ValueError if work_factor cannot be used with a key derivation function."""
+    if kdf_id(kdf) == KDF_SCRYPT:
+        if work_factor < 2 or work_factor & (work_factor - 1) or work_factor > MAX_SCRYPT_N:
+            raise ValueError('The scrypt cost must be a power of two between 2 and ' + str(MAX_SCRYPT_N) + ', got '
+                             + str(work_factor) + '.')
+    elif work_factor < 1:
+        raise ValueError('The PBKDF2 iteration count must be at least 1, got ' + str(work_factor) + '.')
+
+
+def derive_key(password: str, salt: bytes, work_factor: int, kdf: int = KDF_PBKDF2_SHA1, key_length: int = 32) -> bytes:
+    """
+    Derives a key from a password with one of the supported key derivation functions.
+
+    PBKDF2 runs in hashlib, which is implemented in C. PBKDF2-HMAC-SHA1 encodes the password as latin-1,
+    like the PyCryptodome PBKDF2 that wrote the files without a KDF option, so their keys stay the same.
+    Passwords outside latin-1, which that PBKDF2 rejected, are encoded as UTF-8.
+
+    Parameters:
+        password      (str): User password for key generation.
+        salt        (bytes): Random salt used for key generation.
+        work_factor   (int): Number of iterations for PBKDF2, cost parameter N (a power of two) for scrypt.
+        kdf           (int): Id of the key derivation function.
+        key_length    (int): Length of the key to derive.
+
+    Returns:
+        bytes             : A byte string that can be used as a key.
+    """
+    if kdf == KDF_PBKDF2_SHA1:
+        try:
+            secret = password.encode('latin-1')
+        except UnicodeEncodeError:
+            # Rejected by the PyCryptodome PBKDF2, so no existing file uses such a password
+            secret = password.encode('utf-8')
+        return hashlib.pbkdf2_hmac('sha1', secret, salt, work_factor, key_length)
+    if kdf == KDF_PBKDF2_SHA256:
+        return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, work_factor, key_length)
+    if kdf == KDF_SCRYPT:
+        check_work_factor(kdf, work_factor)
+        return scrypt(password.encode('utf-8'), salt, key_length, N=work_factor, r=SCRYPT_R, p=SCRYPT_P)
+    raise ValueError('Unsupported key derivation function: ' + str(kdf))
+
+
+def measure(kdf: str | int, work_factor: int) -> float:
+    """Returns the seconds one derivation with the given work factor takes on this machine."""
+    start = perf_counter()
+    derive_key('calibration', bytes(32), work_factor, kdf_id(kdf))
+    return perf_counter() - start
+
+
+def calibrate(kdf: str | int, target_seconds: float = DEFAULT_TARGET_SECONDS) -> int:
+    """
+    Returns the work factor that makes one derivation take about target_seconds on this machine.
+
+    PBKDF2 time grows linearly with the iterations, so a short measurement is scaled up and rounded to thousands.
+    scrypt costs must be powers of two, the largest one not slower than the target is returned.
+    Results are cached for the life of the process.
+
+    Parameters:
+        kdf            (str): Name or id of the key derivation function.
+        target_seconds (float): Desired duration of one derivation.
+
+    Returns:
+        int: Iterations for PBKDF2, cost parameter N for scrypt.
+    """
+    kdf = kdf_id(kdf)
+    cached = _calibrations.get((kdf, target_seconds))
+    if cached is not None:
+        return cached
+
+    if kdf == KDF_SCRYPT:
+        work_factor = 2 ** 10
+        # Doubling N doubles the time, stop before the next step would overshoot the target
+        while work_factor < MAX_SCRYPT_N and measure(kdf, work_factor) * 2 <= target_seconds:
+            work_factor *= 2
+    else:
+        probe = 10000
+        seconds = measure(kdf, probe)
+        while seconds < CALIBRATION_SECONDS:
+            probe *= 4
+            seconds = measure(kdf, probe)
+        work_factor = max(1000, int(round(probe * target_seconds / seconds, -3)))
+    _calibrations[(kdf, target_seconds)] = work_factor
+    return work_factor
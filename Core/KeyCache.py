@@ -0,0 +1,121 @@
+import hashlib
+import hmac
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from Crypto.Random import get_random_bytes
+
+
+class _Pending:
+    """A derivation in progress, other threads asking for the same key wait on it instead of deriving again."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.key: bytes | None = None
+
+
+class KeyCache:
+    """
+    Bounded, thread-safe LRU cache of derived keys.
+
+    Entries are looked up by a keyed digest of (password, salt, iterations), so neither the password
+    nor a plain hash of it is kept in memory. Evicted keys are overwritten with zeros.
+
+    Attributes:
+        max_entries (int): Maximum number of keys kept in the cache.
+        hits        (int): Number of lookups answered without deriving a key.
+        misses      (int): Number of lookups that derived a key.
+    """
+    def __init__(self, max_entries: int = 64):
+        """
+        Initializes the KeyCache.
+
+        Parameters:
+            max_entries (int): Maximum number of keys kept in the cache.
+        """
+        if max_entries < 1:
+            raise ValueError('max_entries must be at least 1.')
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._secret = get_random_bytes(32)
+        self._entries: OrderedDict[bytes, bytearray] = OrderedDict()
+        self._pending: dict[bytes, _Pending] = {}
+        self._lock = threading.Lock()
+
+    def _digest(self, password: str, salt: bytes, iterations: int, kdf: int = 0) -> bytes:
+        """Returns the lookup digest of a derivation."""
+        mac = hmac.new(self._secret, digestmod=hashlib.sha256)
+        encoded = password.encode('utf-8')
+        mac.update(len(encoded).to_bytes(4, 'big') + encoded)
+        mac.update(len(salt).to_bytes(4, 'big') + salt)
+        mac.update(iterations.to_bytes(8, 'big'))
+        mac.update(kdf.to_bytes(1, 'big'))
+        return mac.digest()
+
+    def get_or_derive(self, password: str, salt: bytes, iterations: int, derive: Callable[[], bytes], kdf: int = 0) -> bytes:
+        """
+        Returns a cached key, or derives and caches it.
+
+        Parameters:
+            password   (str): User password for key generation.
+            salt     (bytes): Salt used for key generation.
+            iterations (int): Number of iterations for key generation.
+            derive (Callable): Called without arguments to derive the key on a miss.
+            kdf        (int): Id of the key derivation function, see Core.KDF.
+
+        Returns:
+            bytes           : The derived key.
+        """
+        digest = self._digest(password, salt, iterations, kdf)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return bytes(entry)
+            pending = self._pending.get(digest)
+            owner = pending is None
+            if owner:
+                pending = self._pending[digest] = _Pending()
+
+        if not owner:
+            pending.event.wait()
+            if pending.key is not None:
+                with self._lock:
+                    self.hits += 1
+                return pending.key
+            # The owner failed, derive without the cache
+            return derive()
+
+        try:
+            key = derive()
+            pending.key = key
+            with self._lock:
+                self.misses += 1
+                self._entries[digest] = bytearray(key)
+                while len(self._entries) > self.max_entries:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._wipe(evicted)
+            return key
+        finally:
+            with self._lock:
+                self._pending.pop(digest, None)
+            pending.event.set()
+
+    @staticmethod
+    def _wipe(key: bytearray) -> None:
+        """Overwrites a key with zeros."""
+        key[:] = bytes(len(key))
+
+    def clear(self) -> None:
+        """Removes and wipes all cached keys."""
+        with self._lock:
+            for key in self._entries.values():
+                self._wipe(key)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Returns the hit and miss counters and the number of cached keys."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
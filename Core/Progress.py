@@ -0,0 +1,214 @@
+from multiprocessing import shared_memory
+from time import monotonic
+from typing import Callable
+
+# File states
+PENDING = 0
+RUNNING = 1
+DONE = 2
+FAILED = 3
+
+_FIELDS = 3     # done bytes, total bytes, state
+
+
+class ProgressBoard:
+    """
+    Progress of many files in one shared-memory array of 64-bit integers.
+
+    Each file has a slot holding its processed bytes, total bytes and state. Workers write their slot and a monitor
+    reads the whole board, without locks or per-file objects. A board can be pickled and sent to worker processes,
+    which attach to the same memory.
+
+    Attributes:
+        slots (int): Number of files tracked.
+        name  (str): Name of the shared memory block.
+    """
+    def __init__(self, slots: int, name: str | None = None):
+        """
+        Initializes the ProgressBoard.
+
+        Parameters:
+            slots (int): Number of files tracked.
+            name  (str): Name of an existing board to attach to, a new board is created if None.
+        """
+        self.slots = slots
+        self._owner = name is None
+        size = max(slots, 1) * _FIELDS * 8
+        # Pool workers share the resource tracker of the creating process, so attaching does not register the block twice
+        self._shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size if self._owner else 0)
+        self.name = self._shm.name
+        self._values = self._shm.buf.cast('q')
+        if self._owner:
+            self._values[:max(slots, 1) * _FIELDS] = memoryview(bytes(size)).cast('q')
+
+    def __reduce__(self):
+        """Pickles only the name, the receiving process attaches to the same memory once."""
+        return _attach, (self.slots, self.name)
+
+    def set(self, slot: int, done: int, total: int) -> None:
+        """Sets the processed and total bytes of a slot."""
+        base = slot * _FIELDS
+        self._values[base] = done
+        self._values[base + 1] = total
+
+    def set_state(self, slot: int, state: int) -> None:
+        """Sets the state of a slot."""
+        self._values[slot * _FIELDS + 2] = state
+
+    def read(self, slot: int) -> tuple[int, int, int]:
+        """Returns (done, total, state) of a slot."""
+        base = slot * _FIELDS
+        return self._values[base], self._values[base + 1], self._values[base + 2]
+
+    def snapshot(self) -> list[tuple[int, int, int]]:
+        """Returns (done, total, state) of every slot."""
+        values = self._values[:self.slots * _FIELDS].tolist()
+        return [tuple(values[i:i + _FIELDS]) for i in range(0, len(values), _FIELDS)]
+
+    def reporter(self, slot: int, min_interval: float = 0.05) -> 'ProgressReporter':
+        """Returns a reporter writing to a slot."""
+        return ProgressReporter(self, slot, min_interval)
+
+    def close(self) -> None:
+        """Detaches from the board, and frees it if this process created it."""
+        self._values.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+_attached: dict[str, ProgressBoard] = {}
+
+
+def _attach(slots: int, name: str) -> ProgressBoard:
+    """Returns the board with the given name, attaching to it on first use in this process."""
+    board = _attached.get(name)
+    if board is None:
+        board = _attached[name] = ProgressBoard(slots, name)
+    return board
+
+
+class ProgressReporter:
+    """
+    Throttled writer of the progress of one file to a ProgressBoard.
+
+    Attributes:
+        slot (int): Slot of the file on the board.
+    """
+    def __init__(self, board: ProgressBoard, slot: int, min_interval: float = 0.05):
+        """
+        Initializes the ProgressReporter.
+
+        Parameters:
+            board (ProgressBoard): Board to write to.
+            slot            (int): Slot of the file on the board.
+            min_interval  (float): Minimum seconds between two updates, the final update is always written.
+        """
+        self.slot = slot
+        self._board = board
+        self._min_interval = min_interval
+        self._last = 0.0
+
+    def start(self, total: int) -> None:
+        """Marks the file as running."""
+        self._board.set(self.slot, 0, total)
+        self._board.set_state(self.slot, RUNNING)
+
+    def update(self, done: int, total: int) -> None:
+        """Records the processed bytes, at most once per min_interval unless the file is complete."""
+        now = monotonic()
+        if done < total and now - self._last < self._min_interval:
+            return
+        self._last = now
+        self._board.set(self.slot, done, total)
+
+    def finish(self, success: bool) -> None:
+        """Marks the file as done or failed."""
+        done, total, _ = self._board.read(self.slot)
+        if success:
+            self._board.set(self.slot, total, total)
+        self._board.set_state(self.slot, DONE if success else FAILED)
+
+
+class ProgressMonitor:
+    """
+    Reads a ProgressBoard and turns it into events.
+
+    on_state is called for every file whose state changed since the last poll, on_update at most once per
+    min_interval with aggregate figures: bytes done and total, bytes per second, ETA and file counts.
+
+    Attributes:
+        board (ProgressBoard): Board to read.
+        snapshot     (list): (done, total, state) of every slot as of the last poll.
+    """
+    def __init__(self, board: ProgressBoard, on_state: Callable[[int, int], None] | None = None,
+                 on_update: Callable[[dict], None] | None = None, min_interval: float = 0.5):
+        """
+        Initializes the ProgressMonitor.
+
+        Parameters:
+            board (ProgressBoard): Board to read.
+            on_state   (Callable): Called with (slot, new_state) for every state change.
+            on_update  (Callable): Called with the aggregate figures.
+            min_interval  (float): Minimum seconds between two on_update calls.
+        """
+        self.board = board
+        self._on_state = on_state
+        self._on_update = on_update
+        self._min_interval = min_interval
+        self._states = [PENDING] * board.slots
+        self.snapshot: list[tuple[int, int, int]] = []
+        self._started = monotonic()
+        self._last_update = 0.0
+        self._rate = 0.0
+        self._last_sample: tuple[float, int] | None = None
+
+    def poll(self, force: bool = False) -> dict:
+        """
+        Reads the board, fires the callbacks and returns the aggregate figures.
+
+        Parameters:
+            force (bool): Call on_update even if min_interval has not elapsed.
+
+        Returns:
+            dict: done_bytes, total_bytes, bytes_per_s, eta_s, files_total, files_done, files_failed, files_running, finished.
+        """
+        snapshot = self.snapshot = self.board.snapshot()
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        done_bytes = total_bytes = 0
+        for slot, (done, total, state) in enumerate(snapshot):
+            counts[state] = counts.get(state, 0) + 1
+            done_bytes += done
+            total_bytes += total
+            if state != self._states[slot]:
+                self._states[slot] = state
+                if self._on_state is not None:
+                    self._on_state(slot, state)
+
+        # Exponential moving average of the throughput between polls
+        now = monotonic()
+        if self._last_sample is not None and now > self._last_sample[0]:
+            instant = (done_bytes - self._last_sample[1]) / (now - self._last_sample[0])
+            self._rate = instant if self._rate == 0.0 else 0.7 * self._rate + 0.3 * instant
+        elif now > self._started:
+            # First poll, use the average since the monitor started
+            self._rate = done_bytes / (now - self._started)
+        self._last_sample = (now, done_bytes)
+
+        remaining = total_bytes - done_bytes
+        stats = {
+            'done_bytes': done_bytes,
+            'total_bytes': total_bytes,
+            'bytes_per_s': round(self._rate, 1),
+            'eta_s': round(remaining / self._rate, 1) if self._rate > 0 else None,
+            'elapsed_s': round(now - self._started, 3),
+            'files_total': self.board.slots,
+            'files_done': counts[DONE],
+            'files_failed': counts[FAILED],
+            'files_running': counts[RUNNING],
+            'finished': counts[DONE] + counts[FAILED] == self.board.slots,
+        }
+        if self._on_update is not None and (force or stats['finished'] or now - self._last_update >= self._min_interval):
+            self._last_update = now
+            self._on_update(stats)
+        return stats
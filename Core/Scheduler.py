@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Iterator
+
+DEFAULT_MAX_INFLIGHT_BYTES = 4 * 1024 * 1024 * 1024
+
+
+class BatchScheduler:
+    """
+    Runs jobs on a thread or process pool, largest first, with a cap on the bytes in flight.
+
+    Jobs are ordered by size, largest first (longest processing time first), so one huge file does not start last
+    and finish long after everything else. New jobs are only submitted while the sizes of the running jobs stay below
+    max_inflight_bytes, and at most twice the worker count is queued, which keeps memory, disk I/O and the number
+    of futures bounded on very large batches. A job larger than the cap still runs, on its own.
+
+    Attributes:
+        backend            (str): 'thread' or 'process'.
+        workers            (int): Number of threads or processes.
+        max_inflight_bytes (int): Maximum total size of the jobs submitted and not finished yet.
+    """
+    def __init__(self, backend: str = 'thread', workers: int | None = None, max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES):
+        """
+        Initializes the BatchScheduler.
+
+        Parameters:
+            backend            (str): 'thread' or 'process'. Processes avoid the GIL but jobs and results must be picklable.
+            workers            (int): Number of threads or processes. Defaults to the cpu count.
+            max_inflight_bytes (int): Maximum total size of the jobs submitted and not finished yet.
+        """
+        if backend not in ('thread', 'process'):
+            raise ValueError('Unknown backend: ' + backend)
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 4
+        self.max_inflight_bytes = max_inflight_bytes
+
+    def _new_executor(self, job_count: int) -> Executor:
+        """Creates the pool for a run."""
+        max_workers = max(1, min(job_count, self.workers))
+        if self.backend == 'process':
+            return ProcessPoolExecutor(max_workers=max_workers)
+        return ThreadPoolExecutor(max_workers=max_workers)
+
+    def run(self, function: Callable, jobs: list, sizes: list[int]) -> Iterator:
+        """
+        Runs function(job) for every job.
+
+        Parameters:
+            function (Callable): Called with one job, must be a module level function for the process backend.
+            jobs         (list): Jobs to run.
+            sizes   (list[int]): Size in bytes of every job, used for ordering and the in-flight cap.
+
+        Returns:
+            Iterator: The results of function, in order of completion.
+        """
+        if not jobs:
+            return
+        order = sorted(range(len(jobs)), key=lambda i: sizes[i], reverse=True)
+        max_pending = self.workers * 2
+        inflight_bytes = 0
+        pending = {}
+
+        with self._new_executor(len(jobs)) as executor:
+            position = 0
+            while position < len(order) or pending:
+                # Submit while below both caps, an idle pool always takes the next job
+                while position < len(order) and len(pending) < max_pending:
+                    index = order[position]
+                    if pending and inflight_bytes + sizes[index] > self.max_inflight_bytes:
+                        break
+                    pending[executor.submit(function, jobs[index])] = sizes[index]
+                    inflight_bytes += sizes[index]
+                    position += 1
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    inflight_bytes -= pending.pop(future)
+                    yield future.result()
@@ -0,0 +1,91 @@
+NONCE_PREFIX_LENGTH = 7
+DEFAULT_SEGMENT_SIZE = 1024 * 1024
+MAX_SEGMENT_SIZE = 256 * 1024 * 1024    # Larger segment sizes in a header are rejected, they are read before it is authenticated
+
+
+def segment_nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    """
+    Builds the 12 byte GCM nonce of a segment, STREAM style.
+
+    Parameters:
+        prefix (bytes): Random nonce prefix stored in the header.
+        index    (int): Index of the segment.
+        last    (bool): Whether this is the final segment, which prevents truncation of the file.
+
+    Returns:
+        bytes         : The nonce of the segment.
+    """
+    if index >= 1 << 32:
+        raise ValueError('Too many segments for a single file.')
+    return prefix + index.to_bytes(4, 'big') + (b'\x01' if last else b'\x00')
+
+
+class SegmentLayout:
+    """
+    Position of every segment of a segmented file.
+
+    The plaintext is split into segments of segment_size bytes, the last one may be shorter and is never empty
+    unless the whole file is. Every segment is stored as its ciphertext followed by its tag, directly after the header.
+    Because all segments but the last have the same size, the segment index is computed rather than stored.
+
+    Attributes:
+        header_length  (int): Size of the header in bytes.
+        segment_size   (int): Size of the plaintext of a full segment.
+        tag_size       (int): Size of the tag of every segment.
+        plaintext_size (int): Size of the whole plaintext.
+        count          (int): Number of segments.
+    """
+    def __init__(self, header_length: int, segment_size: int, tag_size: int, plaintext_size: int):
+        """
+        Initializes the SegmentLayout.
+
+        Parameters:
+            header_length  (int): Size of the header in bytes.
+            segment_size   (int): Size of the plaintext of a full segment.
+            tag_size       (int): Size of the tag of every segment.
+            plaintext_size (int): Size of the whole plaintext.
+        """
+        if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+            raise ValueError('segment_size must be between 1 and ' + str(MAX_SEGMENT_SIZE) + ' bytes.')
+        self.header_length = header_length
+        self.segment_size = segment_size
+        self.tag_size = tag_size
+        self.plaintext_size = plaintext_size
+        self.count = max(1, -(-plaintext_size // segment_size))
+
+    @classmethod
+    def from_encrypted_size(cls, header_length: int, segment_size: int, tag_size: int, file_size: int) -> 'SegmentLayout':
+        """Computes the layout of an existing encrypted file from its size."""
+        body = file_size - header_length
+        stride = segment_size + tag_size
+        count = max(1, -(-body // stride))
+        plaintext_size = body - count * tag_size
+        if body < tag_size or plaintext_size < 0 or (count > 1 and body - (count - 1) * stride <= tag_size):
+            raise ValueError('File size does not match its segment layout.')
+        return cls(header_length, segment_size, tag_size, plaintext_size)
+
+    @property
+    def encrypted_size(self) -> int:
+        """Returns the size of the encrypted file."""
+        return self.header_length + self.plaintext_size + self.count * self.tag_size
+
+    def plain_length(self, index: int) -> int:
+        """Returns the plaintext size of a segment."""
+        if index == self.count - 1:
+            return self.plaintext_size - index * self.segment_size
+        return self.segment_size
+
+    def plain_offset(self, index: int) -> int:
+        """Returns the offset of a segment in the plaintext."""
+        return index * self.segment_size
+
+    def encrypted_offset(self, index: int) -> int:
+        """Returns the offset of a segment in the encrypted file."""
+        return self.header_length + index * (self.segment_size + self.tag_size)
+
+    def segments_for_range(self, offset: int, length: int) -> range:
+        """Returns the indices of the segments holding the plaintext bytes [offset, offset + length)."""
+        end = min(offset + length, self.plaintext_size)
+        if offset >= end:
+            return range(0)
+        return range(offset // self.segment_size, (end - 1) // self.segment_size + 1)
@@ -0,0 +1,182 @@
+from typing import Iterator
+
+from Core.Codecs import get_codec
+from Core.FileHeader import FileHeader
+
+
+class StreamEncryptor:
+    """
+    Incremental encryption producing the same format as CryptoManager.encrypt, for data that is not in a file.
+
+    Feed plaintext with update() and call finalize() once at the end, concatenating all returned bytes gives
+    the encrypted file. Segmented headers are supported, one full segment is held back until it is known
+    whether it is the last one.
+
+    Attributes:
+        header (FileHeader): Header of the encrypted output.
+    """
+    def __init__(self, crypto, header: FileHeader, key: bytes):
+        """
+        Initializes the StreamEncryptor.
+
+        Parameters:
+            crypto (CryptoManager): Provides the cipher settings.
+            header    (FileHeader): Header of the encrypted output, see CryptoManager._new_header.
+            key            (bytes): Key of the file.
+        """
+        self.header = header
+        self._crypto = crypto
+        self._key = key
+        self._segment_index = 0
+        self._pending = bytearray()
+        self._cipher = None if header.segment_size else crypto._new_cipher(key, header)
+        self._started = False
+        self._finalized = False
+
+    def update(self, data) -> bytes:
+        """Encrypts a chunk of plaintext and returns the encrypted bytes available so far."""
+        if self._finalized:
+            raise ValueError('update() called after finalize().')
+        output = b''
+        if not self._started:
+            self._started = True
+            output = self.header.to_bytes()
+        if self._cipher is not None:
+            return output + self._cipher.encrypt(data)
+
+        self._pending += data
+        segment_size = self.header.segment_size
+        sealed = []
+        # Strictly more than one segment pending, so the segment sealed here is not the last one
+        while len(self._pending) > segment_size:
+            sealed.append(self._crypto._seal_segment(self._key, self.header, self._segment_index, False,
+                                                     memoryview(self._pending)[:segment_size]))
+            del self._pending[:segment_size]
+            self._segment_index += 1
+        return output + b''.join(sealed)
+
+    def finalize(self) -> bytes:
+        """Returns the last encrypted bytes, the tag or the last segment."""
+        output = self.update(b'')
+        self._finalized = True
+        if self._cipher is not None:
+            return output + self._cipher.digest()
+        return output + self._crypto._seal_segment(self._key, self.header, self._segment_index, True, bytes(self._pending))
+
+
+class StreamDecryptor:
+    """
+    Incremental decryption of data in the format written by CryptoManager.encrypt.
+
+    Feed the encrypted bytes with update(). Once enough bytes arrived, header is set and start() must be called
+    with the key of the file before plaintext is returned. finalize() verifies the tag and raises ValueError if
+    the data is not authentic.
+    For single stream files, plaintext returned by update() is only authenticated once finalize() succeeds.
+    For segmented files every segment is verified before it is returned.
+    Compressed files, see Core.Codecs, are decompressed on the fly. A call then returns at most
+    Codecs.DECOMPRESS_LIMIT bytes and keeps the rest, call update(b'') until it returns b'' or use chunks().
+
+    Attributes:
+        header (FileHeader): Header of the encrypted input, None until enough bytes were fed.
+    """
+    def __init__(self, crypto):
+        """
+        Initializes the StreamDecryptor.
+
+        Parameters:
+            crypto (CryptoManager): Provides the cipher settings.
+        """
+        self.header: FileHeader | None = None
+        self._crypto = crypto
+        self._tag_size = crypto.tag_size
+        self._key: bytes | None = None
+        self._cipher = None
+        self._decompressor = None
+        self._inflating: Iterator[bytes] | None = None
+        self._segment_index = 0
+        self._pending = bytearray()
+
+    @property
+    def started(self) -> bool:
+        """Returns whether start() was called."""
+        return self._key is not None
+
+    def start(self, key: bytes) -> None:
+        """Sets the key of the file, derived from the password and the header."""
+        if self.header is None:
+            raise ValueError('The header has not been read yet.')
+        self._key = key
+        if not self.header.segment_size:
+            self._cipher = self._crypto._new_cipher(key, self.header)
+        if self.header.codec:
+            self._decompressor = get_codec(self.header.codec).decompressor()
+
+    def chunks(self, data) -> Iterator[bytes]:
+        """Feeds encrypted bytes and yields all plaintext available so far, in chunks of bounded size."""
+        output = self.update(data)
+        while output:
+            yield output
+            output = self.update(b'')
+
+    def update(self, data) -> bytes:
+        """Feeds encrypted bytes and returns plaintext available so far, see the class for compressed files."""
+        self._pending += data
+        if self.header is None:
+            try:
+                self.header = FileHeader.from_bytes(self._pending)
+            except EOFError:
+                return b''
+            del self._pending[:self.header.length]
+        if self._key is None:
+            return b''
+
+        if self._cipher is not None:
+            # Output of earlier bytes still being decompressed comes first, one bounded chunk per call
+            if self._inflating is not None:
+                output = next(self._inflating, b'')
+                if output:
+                    return output
+                self._inflating = None
+            # Hold back the bytes that may be the tag
+            available = len(self._pending) - self._tag_size
+            if available <= 0:
+                return b''
+            output = self._cipher.decrypt(memoryview(self._pending)[:available])
+            del self._pending[:available]
+            if self._decompressor is not None:
+                self._inflating = self._decompressor.decompress(output)
+                return self.update(b'')
+            return output
+
+        stride = self.header.segment_size + self._tag_size
+        opened = []
+        while len(self._pending) > stride:
+            opened.append(self._open_segment(memoryview(self._pending)[:stride], False))
+            del self._pending[:stride]
+        return b''.join(opened)
+
+    def finalize(self) -> bytes:
+        """Returns the last plaintext bytes after verifying the tag, raises ValueError if verification fails."""
+        if self.header is None or self._key is None:
+            raise ValueError('Data is too short to contain an encrypted file.')
+        output = b''.join(self.chunks(b''))
+        if self._cipher is not None:
+            if len(self._pending) != self._tag_size:
+                raise ValueError('Data is too short to contain an encrypted file.')
+            self._cipher.verify(bytes(self._pending))
+            if self._decompressor is not None:
+                self._decompressor.finish()
+            return output
+        if len(self._pending) < self._tag_size:
+            raise ValueError('The last segment is truncated.')
+        return output + self._open_segment(bytes(self._pending), True)
+
+    def _open_segment(self, data, last: bool) -> bytes:
+        """Decrypts and verifies the next segment."""
+        if self._segment_index > 0 and last and len(data) == self._tag_size:
+            raise ValueError('The last segment is empty.')
+        cipher = self._crypto._segment_cipher(self._key, self.header, self._segment_index, last)
+        split = len(data) - self._tag_size
+        plaintext = cipher.decrypt_and_verify(data[:split], data[split:])
+        self._segment_index += 1
+        return plaintext
@@ -0,0 +1,304 @@
+import fnmatch
+import json
+import os
+import stat
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+from Core.AtomicFile import AtomicOutput
+from Core.CryptoManager import CryptoManager
+from Core.FileHeader import FileHeader
+from Core.Segments import SegmentLayout
+from Core.StreamCipher import StreamEncryptor
+
+ARCHIVE_EXT = '.tree'                   # Extension recorded in the header of archives
+ARCHIVE_SEGMENT_SIZE = 64 * 1024        # Small segments, extracting one small member decrypts little else
+MANIFEST_VERSION = 1
+TRAILER = struct.Struct('>Q6s')         # Manifest length and magic, the last plaintext bytes of an archive
+TRAILER_MAGIC = b'FETREE'
+READAHEAD_LIMIT = 1024 * 1024           # Files up to this size are read ahead on worker threads while packing
+CHUNK_SIZE = 1024 * 1024                # Read size for larger files
+
+
+def _scan(source_dir: str, include: list[str] | None, exclude: list[str] | None, skip: str) -> list[dict]:
+    """Walks source_dir and returns its directories and regular files in a stable order, symlinks are skipped."""
+    entries = []
+    for root, dirs, names in os.walk(source_dir):
+        dirs.sort()
+        relative_root = os.path.relpath(root, source_dir)
+        prefix = '' if relative_root == '.' else relative_root.replace(os.sep, '/') + '/'
+        for name in dirs:
+            if not os.path.islink(os.path.join(root, name)):
+                entries.append({'path': prefix + name, 'type': 'dir', 'source': os.path.join(root, name)})
+        for name in sorted(names):
+            file_path = os.path.join(root, name)
+            if os.path.islink(file_path) or os.path.abspath(file_path) == skip:
+                continue
+            if include and not any(fnmatch.fnmatch(name, pattern) for pattern in include):
+                continue
+            if exclude and any(fnmatch.fnmatch(name, pattern) for pattern in exclude):
+                continue
+            entries.append({'path': prefix + name, 'type': 'file', 'source': file_path})
+    return entries
+
+
+def _read_file(file_path: str) -> bytes:
+    with open(file_path, 'rb') as input_file:
+        return input_file.read()
+
+
+class TreeArchive:
+    """
+    Encrypted container holding a whole directory tree, for fast backups of many small files.
+
+    The plaintext is the content of every file back to back, followed by a JSON manifest of the members (path,
+    offset, size, mode and modification time) and a fixed size trailer with the length of the manifest. It is
+    encrypted as one file in the segmented format, so the archive has one header, one key derivation and one
+    output file however many files it holds, and `verify` authenticates it like any other file.
+
+    Because every segment is authenticated on its own, opening an archive only decrypts the last segments to read
+    the manifest, and a member is extracted by decrypting just the segments that hold it.
+
+    Attributes:
+        path       (str): Path of the archive.
+        header (FileHeader): Header of the archive.
+        members   (list): Manifest entries, dicts with path, type ('file' or 'dir'), mode, mtime_ns
+                          and, for files, offset and size in the plaintext.
+    """
+    def __init__(self, path: str, password: str, crypto: CryptoManager | None = None):
+        """
+        Opens an archive, derives its key and reads the manifest.
+
+        Parameters:
+            path                 (str): Path of the archive.
+            password             (str): Password to use when deriving key used in cipher.
+            crypto (CryptoManager): Provides the cipher settings, a default one is used if None.
+        """
+        self.path = path
+        self.crypto = crypto or CryptoManager()
+        self._file = open(path, 'rb')
+        try:
+            try:
+                self.header = FileHeader.from_file(self._file)
+            except EOFError:
+                raise ValueError(path + ' is not a valid encrypted file.')
+            if not self.header.segment_size:
+                raise ValueError(path + ' is not an archive.')
+            self._key = self.crypto._file_key(password, self.header)
+            self._file.seek(0, 2)
+            self._layout = SegmentLayout.from_encrypted_size(self.header.length, self.header.segment_size,
+                                                             self.crypto.tag_size, self._file.tell())
+            self._cached: tuple[int, bytes] = (-1, b'')
+
+            plaintext_size = self._layout.plaintext_size
+            if plaintext_size < TRAILER.size:
+                raise ValueError(path + ' is not an archive.')
+            length, magic = TRAILER.unpack(self._read(plaintext_size - TRAILER.size, TRAILER.size))
+            if magic != TRAILER_MAGIC or length > plaintext_size - TRAILER.size:
+                raise ValueError(path + ' is not an archive.')
+            manifest = json.loads(self._read(plaintext_size - TRAILER.size - length, length))
+            if manifest.get('version') != MANIFEST_VERSION:
+                raise ValueError('Unsupported archive manifest version: ' + str(manifest.get('version')))
+            self.members: list[dict] = manifest['members']
+            self._by_path = {member['path']: member for member in self.members}
+        except BaseException:
+            self._file.close()
+            raise
+
+    @staticmethod
+    def create(source_dir: str, output_path: str, password: str, iterations: int, crypto: CryptoManager | None = None,
+               workers: int = 8, include: list[str] | None = None, exclude: list[str] | None = None) -> dict:
+        """
+        Packs a directory tree into an archive.
+
+        Small files are read ahead on a thread pool, in order, so opening and reading many small files overlaps
+        with encryption. The archive is written under a temporary name and moved into place once complete.
+
+        Parameters:
+            source_dir           (str): Directory to pack.
+            output_path          (str): Path of the archive.
+            password             (str): Password to use when deriving key used in cipher.
+            iterations           (int): Number of iterations for key generation, the cost N for scrypt.
+            crypto (CryptoManager): Provides the cipher and key derivation settings, it must use the segmented format.
+                                    Defaults to one with ARCHIVE_SEGMENT_SIZE segments.
+            workers              (int): Threads reading small files ahead.
+            include        (list[str]): Globs matched against file names, a file must match one of them. None matches all.
+            exclude        (list[str]): Globs matched against file names, a file matching any of them is skipped.
+
+        Returns:
+            dict: output, files, directories, bytes and errors, a list of the files that could not be read.
+        """
+        if not os.path.isdir(source_dir):
+            raise ValueError(source_dir + ' is not a directory.')
+        crypto = crypto or CryptoManager(segment_size=ARCHIVE_SEGMENT_SIZE)
+        if not crypto.segment_size:
+            raise ValueError('Archives are written in the segmented format, set a segment_size.')
+        entries = _scan(source_dir, include, exclude, os.path.abspath(output_path))
+        files = [entry for entry in entries if entry['type'] == 'file']
+        header, key = crypto._new_header(password, iterations, ARCHIVE_EXT)
+        encryptor = StreamEncryptor(crypto, header, key)
+
+        members, errors = [], []
+        offset = 0
+        window = max(1, workers) * 4
+        with AtomicOutput(output_path, fsync=crypto.fsync_output) as temp_path, open(temp_path, 'wb') as output_file, \
+             ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            readahead: deque = deque()
+
+            def _schedule(index: int) -> None:
+                if index < len(files):
+                    entry = files[index]
+                    try:
+                        entry['stat'] = os.stat(entry['source'])
+                    except OSError as e:
+                        entry['error'] = str(e)
+                    small = 'stat' in entry and entry['stat'].st_size <= READAHEAD_LIMIT
+                    readahead.append(executor.submit(_read_file, entry['source']) if small else None)
+
+            for index in range(window):
+                _schedule(index)
+            for index, entry in enumerate(files):
+                future = readahead.popleft()
+                _schedule(index + window)
+                size = 0
+                try:
+                    if 'error' in entry:
+                        raise OSError(entry['error'])
+                    if future is not None:
+                        data = future.result()
+                        output_file.write(encryptor.update(data))
+                        size = len(data)
+                    else:
+                        with open(entry['source'], 'rb') as input_file:
+                            while True:
+                                chunk = input_file.read(CHUNK_SIZE)
+                                if not chunk:
+                                    break
+                                output_file.write(encryptor.update(chunk))
+                                size += len(chunk)
+                except OSError as e:
+                    if size:
+                        # Part of the file is already in the archive, it cannot be skipped any more
+                        raise
+                    errors.append({'path': entry['path'], 'error': str(e)})
+                    continue
+                members.append({'path': entry['path'], 'type': 'file', 'offset': offset, 'size': size,
+                                'mode': stat.S_IMODE(entry['stat'].st_mode), 'mtime_ns': entry['stat'].st_mtime_ns})
+                offset += size
+
+            directories = []
+            for entry in entries:
+                if entry['type'] == 'dir':
+                    try:
+                        dir_stat = os.stat(entry['source'])
+                    except OSError:
+                        continue
+                    directories.append({'path': entry['path'], 'type': 'dir', 'mode': stat.S_IMODE(dir_stat.st_mode),
+                                        'mtime_ns': dir_stat.st_mtime_ns})
+            manifest = json.dumps({'version': MANIFEST_VERSION, 'members': directories + members},
+                                  separators=(',', ':')).encode('utf-8')
+            output_file.write(encryptor.update(manifest + TRAILER.pack(len(manifest), TRAILER_MAGIC)))
+            output_file.write(encryptor.finalize())
+        return {'output': output_path, 'files': len(members), 'directories': len(directories), 'bytes': offset,
+                'errors': errors}
+
+    def close(self) -> None:
+        """Closes the archive."""
+        self._file.close()
+
+    def __enter__(self) -> 'TreeArchive':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _segment(self, index: int) -> bytes:
+        """Returns the authenticated plaintext of a segment, the last one is cached for neighbouring small members."""
+        if self._cached[0] != index:
+            self._file.seek(self._layout.encrypted_offset(index))
+            data = self._file.read(self._layout.plain_length(index) + self.crypto.tag_size)
+            try:
+                plaintext = self.crypto._open_segment(self._key, self.header, self._layout, index, data)
+            except ValueError:
+                raise ValueError('Segment ' + str(index) + ' of ' + self.path + ' could not be authenticated, '
+                                 'the password is wrong or the archive is corrupted.')
+            self._cached = (index, plaintext)
+        return self._cached[1]
+
+    def _chunks(self, offset: int, length: int) -> Iterator[memoryview]:
+        """Yields the plaintext of a range, one piece per segment."""
+        if length <= 0:
+            return
+        for index in self._layout.segments_for_range(offset, length):
+            plaintext = self._segment(index)
+            start = max(offset - self._layout.plain_offset(index), 0)
+            end = min(offset + length - self._layout.plain_offset(index), len(plaintext))
+            yield memoryview(plaintext)[start:end]
+
+    def _read(self, offset: int, length: int) -> bytes:
+        return b''.join(self._chunks(offset, length))
+
+    def member(self, path: str) -> dict:
+        """Returns the manifest entry of a member, raises KeyError if the archive has none with this path."""
+        return self._by_path[path]
+
+    def read(self, path: str) -> bytes:
+        """Returns the content of a file member."""
+        member = self.member(path)
+        if member['type'] != 'file':
+            raise ValueError(path + ' is not a file.')
+        return self._read(member['offset'], member['size'])
+
+    @staticmethod
+    def _target(destination: str, path: str) -> str:
+        """Returns where a member is extracted, raises ValueError for paths that would leave destination."""
+        parts = path.split('/')
+        if not path or path.startswith('/') or any(part in ('', '.', '..') or os.sep in part or os.path.splitdrive(part)[0]
+                                                   for part in parts):
+            raise ValueError('Unsafe member path: ' + path)
+        return os.path.join(destination, *parts)
+
+    def extract(self, destination: str, paths: list[str] | None = None, fsync: bool = False) -> dict:
+        """
+        Extracts members, only decrypting the segments that hold them.
+
+        Parameters:
+            destination (str): Directory the tree is recreated in.
+            paths (list[str]): Members to extract, a directory selects everything below it. None extracts all.
+            fsync      (bool): Flush every extracted file to stable storage before moving it into place.
+
+        Returns:
+            dict: Counts of the extracted files and directories and the extracted bytes.
+        """
+        selected = self.members
+        if paths is not None:
+            prefixes = [path.strip('/') for path in paths]
+            selected = [member for member in self.members
+                        if any(member['path'] == prefix or member['path'].startswith(prefix + '/') for prefix in prefixes)]
+            if not selected:
+                raise KeyError('No member matches ' + ', '.join(paths))
+
+        directories = [member for member in selected if member['type'] == 'dir']
+        files = sorted((member for member in selected if member['type'] == 'file'), key=lambda member: member['offset'])
+        for member in directories:
+            os.makedirs(self._target(destination, member['path']), exist_ok=True)
+
+        size = 0
+        for member in files:
+            target = self._target(destination, member['path'])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with AtomicOutput(target, fsync=fsync) as temp_path, open(temp_path, 'wb') as output_file:
+                for chunk in self._chunks(member['offset'], member['size']):
+                    output_file.write(chunk)
+            os.chmod(target, member['mode'])
+            os.utime(target, ns=(member['mtime_ns'], member['mtime_ns']))
+            size += member['size']
+
+        # Deepest first, creating the files changed the modification time of their directories
+        for member in sorted(directories, key=lambda member: member['path'].count('/'), reverse=True):
+            target = self._target(destination, member['path'])
+            os.chmod(target, member['mode'])
+            os.utime(target, ns=(member['mtime_ns'], member['mtime_ns']))
+        return {'files': len(files), 'directories': len(directories), 'bytes': size}
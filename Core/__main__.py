@@ -0,0 +1,5 @@
+import sys
+
+from Core.CLI import main
+
+sys.exit(main())
@@ -0,0 +1,64 @@
+import os
+
+import customtkinter as ctk
+from PIL import Image
+
+from Assets.File_Icons import FILE_ICONS
+
+ICON_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Assets', 'Icons'))
+ICON_SIZE = (16, 16)
+
+
+class AssetCache:
+    """
+    Decodes every icon once and hands out shared CTkImage objects.
+
+    A CTkImage can be shown by any number of widgets, so one object per png is enough for the whole
+    application. Icons are decoded on first use, so startup only pays for the ones on screen.
+
+    Attributes:
+        icon_dir (str): Directory of the UI element icons.
+        size   (tuple): Size of the icons in pixels.
+    """
+    def __init__(self, icon_dir: str = ICON_DIR, size: tuple[int, int] = ICON_SIZE):
+        """
+        Initializes the AssetCache.
+
+        Parameters:
+            icon_dir (str): Directory of the UI element icons.
+            size   (tuple): Size of the icons in pixels.
+        """
+        self.icon_dir = icon_dir
+        self.size = size
+        self._images: dict[str, ctk.CTkImage] = {}
+
+    def image(self, path: str) -> ctk.CTkImage:
+        """
+        Returns the image of a png file, decoding it on first use.
+
+        Parameters:
+            path (str): Path of the png file.
+
+        Returns:
+            CTkImage: The shared image.
+        """
+        image = self._images.get(path)
+        if image is None:
+            with Image.open(path) as source:
+                source.load()
+                # Copy so the file handle is closed and the pixels stay in memory
+                image = self._images[path] = ctk.CTkImage(light_image=source.copy(), size=self.size)
+        return image
+
+    def icon(self, name: str) -> ctk.CTkImage:
+        """Returns the UI element icon with the given file name, e.g. 'Done.png'."""
+        return self.image(os.path.join(self.icon_dir, name))
+
+    def file_icon(self, file_path: str) -> ctk.CTkImage:
+        """Returns the icon of a file type, chosen by the extension of file_path."""
+        ext = os.path.splitext(file_path)[1].lower()
+        return self.image(FILE_ICONS.get(ext, FILE_ICONS['default']))
+
+    def __len__(self) -> int:
+        """Returns the number of decoded images."""
+        return len(self._images)
@@ -0,0 +1,172 @@
+from typing import Callable
+
+import customtkinter as ctk
+
+from Core.Progress import DONE, FAILED, PENDING, RUNNING
+from UI.AssetCache import AssetCache
+from UI.FileStore import FileStore
+
+STATE_ICONS = {PENDING: 'Trash.png', RUNNING: 'Working.png', DONE: 'Done.png', FAILED: 'X.png'}
+STATE_COLORS = {DONE: 'green', FAILED: 'red'}
+DEFAULT_ROW_HEIGHT = 32
+WHEEL_ROWS = 3
+
+
+class _FileRow:
+    """The widgets of one visible row, reused for whichever file is scrolled into it."""
+    def __init__(self, parent, row: int, on_remove: Callable[[], None]):
+        self.icon = ctk.CTkLabel(parent, text='', compound='left')
+        self.label = ctk.CTkLabel(parent, text='', compound='left', anchor='w')
+        self.progress_bar = ctk.CTkProgressBar(parent)
+        self.button = ctk.CTkButton(parent, text='', width=28, command=on_remove)
+        self.default_color = self.progress_bar.cget('progress_color')
+        self.row = row
+        # What is currently shown, so unchanged widgets are not reconfigured
+        self.file_path: str | None = None
+        self.progress = -1.0
+        self.state = -1
+
+    def widgets(self) -> tuple:
+        return self.icon, self.label, self.progress_bar, self.button
+
+    def show(self, file_path: str, progress: float, state: int, assets: AssetCache) -> None:
+        """Shows a file in the row, only touching the widgets whose content changed."""
+        if self.file_path is None:
+            self.icon.grid(row=self.row, column=0, sticky='w', padx=(10, 5), pady=2)
+            self.label.grid(row=self.row, column=1, sticky='w', padx=(0, 10), pady=2)
+            self.progress_bar.grid(row=self.row, column=2, sticky='ew', padx=(0, 5), pady=2)
+            self.button.grid(row=self.row, column=3, sticky='e', padx=(0, 10), pady=2)
+        if file_path != self.file_path:
+            self.file_path = file_path
+            try:
+                self.icon.configure(image=assets.file_icon(file_path))
+            except OSError:
+                self.icon.configure(image=None)
+            self.label.configure(text=file_path.replace('\\', '/').rsplit('/', 1)[-1])
+        if state != self.state:
+            self.state = state
+            self.button.configure(image=assets.icon(STATE_ICONS.get(state, 'Trash.png')))
+            self.progress_bar.configure(progress_color=STATE_COLORS.get(state, self.default_color))
+        if progress != self.progress:
+            self.progress = progress
+            self.progress_bar.set(progress)
+
+    def hide(self) -> None:
+        """Removes the row from the screen, its widgets are kept for reuse."""
+        if self.file_path is not None:
+            for widget in self.widgets():
+                widget.grid_remove()
+            self.file_path = None
+
+    def destroy(self) -> None:
+        for widget in self.widgets():
+            widget.destroy()
+
+
+class FileListView(ctk.CTkFrame):
+    """
+    Scrollable list of the files in a FileStore, with widgets only for the rows on screen.
+
+    A pool of rows sized to the height of the view is reused while scrolling, so selecting tens of thousands of
+    files creates no more widgets than selecting a screenful. refresh() redraws the visible rows from the store,
+    which is how progress reaches the screen: rows that are scrolled away are never updated.
+
+    Attributes:
+        store (FileStore): Files to show.
+        first      (int): Row of the store shown at the top of the view.
+    """
+    def __init__(self, master, store: FileStore, assets: AssetCache, on_remove: Callable[[str], None]):
+        """
+        Initializes the FileListView.
+
+        Parameters:
+            master              : Parent widget.
+            store    (FileStore): Files to show.
+            assets  (AssetCache): Source of the file type and state icons.
+            on_remove (Callable): Called with the path of a file whose trash button was pressed.
+        """
+        super().__init__(master)
+        self.store = store
+        self.first = 0
+        self._assets = assets
+        self._on_remove = on_remove
+        self._rows: list[_FileRow] = []
+        self._row_height = DEFAULT_ROW_HEIGHT
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+        self._body = ctk.CTkFrame(self, fg_color='transparent')
+        self._body.grid(row=0, column=0, sticky='nesw')
+        self._body.grid_columnconfigure(0, weight=0)
+        self._body.grid_columnconfigure(1, weight=0)
+        self._body.grid_columnconfigure(2, weight=1)
+        self._body.grid_columnconfigure(3, weight=0)
+        self._scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self._scrollbar.grid(row=0, column=1, sticky='ns')
+
+        self._body.bind('<Configure>', self._on_resize)
+        self._bind_wheel(self._body)
+
+    def refresh(self) -> None:
+        """Redraws the visible rows from the store."""
+        total = len(self.store)
+        self.first = max(0, min(self.first, total - len(self._rows)))
+        for offset, row in enumerate(self._rows):
+            index = self.first + offset
+            if index < total:
+                row.show(self.store[index], self.store.progress(index), self.store.state(index), self._assets)
+            else:
+                row.hide()
+        if total:
+            self._scrollbar.set(self.first / total, min(1.0, (self.first + len(self._rows)) / total))
+        else:
+            self._scrollbar.set(0.0, 1.0)
+
+    def _on_resize(self, event) -> None:
+        """Grows or shrinks the pool of rows to fill the new height."""
+        if not self._rows:
+            self._add_row()
+            # Measured once, widget scaling is known after the first row exists
+            self._row_height = max(DEFAULT_ROW_HEIGHT, self._rows[0].button.winfo_reqheight() + 4)
+        count = max(1, event.height // self._row_height)
+        while len(self._rows) < count:
+            self._add_row()
+        while len(self._rows) > count:
+            self._rows.pop().destroy()
+        self.refresh()
+
+    def _add_row(self) -> None:
+        offset = len(self._rows)
+        row = _FileRow(self._body, offset, lambda: self._remove(offset))
+        for widget in row.widgets():
+            self._bind_wheel(widget)
+        self._rows.append(row)
+
+    def _remove(self, offset: int) -> None:
+        """Handles the trash button of a visible row."""
+        file_path = self._rows[offset].file_path
+        if file_path is not None:
+            self._on_remove(file_path)
+
+    def _scroll_to(self, first: int) -> None:
+        if first != self.first:
+            self.first = first
+            self.refresh()
+
+    def _on_scrollbar(self, action: str, value: str, unit: str | None = None) -> None:
+        """Handles drags and clicks on the scrollbar."""
+        if action == 'moveto':
+            self._scroll_to(int(float(value) * len(self.store)))
+        elif action == 'scroll':
+            step = len(self._rows) if unit == 'pages' else 1
+            self._scroll_to(self.first + int(value) * step)
+
+    def _on_wheel(self, event) -> None:
+        """Scrolls by a few rows per notch of the mouse wheel."""
+        up = event.num == 4 or getattr(event, 'delta', 0) > 0
+        self._scroll_to(self.first + (-WHEEL_ROWS if up else WHEEL_ROWS))
+
+    def _bind_wheel(self, widget) -> None:
+        widget.bind('<MouseWheel>', self._on_wheel)
+        widget.bind('<Button-4>', self._on_wheel)
+        widget.bind('<Button-5>', self._on_wheel)
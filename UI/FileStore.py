@@ -0,0 +1,89 @@
+from typing import Iterable, Iterator
+
+from Core.Progress import PENDING
+
+
+class FileStore:
+    """
+    Selected files and their progress, in parallel lists indexed by row.
+
+    A dict maps every path to its row, so lookups, membership tests and removals are O(1). A removed row is
+    filled with the last row, which keeps the lists dense at the cost of moving that one file.
+    """
+    def __init__(self):
+        """Initializes an empty FileStore."""
+        self._paths: list[str] = []
+        self._progress: list[float] = []
+        self._states: list[int] = []
+        self._rows: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._paths)
+
+    def __contains__(self, file_path: str) -> bool:
+        return file_path in self._rows
+
+    def __getitem__(self, row: int) -> str:
+        return self._paths[row]
+
+    def add(self, file_path: str) -> bool:
+        """Appends a file, returns False if it was already selected."""
+        if file_path in self._rows:
+            return False
+        self._rows[file_path] = len(self._paths)
+        self._paths.append(file_path)
+        self._progress.append(0.0)
+        self._states.append(PENDING)
+        return True
+
+    def extend(self, file_paths: Iterable[str]) -> int:
+        """Appends several files, returns the number of files that were not selected yet."""
+        return sum(self.add(file_path) for file_path in file_paths)
+
+    def remove(self, file_path: str) -> None:
+        """Removes a file, the last file takes its row."""
+        row = self._rows.pop(file_path)
+        last = len(self._paths) - 1
+        if row != last:
+            moved = self._paths[last]
+            self._paths[row] = moved
+            self._progress[row] = self._progress[last]
+            self._states[row] = self._states[last]
+            self._rows[moved] = row
+        self._paths.pop()
+        self._progress.pop()
+        self._states.pop()
+
+    def row(self, file_path: str) -> int | None:
+        """Returns the row of a file, None if it is not selected."""
+        return self._rows.get(file_path)
+
+    def progress(self, row: int) -> float:
+        """Returns the progress of a row, from 0.0 to 1.0."""
+        return self._progress[row]
+
+    def state(self, row: int) -> int:
+        """Returns the state of a row, see Core.Progress."""
+        return self._states[row]
+
+    def set_progress(self, file_path: str, progress: float) -> int | None:
+        """Sets the progress of a file, returns its row or None if it was removed."""
+        row = self._rows.get(file_path)
+        if row is not None:
+            self._progress[row] = progress
+        return row
+
+    def set_state(self, file_path: str, state: int) -> int | None:
+        """Sets the state of a file, returns its row or None if it was removed."""
+        row = self._rows.get(file_path)
+        if row is not None:
+            self._states[row] = state
+        return row
+
+    def reset(self) -> None:
+        """Sets every file back to pending with no progress, before a new run."""
+        self._progress = [0.0] * len(self._paths)
+        self._states = [PENDING] * len(self._paths)
@@ -3,17 +3,23 @@ from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox
 
 import customtkinter as ctk
-from PIL import Image
 
+from Core.BatchKey import BatchKey
 from Core.CryptoManager import CryptoManager
+from Core.KeyCache import KeyCache
+from Core.Progress import DONE, FAILED, RUNNING, ProgressBoard, ProgressMonitor
+from UI.AssetCache import AssetCache
 from UI.EncryptionFrame import EncryptionFrame
 from UI.FileInfoFrame import FileInfoFrame
+from UI.FileStore import FileStore
 from UI.SettingsFrame import SettingsFrame
 
 
 class GUI(ctk.CTk):
     def __init__(self):
         super().__init__()
+        # Before the frames are built, they fetch their icons from it
+        self.assets = AssetCache()
         ctk.set_widget_scaling(1.5)
         ctk.set_window_scaling(1.5)
         ctk.set_appearance_mode("light")
@@ -25,8 +31,9 @@ class GUI(ctk.CTk):
         min_height = int(screen_height * 0.25)
         self.minsize(min_width, min_height)
 
-        self.files = []
+        self.files = FileStore()
         self.output_directory = ''
+        self.key_cache = KeyCache()
 
         self.title('Encryption Manager')
         self.grid_columnconfigure(0, weight=1)
@@ -48,49 +55,48 @@ class GUI(ctk.CTk):
             name (str): name of the icon png.
 
         Returns:
-            CTkImage: The requested icon as 16x16 CTkImage.
+            CTkImage: The requested icon as 16x16 CTkImage, decoded once and shared by all widgets.
         """
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-
-        icon_dir = os.path.abspath(os.path.join(current_dir, '..', 'Assets', 'Icons'))
-        
-        icon_path = os.path.join(icon_dir, name)
-        return ctk.CTkImage(light_image=Image.open(icon_path), size=(16,16))
+        return self.assets.icon(name)
 
 
     def on_encrypt_clicked(self):
         """Handles initiation of encryption process."""
-        self.encryption_frame.encryption_button.configure(state='disabled')
+        # Both buttons stay disabled until _poll_progress sees the batch finish
+        self._set_buttons_state('disabled')
 
         password   = self.settings_frame.get_password()
-        iterations = self.settings_frame.get_iterations()
 
         if self._check_for_encryption_errors(password):
-            self.encryption_frame.encryption_button.configure(state='normal')
+            self._set_buttons_state('normal')
             return
 
-        self._run_crypto_loop('encrypt', password, iterations)
-        self.encryption_frame.encryption_button.configure(state='normal')
+        iterations = self.settings_frame.get_iterations()
+        self._run_crypto_loop('encrypt', password, iterations, self.settings_frame.get_kdf())
 
     def on_decrypt_clicked(self):
         """Handles initiation of decryption process."""
-        self.encryption_frame.decryption_button.configure(state='disabled')
+        self._set_buttons_state('disabled')
 
         password   = self.settings_frame.get_password()
-        iterations = self.settings_frame.get_iterations()
 
         if self._check_for_decryption_errors(password):
+            self._set_buttons_state('normal')
             return
 
-        self._run_crypto_loop('decrypt', password, iterations)
+        # The key derivation function and its work factor are read from the header of every file
+        self._run_crypto_loop('decrypt', password, 0)
 
 
     def _Message(self, warnings: str):
             """Displays any and all warnings to the user."""
             warnings += '\nPress the Help button for more info.'
             messagebox.showerror(title='Error During Operation', message=warnings)
-            self.encryption_frame.encryption_button.configure(state='normal')
-            self.encryption_frame.decryption_button.configure(state='normal')
+
+    def _set_buttons_state(self, state: str) -> None:
+        """Enables or disables the encrypt and decrypt buttons, 'normal' or 'disabled'."""
+        self.encryption_frame.encryption_button.configure(state=state)
+        self.encryption_frame.decryption_button.configure(state=state)
 
     def _check_for_encryption_errors(self, password: str) -> bool:
         """Checks to make sure all required components are present for encryption."""
@@ -146,72 +152,125 @@ class GUI(ctk.CTk):
             return True
         return False
 
-    def _run_crypto_loop(self, mode: str, password: str, iterations: int) -> None:
+    def _run_crypto_loop(self, mode: str, password: str, iterations: int, kdf: str = 'pbkdf2') -> None:
         """
         Helper function that makes calls to encrypt and decrypt files.
         
         Parameters:
             mode       (str): 'encrypt' or 'decrypt' based on desired operation.
             password   (str): Password to use when deriving key used in cipher.
-            iterations (int): Number of iterations for key generation.
+            iterations (int): Number of iterations for key generation, the cost N for scrypt.
+            kdf        (str): Key derivation function of new files, see Core.KDF.
         
         """
         max_workers = min(len(self.files), os.cpu_count() or 4)
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
-
-        for file_path in self.files:
-            cm = CryptoManager()
-            self.file_frame.entry_dict[file_path].crypto = cm
+        self.crypto_mode = mode
+
+        # Derive the password key once for the whole batch, each file gets its own subkey
+        batch_key = BatchKey(password, iterations, kdf=kdf) if mode == 'encrypt' and len(self.files) > 1 else None
+
+        # Largest files first, so a huge file at the end of the list does not finish long after the others
+        ordered_files = sorted(self.files, key=self._file_size, reverse=True)
+        self.progress_board = ProgressBoard(len(ordered_files))
+        self.slot_files = ordered_files
+        self.files.reset()
+        self.file_frame.file_list.refresh()
+        for slot, file_path in enumerate(ordered_files):
+            cm = CryptoManager(key_cache=self.key_cache, kdf=kdf)
+            cm.progress_reporter = self.progress_board.reporter(slot)
+            self.progress_board.set(slot, 0, self._file_size(file_path))
 
             if mode == 'encrypt':
-                self.executor.submit(self._encrypt_task, cm, file_path, password, iterations)
+                self.executor.submit(self._encrypt_task, cm, file_path, password, iterations, batch_key)
             else:
                 self.executor.submit(self._decrypt_task, cm, file_path, password)
-        
+
+        self.progress_monitor = ProgressMonitor(self.progress_board, self._on_file_state, self._on_batch_progress)
         self._poll_progress()
 
-    def _encrypt_task(self, crypto: CryptoManager, file_path: str, password: str, iterations: int) -> None:
+    @staticmethod
+    def _file_size(file_path: str) -> int:
+        """Returns the size of a file, 0 if it cannot be read."""
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return 0
+
+    def _encrypt_task(self, crypto: CryptoManager, file_path: str, password: str, iterations: int, batch_key: BatchKey | None) -> None:
         """Worker task for encrypting files."""
-        crypto.encrypt(file_path, password, iterations, self.output_directory)
+        reporter = crypto.progress_reporter
+        reporter.start(self._file_size(file_path))
+        success = False
+        try:
+            crypto.encrypt(file_path, password, iterations, self.output_directory, batch_key)
+            success = True
+        except (ValueError, OSError):
+            pass
+        finally:
+            # Also on unexpected errors, a slot left running would keep the batch from finishing
+            reporter.finish(success)
 
     def _decrypt_task(self, crypto: CryptoManager, file_path: str, password: str) -> None:
         """
         Worker task for decrypting files.
+        Failures are reported through the progress board and shown by _on_file_state on the UI thread.
+
         Parameters:
             crypto (CryptoManager): The CryptoManager to execute the decryption.
             file_path        (str): Path to the file to be decrypted
             password         (str): Password to use when deriving key used in cipher.
         """
+        reporter = crypto.progress_reporter
+        reporter.start(self._file_size(file_path))
+        success = False
         try:
             crypto.decrypt(file_path, password, self.output_directory)
-        except ValueError:
-            self._Message('Decryption of ' + file_path + ' has failed!\n'
-            'Please verify the you are using the correct password.\n'
-            'This password should be the same one you used for encryption.')
-
-            entry = self.file_frame.entry_dict.get(file_path)
-            assert entry is not None
-            entry.button.configure(image=self.get_element_icon('X.png'))
-            entry.progress_bar.configure(progress_color='red')
+            success = True
+        except (ValueError, OSError):
+            pass
+        finally:
+            reporter.finish(success)
+
+    def _on_file_state(self, slot: int, state: int) -> None:
+        """Records the new state of a file, the list redraws it on the next poll if it is on screen."""
+        file_path = self.slot_files[slot]
+        if self.files.set_state(file_path, state) is None:
+            # Removed from the list while running
+            return
+        if state == DONE:
+            self.files.set_progress(file_path, 1.0)
+        elif state == FAILED:
+            if self.crypto_mode == 'decrypt':
+                self._Message('Decryption of ' + file_path + ' has failed!\n'
+                'Please verify the you are using the correct password.\n'
+                'This password should be the same one you used for encryption.')
+            else:
+                self._Message('Encryption of ' + file_path + ' has failed!\n')
+
+    def _on_batch_progress(self, stats: dict) -> None:
+        """Shows the overall progress, throughput and remaining time in the window title."""
+        percent = 100 * stats['done_bytes'] // stats['total_bytes'] if stats['total_bytes'] else 100
+        title = 'Encryption Manager - ' + str(percent) + '%'
+        if stats['bytes_per_s']:
+            title += ' - ' + str(round(stats['bytes_per_s'] / (1024 * 1024), 1)) + ' MB/s'
+        if stats['eta_s'] and not stats['finished']:
+            title += ' - ' + str(int(stats['eta_s'])) + 's left'
+        self.title(title)
 
     def _poll_progress(self) -> None:
         """Helper function to update progress bars for each file currently being worked on"""
-        all_done = True
-        for file_path in self.files:
-            entry = self.file_frame.entry_dict.get(file_path)
-            assert entry is not None
-            cm = entry.crypto
-            if cm and entry:
-                entry.button.configure(image=self.get_element_icon('Working.png'))
-                progress = cm.get_progress()
-                entry.progress_bar.set(progress)
-                if progress < 1.0:
-                    all_done = False
-                else:
-                    # Operation complete
-                    entry.button.configure(image=self.get_element_icon('Done.png'))
-                    entry.progress_bar.configure(progress_color='green')
-                    self.executor.shutdown()
-                    self.encryption_frame.decryption_button.configure(state='normal')
-        if not all_done:
-            self.after(100, self._poll_progress)
\ No newline at end of file
+        stats = self.progress_monitor.poll()
+        # Only running files change between state events, the others were updated by _on_file_state
+        for slot, (done, total, state) in enumerate(self.progress_monitor.snapshot):
+            if state == RUNNING and total:
+                self.files.set_progress(self.slot_files[slot], done / total)
+        # Only the rows on screen are redrawn
+        self.file_frame.file_list.refresh()
+
+        if not stats['finished']:
+            self.after(100, self._poll_progress)
+            return
+        self.executor.shutdown(wait=False)
+        self.progress_board.close()
+        self._set_buttons_state('normal')
@@ -1,14 +1,26 @@
 import customtkinter as ctk
 
+from Core.KDF import calibrate
+
+# Work factors offered for every key derivation function, iterations for PBKDF2 and the cost N for scrypt
+WORK_FACTORS = {
+    'pbkdf2': ['100000', '200000', '500000', '1000000', '2000000'],
+    'pbkdf2-sha256': ['300000', '600000', '1000000', '2000000', '5000000'],
+    'scrypt': ['16384', '32768', '65536', '131072', '262144'],
+}
+CALIBRATE_OPTION = 'Calibrate (0.5 s)'
+CALIBRATE_SECONDS = 0.5
+
 
 class SettingsFrame(ctk.CTkFrame):
-    """Frame to hold password entry box, and iterations dropdown."""
+    """Frame to hold password entry box, key derivation function and iterations dropdowns."""
     def __init__(self, master):
         super().__init__(master)
         self.master_ref = master
         self.password_entry = ctk.CTkEntry(self, placeholder_text='Password', show='*')
         self.password_icon = ctk.CTkLabel(self, text='', image=master.get_element_icon('Key.png'))
-        self.iterations_dropdown = ctk.CTkOptionMenu(self, values=['100000', '200000', '500000', '1000000', '2000000'])
+        self.kdf_dropdown = ctk.CTkOptionMenu(self, values=list(WORK_FACTORS), command=self.kdf_changed_event)
+        self.iterations_dropdown = ctk.CTkOptionMenu(self, values=WORK_FACTORS['pbkdf2'] + [CALIBRATE_OPTION])
 
         self.grid_columnconfigure(0, weight=0)
         self.grid_columnconfigure(1, weight=1)
@@ -17,12 +29,26 @@ class SettingsFrame(ctk.CTkFrame):
 
         self.password_icon.grid(row=0, column=0, pady=10, padx=(10, 5), sticky='w')
         self.password_entry.grid(row=0, column=1, pady=10, padx=(5, 10), sticky='ew')
-        self.iterations_dropdown.grid(row=1, column=0, columnspan=2, pady=10, padx=10, sticky='ew')
+        self.kdf_dropdown.grid(row=1, column=0, columnspan=2, pady=(10, 0), padx=10, sticky='ew')
+        self.iterations_dropdown.grid(row=2, column=0, columnspan=2, pady=10, padx=10, sticky='ew')
+
+    def kdf_changed_event(self, kdf: str) -> None:
+        """Offers the work factors of the chosen key derivation function."""
+        values = WORK_FACTORS[kdf]
+        self.iterations_dropdown.configure(values=values + [CALIBRATE_OPTION])
+        self.iterations_dropdown.set(values[0])
 
     def get_password(self) -> str:
         """Returns the user chosen password."""
         return self.password_entry.get()
+
+    def get_kdf(self) -> str:
+        """Returns the user chosen key derivation function."""
+        return self.kdf_dropdown.get()
     
     def get_iterations(self) -> int:
-        """Returns the user chosen number of iterations."""
-        return int(self.iterations_dropdown.get())
\ No newline at end of file
+        """Returns the user chosen number of iterations, measuring this machine if calibration is chosen."""
+        value = self.iterations_dropdown.get()
+        if value == CALIBRATE_OPTION:
+            return calibrate(self.get_kdf(), CALIBRATE_SECONDS)
+        return int(value)
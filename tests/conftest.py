@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The modules are imported as Core.X and UI.X from the repository root, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'test-password'
+ITERATIONS = 1000   # Low work factor, the tests are about formats and bookkeeping, not key strength
+
+
+@pytest.fixture
+def write_file():
+    """Returns a helper writing bytes to a path, creating its directory, and returning the path."""
+    def _write(path, data: bytes) -> str:
+        path = str(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as output_file:
+            output_file.write(data)
+        return path
+    return _write
+
+
+def read_file(path) -> bytes:
+    with open(path, 'rb') as input_file:
+        return input_file.read()
@@ -0,0 +1,150 @@
+import os
+import time
+
+import pytest
+
+from conftest import ITERATIONS, PASSWORD, read_file
+from Core.CryptoManager import CryptoManager
+from Core.IncrementalSync import MANIFEST_NAME, IncrementalSync, SyncManifest
+from Core.TreeArchive import READAHEAD_LIMIT, TreeArchive
+
+SEGMENT_SIZE = 4096
+
+
+@pytest.fixture
+def tree(tmp_path, write_file):
+    """A directory tree with empty, small, segment sized and read-ahead-exceeding files."""
+    source = tmp_path / 'tree'
+    files = {
+        'empty.txt': b'',
+        'small.txt': b'small',
+        'docs/segment.bin': os.urandom(SEGMENT_SIZE),
+        'docs/deep/large.bin': os.urandom(READAHEAD_LIMIT + 3 * SEGMENT_SIZE + 5),
+    }
+    for path, data in files.items():
+        write_file(source / path, data)
+    os.makedirs(source / 'empty_dir')
+    return source, files
+
+
+@pytest.fixture
+def crypto():
+    return CryptoManager(segment_size=SEGMENT_SIZE, fsync_output=False)
+
+
+def test_archive_round_trip(tmp_path, tree, crypto):
+    source, files = tree
+    archive_path = str(tmp_path / 'backup.tree.encrypted')
+    result = TreeArchive.create(str(source), archive_path, PASSWORD, ITERATIONS, crypto, workers=2)
+    assert result['files'] == len(files) and result['errors'] == []
+    assert result['bytes'] == sum(len(data) for data in files.values())
+    assert crypto.verify(archive_path, PASSWORD) > result['bytes']
+
+    with TreeArchive(archive_path, PASSWORD, crypto) as archive:
+        for path, data in files.items():
+            assert archive.read(path) == data
+        assert archive.member('empty_dir')['type'] == 'dir'
+        with pytest.raises(KeyError):
+            archive.member('missing.txt')
+        with pytest.raises(ValueError):
+            archive.read('docs')
+
+        counts = archive.extract(str(tmp_path / 'restored'))
+    assert counts['files'] == len(files)
+    for path, data in files.items():
+        restored = tmp_path / 'restored' / path
+        assert read_file(restored) == data
+        assert os.stat(restored).st_mtime_ns == os.stat(source / path).st_mtime_ns
+    assert os.path.isdir(tmp_path / 'restored' / 'empty_dir')
+
+
+def test_archive_extracts_selected_members(tmp_path, tree, crypto):
+    source, files = tree
+    archive_path = str(tmp_path / 'backup.tree.encrypted')
+    TreeArchive.create(str(source), archive_path, PASSWORD, ITERATIONS, crypto)
+    with TreeArchive(archive_path, PASSWORD, crypto) as archive:
+        archive.extract(str(tmp_path / 'restored'), ['docs/deep'])
+        with pytest.raises(KeyError):
+            archive.extract(str(tmp_path / 'restored'), ['nothing'])
+    assert read_file(tmp_path / 'restored' / 'docs' / 'deep' / 'large.bin') == files['docs/deep/large.bin']
+    assert not os.path.exists(tmp_path / 'restored' / 'small.txt')
+
+
+@pytest.mark.parametrize('path', ['../escape.txt', '/etc/passwd', 'a/../../b', '', 'a//b'])
+def test_archive_rejects_unsafe_member_paths(tmp_path, path):
+    with pytest.raises(ValueError):
+        TreeArchive._target(str(tmp_path), path)
+
+
+def test_archive_rejects_wrong_password_and_plain_files(tmp_path, tree, crypto, write_file):
+    source, _ = tree
+    archive_path = str(tmp_path / 'backup.tree.encrypted')
+    TreeArchive.create(str(source), archive_path, PASSWORD, ITERATIONS, crypto)
+    with pytest.raises(ValueError):
+        TreeArchive(archive_path, PASSWORD + '!', crypto)
+
+    # An ordinary segmented file is not an archive
+    path = crypto.encrypt(write_file(tmp_path / 'plain.bin', os.urandom(100)), PASSWORD, ITERATIONS, str(tmp_path))
+    with pytest.raises(ValueError):
+        TreeArchive(path, PASSWORD, crypto)
+
+
+def test_archive_requires_segmented_format(tmp_path, tree):
+    source, _ = tree
+    with pytest.raises(ValueError):
+        TreeArchive.create(str(source), str(tmp_path / 'backup.tree.encrypted'), PASSWORD, ITERATIONS, CryptoManager())
+
+
+def _sync(source, output_dir) -> IncrementalSync:
+    return IncrementalSync(str(source), str(output_dir), PASSWORD, ITERATIONS, workers=2,
+                           crypto_options={'fsync_output': False})
+
+
+def _statuses(sync: IncrementalSync) -> dict:
+    return {os.path.relpath(record['input'], sync.source_dir).replace(os.sep, '/'): record.get('sync', record['status'])
+            for record in sync.run()}
+
+
+def test_sync_only_encrypts_what_changed(tmp_path, tree):
+    source, files = tree
+    output_dir = tmp_path / 'encrypted'
+    assert set(_statuses(_sync(source, output_dir)).values()) == {'added'}
+    assert set(_statuses(_sync(source, output_dir)).values()) == {'skipped'}
+
+    time.sleep(0.01)
+    with open(source / 'small.txt', 'wb') as changed:
+        changed.write(b'other')                        # Same size, different content
+    os.utime(source / 'empty.txt')                     # Touched, content unchanged
+    os.remove(output_dir / 'docs' / 'segment.bin.encrypted')
+    os.remove(source / 'docs' / 'deep' / 'large.bin')
+    (source / 'new.txt').write_bytes(b'new')
+
+    sync = _sync(source, output_dir)
+    statuses = _statuses(sync)
+    assert statuses == {'small.txt': 'changed', 'empty.txt': 'skipped', 'docs/segment.bin': 'missing_output',
+                        'docs/deep/large.bin': 'deleted', 'new.txt': 'added'}
+    assert sync.stats['touched'] == 1
+    # The output of the removed file is gone, with the directory it left empty
+    assert not os.path.exists(output_dir / 'docs' / 'deep')
+    assert set(_statuses(_sync(source, output_dir)).values()) == {'skipped'}
+
+    crypto = CryptoManager()
+    os.makedirs(tmp_path / 'out')
+    decrypted = crypto.decrypt(str(output_dir / 'small.txt.encrypted'), PASSWORD, str(tmp_path / 'out'))
+    assert read_file(decrypted) == b'other'
+
+
+def test_sync_scan_does_not_encrypt(tmp_path, tree):
+    source, files = tree
+    sync = _sync(source, tmp_path / 'encrypted')
+    assert {check['status'] for check in sync.scan()} == {'added'}
+    assert not os.path.exists(tmp_path / 'encrypted' / MANIFEST_NAME)
+
+
+def test_sync_manifest_rejects_other_versions(tmp_path, write_file):
+    path = write_file(tmp_path / MANIFEST_NAME, b'{"version": 99, "files": {}}')
+    with pytest.raises(ValueError):
+        SyncManifest(path)
+    write_file(path, b'not json')
+    with pytest.raises(ValueError):
+        SyncManifest(path)
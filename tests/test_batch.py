@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+
+import pytest
+
+from conftest import ITERATIONS, PASSWORD, read_file
+from Core.AtomicFile import is_temp_name
+from Core.BatchJournal import BatchJournal
+from Core.BatchKey import BatchKey
+from Core.BatchRunner import AUTHENTICATION_ERROR, BatchRunner, collect_files, error_message
+from Core.KDF import KDF_SCRYPT, check_work_factor, derive_key
+from Core.KeyCache import KeyCache
+from Core.Scheduler import BatchScheduler
+
+CRYPTO_OPTIONS = {'fsync_output': False}
+
+
+@pytest.fixture
+def source_dir(tmp_path, write_file):
+    """A small tree of plaintext files, with working files of the app that must be left alone."""
+    source = tmp_path / 'source'
+    write_file(source / 'a.txt', b'a' * 1000)
+    write_file(source / 'b.csv', os.urandom(5000))
+    write_file(source / 'sub' / 'c.txt', b'c' * 10)
+    write_file(source / 'notes.checkpoint', b'user file')
+    write_file(source / 'd.bin.encrypted.checkpoint', b'{}')
+    write_file(source / '.a.txt.0123abcd.partial', b'')
+    return source
+
+
+def test_collect_files_skips_only_working_files(source_dir, tmp_path):
+    jobs = collect_files([str(source_dir)], 'encrypt', recursive=True, output_dir=str(tmp_path / 'out'))
+    names = sorted(os.path.relpath(file_path, source_dir) for file_path, _ in jobs)
+    assert names == ['a.txt', 'b.csv', 'notes.checkpoint', os.path.join('sub', 'c.txt')]
+    # The source layout is kept below the output directory
+    assert dict(jobs)[str(source_dir / 'sub' / 'c.txt')] == str(tmp_path / 'out' / 'sub')
+    assert is_temp_name('.a.txt.0123abcd.partial') and not is_temp_name('a.txt.partial')
+
+
+def test_collect_files_filters(source_dir):
+    jobs = collect_files([str(source_dir)], 'encrypt', include=['*.txt'], exclude=['a.*'])
+    assert [os.path.basename(file_path) for file_path, _ in jobs] == []
+    jobs = collect_files([str(source_dir)], 'encrypt', recursive=True, include=['*.txt'], exclude=['a.*'])
+    assert [os.path.basename(file_path) for file_path, _ in jobs] == ['c.txt']
+
+
+def test_batch_round_trip(source_dir, tmp_path):
+    encrypted_dir, decrypted_dir = tmp_path / 'encrypted', tmp_path / 'decrypted'
+    jobs = collect_files([str(source_dir)], 'encrypt', recursive=True, output_dir=str(encrypted_dir))
+    results = list(BatchRunner('encrypt', PASSWORD, ITERATIONS, 2, True, CRYPTO_OPTIONS).run(jobs))
+    assert [result['status'] for result in results] == ['ok'] * len(jobs)
+
+    jobs = collect_files([str(encrypted_dir)], 'verify', recursive=True)
+    assert all(result['status'] == 'ok' for result in BatchRunner('verify', PASSWORD).run(jobs))
+    jobs = collect_files([str(encrypted_dir)], 'decrypt', recursive=True, output_dir=str(decrypted_dir))
+    assert all(result['status'] == 'ok' for result in BatchRunner('decrypt', PASSWORD, workers=2,
+                                                                  crypto_options=CRYPTO_OPTIONS).run(jobs))
+    assert read_file(decrypted_dir / 'sub' / 'c_decrypted.txt') == b'c' * 10
+    assert read_file(decrypted_dir / 'a_decrypted.txt') == b'a' * 1000
+
+
+def test_batch_reports_wrong_password(source_dir, tmp_path):
+    jobs = collect_files([str(source_dir / 'a.txt')], 'encrypt', output_dir=str(tmp_path / 'encrypted'))
+    list(BatchRunner('encrypt', PASSWORD, ITERATIONS, crypto_options=CRYPTO_OPTIONS).run(jobs))
+    jobs = collect_files([str(tmp_path / 'encrypted')], 'decrypt', output_dir=str(tmp_path / 'decrypted'))
+    [result] = BatchRunner('decrypt', PASSWORD + '!', crypto_options=CRYPTO_OPTIONS).run(jobs)
+    assert result['status'] == 'error'
+    assert result['error'] == AUTHENTICATION_ERROR
+    assert not os.listdir(tmp_path / 'decrypted')
+
+
+def test_error_message_only_blames_authentication_for_mac_failures():
+    assert error_message('decrypt', ValueError('MAC check failed')) == AUTHENTICATION_ERROR
+    assert error_message('verify', ValueError('MAC check failed')) == AUTHENTICATION_ERROR
+    assert error_message('decrypt', ValueError('x is too short to contain an encrypted file.')).endswith('too short to contain an encrypted file.')
+    assert error_message('encrypt', ValueError('MAC check failed')) == 'MAC check failed'
+
+
+def test_journal_skips_finished_files_on_rerun(source_dir, tmp_path):
+    journal_path = str(tmp_path / 'batch.journal')
+    output_dir = str(tmp_path / 'encrypted')
+    jobs = collect_files([str(source_dir)], 'encrypt', output_dir=output_dir)
+
+    def _statuses() -> dict:
+        runner = BatchRunner('encrypt', PASSWORD, ITERATIONS, 2, True, CRYPTO_OPTIONS, journal_path=journal_path)
+        return {os.path.basename(result['input']): result['status'] for result in runner.run(jobs)}
+
+    assert set(_statuses().values()) == {'ok'}
+    assert set(_statuses().values()) == {'skipped'}
+
+    # A changed input and a deleted output are processed again, the others are still skipped
+    time.sleep(0.01)
+    with open(source_dir / 'a.txt', 'ab') as input_file:
+        input_file.write(b'more')
+    os.remove(os.path.join(output_dir, 'b.csv.encrypted'))
+    statuses = _statuses()
+    assert statuses.pop('a.txt') == 'ok'
+    assert statuses.pop('b.csv') == 'ok'
+    assert set(statuses.values()) == {'skipped'}
+
+
+def test_journal_entries_are_per_output_directory(source_dir, tmp_path):
+    journal_path = str(tmp_path / 'batch.journal')
+    jobs = collect_files([str(source_dir / 'a.txt')], 'encrypt', output_dir=str(tmp_path / 'first'))
+    runner = BatchRunner('encrypt', PASSWORD, ITERATIONS, crypto_options=CRYPTO_OPTIONS, journal_path=journal_path)
+    assert [result['status'] for result in runner.run(jobs)] == ['ok']
+
+    jobs = collect_files([str(source_dir / 'a.txt')], 'encrypt', output_dir=str(tmp_path / 'second'))
+    runner = BatchRunner('encrypt', PASSWORD, ITERATIONS, crypto_options=CRYPTO_OPTIONS, journal_path=journal_path)
+    assert [result['status'] for result in runner.run(jobs)] == ['ok']
+    assert os.path.exists(tmp_path / 'second' / 'a.txt.encrypted')
+
+
+def test_journal_ignores_torn_last_line(tmp_path, write_file):
+    source = write_file(tmp_path / 'a.txt', b'data')
+    output = write_file(tmp_path / 'out' / 'a.txt.encrypted', b'encrypted')
+    journal = BatchJournal(str(tmp_path / 'batch.journal'))
+    journal.record('encrypt', source, output)
+    journal.close()
+    with open(tmp_path / 'batch.journal', 'a', encoding='utf-8') as journal_file:
+        journal_file.write('{"mode": "encrypt", "inp')
+
+    journal = BatchJournal(str(tmp_path / 'batch.journal'))
+    assert journal.completed('encrypt', source, str(tmp_path / 'out'))['output'] == os.path.abspath(output)
+    assert journal.completed('decrypt', source, str(tmp_path / 'out')) is None
+    assert journal.completed('encrypt', source, str(tmp_path / 'elsewhere')) is None
+    journal.close()
+
+
+def test_scheduler_runs_largest_first_and_returns_every_result():
+    started = []
+    scheduler = BatchScheduler('thread', workers=1)
+    results = list(scheduler.run(lambda job: started.append(job) or job * 2, [1, 5, 3], [10, 50, 30]))
+    assert started == [5, 3, 1]
+    assert sorted(results) == [2, 6, 10]
+
+
+def test_scheduler_caps_bytes_in_flight():
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def _job(size: int) -> int:
+        with lock:
+            running[0] += size
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= size
+        return size
+
+    scheduler = BatchScheduler('thread', workers=8, max_inflight_bytes=100)
+    sizes = [60, 40, 40, 30, 20]
+    assert sorted(scheduler.run(_job, sizes, sizes)) == sorted(sizes)
+    assert 60 <= peak[0] <= 100
+    # A job larger than the cap still runs, on its own
+    peak[0] = 0
+    assert sorted(scheduler.run(_job, [150, 20], [150, 20])) == [20, 150]
+    assert peak[0] == 150
+
+
+def test_scheduler_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        BatchScheduler('fiber')
+
+
+def test_key_cache_derives_once_per_key():
+    cache = KeyCache(max_entries=2)
+    calls = []
+
+    def _derive(value: bytes):
+        return lambda: calls.append(value) or value * 32
+
+    assert cache.get_or_derive(PASSWORD, b'salt-1', ITERATIONS, _derive(b'1')) == b'1' * 32
+    assert cache.get_or_derive(PASSWORD, b'salt-1', ITERATIONS, _derive(b'x')) == b'1' * 32
+    # Any part of the derivation changes the entry
+    assert cache.get_or_derive(PASSWORD, b'salt-1', ITERATIONS + 1, _derive(b'2')) == b'2' * 32
+    assert cache.get_or_derive(PASSWORD, b'salt-1', ITERATIONS, _derive(b'3'), kdf=KDF_SCRYPT) == b'3' * 32
+    assert calls == [b'1', b'2', b'3']
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'entries': 2}
+    # The least recently used entry was evicted
+    assert cache.get_or_derive(PASSWORD, b'salt-1', ITERATIONS, _derive(b'4')) == b'4' * 32
+    cache.clear()
+    assert cache.stats()['entries'] == 0
+
+
+def test_key_cache_concurrent_lookups_share_one_derivation():
+    cache = KeyCache()
+    calls = []
+    release = threading.Event()
+
+    def _derive() -> bytes:
+        calls.append(1)
+        release.wait(5)
+        return b'k' * 32
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_derive(PASSWORD, b'salt', ITERATIONS, _derive)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == [b'k' * 32] * 8
+
+
+def test_key_cache_rejects_empty_size():
+    with pytest.raises(ValueError):
+        KeyCache(max_entries=0)
+
+
+def test_batch_key_gives_every_file_its_own_key():
+    batch_key = BatchKey(PASSWORD, ITERATIONS)
+    assert batch_key.derive_file_key(b'a' * 16) != batch_key.derive_file_key(b'b' * 16)
+    assert batch_key.derive_file_key(b'a' * 16) == batch_key.derive_file_key(b'a' * 16)
+    assert batch_key.master_key() == derive_key(PASSWORD, batch_key.salt, ITERATIONS)
+
+
+@pytest.mark.parametrize('kdf, work_factor', [('scrypt', 3), ('scrypt', 1), ('scrypt', 2 ** 21), ('pbkdf2', 0), ('pbkdf2-sha256', -5)])
+def test_invalid_work_factors_are_rejected(kdf, work_factor):
+    with pytest.raises(ValueError):
+        check_work_factor(kdf, work_factor)
+
+
+@pytest.mark.parametrize('kdf, work_factor', [('scrypt', 2), ('scrypt', 2 ** 14), ('pbkdf2', 1), ('pbkdf2-sha256', 600000)])
+def test_valid_work_factors_are_accepted(kdf, work_factor):
+    check_work_factor(kdf, work_factor)
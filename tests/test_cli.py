@@ -0,0 +1,134 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+from conftest import PASSWORD, read_file
+from Core.CLI import main
+
+
+@pytest.fixture(autouse=True)
+def password(monkeypatch):
+    monkeypatch.setenv('TEST_PASSWORD', PASSWORD)
+
+
+def _run(capsys, *argv) -> tuple[int, list[dict]]:
+    """Runs the CLI and returns its exit code and the JSON records it wrote to stdout."""
+    code = main([*argv, '--password-env', 'TEST_PASSWORD'])
+    output = capsys.readouterr().out
+    return code, [json.loads(line) for line in output.splitlines() if line.strip()]
+
+
+@pytest.fixture
+def source_dir(tmp_path, write_file):
+    source = tmp_path / 'source'
+    write_file(source / 'a.txt', b'a' * 1000)
+    write_file(source / 'sub' / 'b.txt', b'b' * 10)
+    return source
+
+
+def test_encrypt_verify_decrypt(tmp_path, capsys, source_dir):
+    encrypted, decrypted = str(tmp_path / 'encrypted'), str(tmp_path / 'decrypted')
+    code, records = _run(capsys, 'encrypt', str(source_dir), '-r', '-o', encrypted, '-n', '1000', '--no-fsync')
+    assert code == 0
+    assert records[-1]['summary'] and records[-1]['files'] == 2 and records[-1]['failed'] == 0
+
+    code, records = _run(capsys, 'verify', encrypted, '-r')
+    assert code == 0
+    assert records[-1]['verified'] == 2 and records[-1]['plaintext_bytes'] == 1010
+
+    code, records = _run(capsys, 'decrypt', encrypted, '-r', '-o', decrypted)
+    assert code == 0
+    assert read_file(os.path.join(decrypted, 'sub', 'b_decrypted.txt')) == b'b' * 10
+
+
+def test_missing_input_fails(tmp_path, capsys, source_dir):
+    missing = str(tmp_path / 'missing.txt')
+    code, records = _run(capsys, 'encrypt', str(source_dir / 'a.txt'), missing, '-n', '1000', '--no-fsync')
+    assert code == 1
+    assert [record['input'] for record in records if record.get('status') == 'error'] == [missing]
+    assert records[-1]['files'] == 2 and records[-1]['failed'] == 1
+
+
+def test_wrong_password_fails(tmp_path, capsys, source_dir, monkeypatch):
+    _run(capsys, 'encrypt', str(source_dir / 'a.txt'), '-n', '1000', '--no-fsync')
+    monkeypatch.setenv('TEST_PASSWORD', PASSWORD + '!')
+    code, records = _run(capsys, 'verify', str(source_dir / 'a.txt.encrypted'))
+    assert code == 1
+    assert records[-1]['failed_files'] == [str(source_dir / 'a.txt.encrypted')]
+
+
+def test_journal_skips_finished_files(tmp_path, capsys, source_dir):
+    arguments = ['encrypt', str(source_dir), '-r', '-o', str(tmp_path / 'encrypted'), '-n', '1000', '--no-fsync',
+                 '--journal', str(tmp_path / 'batch.journal')]
+    assert _run(capsys, *arguments)[1][-1]['skipped'] == 0
+    code, records = _run(capsys, *arguments)
+    assert code == 0
+    assert records[-1]['skipped'] == 2
+
+
+@pytest.mark.parametrize('arguments', [['--kdf', 'scrypt', '-n', '1000'], ['--kdf', 'scrypt', '-n', '1'],
+                                       ['-n', '0']])
+def test_invalid_work_factor_is_a_usage_error(capsys, source_dir, arguments):
+    with pytest.raises(SystemExit) as exit_info:
+        main(['encrypt', str(source_dir), *arguments, '--password-env', 'TEST_PASSWORD'])
+    assert exit_info.value.code == 2
+    assert 'iterations' in capsys.readouterr().err
+
+
+def test_pack_list_unpack(tmp_path, capsys, source_dir):
+    archive = str(tmp_path / 'backup.tree.encrypted')
+    code, records = _run(capsys, 'pack', str(source_dir), '-o', archive, '-n', '1000', '--no-fsync')
+    assert code == 0
+    code, records = _run(capsys, 'list', archive)
+    assert {record['path'] for record in records if 'path' in record} >= {'a.txt', 'sub/b.txt'}
+    code, records = _run(capsys, 'unpack', archive, '-m', 'sub', '-o', str(tmp_path / 'restored'))
+    assert code == 0
+    assert read_file(tmp_path / 'restored' / 'sub' / 'b.txt') == b'b' * 10
+    assert not os.path.exists(tmp_path / 'restored' / 'a.txt')
+
+
+def test_unpack_of_a_missing_archive_is_reported(tmp_path, capsys):
+    code, records = _run(capsys, 'unpack', str(tmp_path / 'missing.tree.encrypted'), '-o', str(tmp_path / 'restored'))
+    assert code == 1
+    assert records[-1]['status'] == 'error'
+
+
+def test_sync(tmp_path, capsys, source_dir):
+    arguments = ['sync', str(source_dir), '-o', str(tmp_path / 'encrypted'), '-n', '1000', '--no-fsync']
+    assert _run(capsys, *arguments)[0] == 0
+    code, records = _run(capsys, *arguments)
+    assert code == 0
+    assert {record['status'] for record in records if 'input' in record} == {'skipped'}
+
+
+class _FailingInput:
+    """Stands in for sys.stdin, reading fails like it does on a broken device."""
+    class buffer:
+        @staticmethod
+        def read(size: int = -1) -> bytes:
+            raise OSError(5, 'Input/output error')
+
+
+def test_stdin_read_error_is_reported(capsys, monkeypatch):
+    monkeypatch.setattr(sys, 'stdin', _FailingInput())
+    assert main(['encrypt', '-', '-n', '1000', '--password-env', 'TEST_PASSWORD']) == 1
+    record = json.loads(capsys.readouterr().err.splitlines()[-1])
+    assert record['status'] == 'error' and 'Input/output error' in record['error']
+
+
+def test_stdin_round_trip(capsysbinary, monkeypatch):
+    class _Input:
+        def __init__(self, data: bytes):
+            self.buffer = io.BytesIO(data)
+
+    monkeypatch.setattr(sys, 'stdin', _Input(b'x' * 100000))
+    assert main(['encrypt', '-', '-n', '1000', '--compress', 'zlib', '--password-env', 'TEST_PASSWORD']) == 0
+    captured = capsysbinary.readouterr()
+    assert json.loads(captured.err.splitlines()[-1])['codec'] == 'zlib'
+
+    monkeypatch.setattr(sys, 'stdin', _Input(captured.out))
+    assert main(['decrypt', '-', '--password-env', 'TEST_PASSWORD']) == 0
+    assert capsysbinary.readouterr().out == b'x' * 100000
@@ -0,0 +1,120 @@
+import asyncio
+import io
+import os
+import zlib
+
+import pytest
+
+from conftest import ITERATIONS, PASSWORD, read_file
+from Core.AsyncCryptoManager import AsyncCryptoManager
+from Core.Codecs import DECOMPRESS_LIMIT, codec_names, get_codec, is_compressible
+from Core.CryptoManager import CryptoManager
+from Core.FileHeader import FileHeader
+from Core.StreamCipher import StreamDecryptor
+
+# Compresses to a few kilobytes and expands to far more than one decompression step
+HIGHLY_COMPRESSIBLE = os.urandom(1000) + bytes(8 * 1024 * 1024)
+
+
+def _compress(codec_name: str, data: bytes) -> bytes:
+    compressor = get_codec(codec_name).compressor()
+    return compressor.compress(data) + compressor.flush()
+
+
+@pytest.mark.parametrize('codec_name', codec_names())
+@pytest.mark.parametrize('data', [b'', b'a', os.urandom(100000), HIGHLY_COMPRESSIBLE])
+def test_codec_round_trip_is_bounded(codec_name, data):
+    decompressor = get_codec(codec_name).decompressor()
+    chunks = list(decompressor.decompress(_compress(codec_name, data)))
+    decompressor.finish()
+    assert b''.join(chunks) == data
+    assert all(len(chunk) <= DECOMPRESS_LIMIT for chunk in chunks)
+
+
+@pytest.mark.parametrize('codec_name', codec_names())
+def test_codec_rejects_corrupted_and_truncated_data(codec_name):
+    compressed = _compress(codec_name, os.urandom(1000) * 20)
+    with pytest.raises(ValueError):
+        list(get_codec(codec_name).decompressor().decompress(b'not compressed data' * 10))
+    decompressor = get_codec(codec_name).decompressor()
+    list(decompressor.decompress(compressed[:len(compressed) // 2]))
+    with pytest.raises(ValueError):
+        decompressor.finish()
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        get_codec('brotli')
+    with pytest.raises(ValueError):
+        get_codec(200)
+
+
+@pytest.mark.parametrize('codec_name', codec_names())
+@pytest.mark.parametrize('io_backend', ['stream', 'mmap', 'pipeline'])
+def test_compressed_file_round_trip(tmp_path, write_file, codec_name, io_backend):
+    crypto = CryptoManager(compression=codec_name, io_backend=io_backend, fsync_output=False)
+    source = write_file(tmp_path / 'notes.txt', HIGHLY_COMPRESSIBLE)
+    path = crypto.encrypt(source, PASSWORD, ITERATIONS, str(tmp_path))
+
+    assert crypto.codec_used == codec_name
+    assert crypto.read_header(path).codec == get_codec(codec_name).codec_id
+    assert os.path.getsize(path) < len(HIGHLY_COMPRESSIBLE) // 10
+    os.makedirs(tmp_path / 'out')
+    output_path = crypto.decrypt(path, PASSWORD, str(tmp_path / 'out'))
+    assert read_file(output_path) == HIGHLY_COMPRESSIBLE
+
+
+def test_incompressible_file_is_stored_as_is(tmp_path, write_file):
+    crypto = CryptoManager(compression='zlib', fsync_output=False)
+    source = write_file(tmp_path / 'random.bin', os.urandom(200000))
+    assert not is_compressible(source)
+    path = crypto.encrypt(source, PASSWORD, ITERATIONS, str(tmp_path))
+    assert crypto.codec_used is None
+    assert crypto.read_header(path).codec == 0
+
+
+@pytest.mark.parametrize('codec_name', codec_names())
+def test_stream_decryption_output_is_bounded(codec_name):
+    crypto = CryptoManager(compression=codec_name)
+    encrypted = io.BytesIO()
+    crypto.encrypt_stream(io.BytesIO(HIGHLY_COMPRESSIBLE), encrypted, PASSWORD, ITERATIONS)
+
+    decryptor = StreamDecryptor(crypto)
+    decryptor.update(encrypted.getvalue())
+    decryptor.start(crypto._file_key(PASSWORD, decryptor.header))
+    chunks = list(decryptor.chunks(b''))
+    assert all(len(chunk) <= DECOMPRESS_LIMIT for chunk in chunks)
+    assert b''.join(chunks) + decryptor.finalize() == HIGHLY_COMPRESSIBLE
+
+    decrypted = io.BytesIO()
+    crypto.decrypt_stream(io.BytesIO(encrypted.getvalue()), decrypted, PASSWORD)
+    assert decrypted.getvalue() == HIGHLY_COMPRESSIBLE
+    assert crypto.decrypt_bytes(encrypted.getvalue(), PASSWORD) == HIGHLY_COMPRESSIBLE
+
+
+def test_stream_decryption_rejects_tampered_compressed_data():
+    crypto = CryptoManager(compression='zlib')
+    output = io.BytesIO()
+    crypto.encrypt_stream(io.BytesIO(HIGHLY_COMPRESSIBLE), output, PASSWORD, ITERATIONS)
+    encrypted = bytearray(output.getvalue())
+    encrypted[-1] ^= 0x01
+    with pytest.raises(ValueError):
+        crypto.decrypt_stream(io.BytesIO(bytes(encrypted)), io.BytesIO(), PASSWORD)
+
+
+@pytest.mark.parametrize('codec_name', codec_names())
+def test_async_encryption_compresses_like_the_sync_path(codec_name):
+    crypto = CryptoManager(compression=codec_name)
+    manager = AsyncCryptoManager(crypto)
+    encrypted = asyncio.run(manager.encrypt_bytes(HIGHLY_COMPRESSIBLE, PASSWORD, ITERATIONS, '.txt'))
+
+    assert FileHeader.from_bytes(encrypted).codec == get_codec(codec_name).codec_id
+    assert len(encrypted) < len(HIGHLY_COMPRESSIBLE) // 10
+    assert asyncio.run(manager.decrypt_bytes(encrypted, PASSWORD)) == HIGHLY_COMPRESSIBLE
+    assert crypto.decrypt_bytes(encrypted, PASSWORD) == HIGHLY_COMPRESSIBLE
+
+
+def test_zlib_stream_from_other_tools_decompresses():
+    """The zlib codec is the plain zlib format, so data compressed elsewhere reads back."""
+    decompressor = get_codec('zlib').decompressor()
+    assert b''.join(decompressor.decompress(zlib.compress(b'hello' * 1000))) == b'hello' * 1000
@@ -0,0 +1,272 @@
+import json
+import os
+import random
+
+import pytest
+from Crypto.Cipher import AES
+
+from conftest import ITERATIONS, PASSWORD, read_file
+from Core.Checkpoint import JOURNAL_SUFFIX
+from Core.CryptoManager import CryptoManager
+from Core.FileHeader import OPT_SEGMENT_SIZE, FileHeader
+
+SEGMENT_SIZE = 4096
+
+
+def _flip(data: bytes, position: int) -> bytes:
+    changed = bytearray(data)
+    changed[position] ^= 0x01
+    return bytes(changed)
+
+
+def _decrypt(crypto: CryptoManager, path: str, output_dir) -> bytes:
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = crypto.decrypt(path, PASSWORD, str(output_dir))
+    data = read_file(output_path)
+    os.remove(output_path)
+    return data
+
+
+@pytest.fixture
+def rng():
+    return random.Random(1)
+
+
+def test_legacy_v1_file_decrypts(tmp_path, write_file, rng):
+    """A version 1 file laid out by hand the way the first release wrote it."""
+    crypto = CryptoManager(fsync_output=False)
+    plaintext = rng.randbytes(10000)
+    header = FileHeader(rng.randbytes(32), rng.randbytes(12), ITERATIONS, '.txt', version=1)
+    key = crypto._derive_key(PASSWORD, header.salt, header.iterations)
+    ciphertext, tag = AES.new(key, AES.MODE_GCM, header.nonce).encrypt_and_digest(plaintext)
+    path = write_file(tmp_path / 'legacy.txt.encrypted', header.to_bytes() + ciphertext + tag)
+
+    assert crypto.read_header(path).version == 1
+    assert crypto.verify(path, PASSWORD) == len(plaintext)
+    assert _decrypt(crypto, path, tmp_path) == plaintext
+
+    write_file(path, _flip(header.to_bytes() + ciphertext + tag, header.length + 5))
+    with pytest.raises(ValueError):
+        crypto.verify(path, PASSWORD)
+
+
+@pytest.mark.parametrize('io_backend', ['stream', 'mmap', 'pipeline'])
+@pytest.mark.parametrize('kdf, version', [('pbkdf2', 1), ('pbkdf2-sha256', 2)])
+@pytest.mark.parametrize('size', [0, 1, 1023, 1024, 5000])
+def test_single_stream_round_trip(tmp_path, write_file, rng, io_backend, kdf, version, size):
+    """Headers without options are still written as version 1, so older releases can read them."""
+    crypto = CryptoManager(io_backend=io_backend, buffer_size=1024, kdf=kdf, fsync_output=False)
+    plaintext = rng.randbytes(size)
+    path = crypto.encrypt(write_file(tmp_path / 'stream.bin', plaintext), PASSWORD, ITERATIONS, str(tmp_path))
+
+    assert crypto.read_header(path).version == version
+    assert crypto.verify(path, PASSWORD) == size
+    assert _decrypt(crypto, path, tmp_path) == plaintext
+
+
+@pytest.fixture
+def v2_file(tmp_path, write_file, rng):
+    crypto = CryptoManager(kdf='pbkdf2-sha256', fsync_output=False)
+    path = crypto.encrypt(write_file(tmp_path / 'stream.txt', rng.randbytes(5000)), PASSWORD, ITERATIONS, str(tmp_path))
+    return path, read_file(path), crypto.read_header(path)
+
+
+@pytest.mark.parametrize('io_backend', ['stream', 'mmap', 'pipeline'])
+def test_single_stream_rejects_tampering(tmp_path, write_file, v2_file, io_backend):
+    path, encrypted, header = v2_file
+    crypto = CryptoManager(io_backend=io_backend, fsync_output=False)
+    os.makedirs(tmp_path / 'out')
+    tampered = {
+        # The last byte of the extension, part of the authenticated version 2 header
+        'header': _flip(encrypted, header.length - 1),
+        'body': _flip(encrypted, header.length + 10),
+        'tag': _flip(encrypted, len(encrypted) - 1),
+    }
+    for data in tampered.values():
+        write_file(path, data)
+        with pytest.raises(ValueError):
+            crypto.verify(path, PASSWORD)
+        with pytest.raises(ValueError):
+            crypto.decrypt(path, PASSWORD, str(tmp_path / 'out'))
+    assert not os.path.exists(tmp_path / 'out' / 'stream_decrypted.txt')
+
+
+@pytest.mark.parametrize('io_backend', ['stream', 'mmap', 'pipeline'])
+@pytest.mark.parametrize('keep', [-1, 'tag', 'header'])
+def test_single_stream_rejects_truncation(tmp_path, write_file, v2_file, io_backend, keep):
+    path, encrypted, header = v2_file
+    length = {'tag': header.length + 3, 'header': header.length - 1}.get(keep, len(encrypted) - 1)
+    write_file(path, encrypted[:length])
+    crypto = CryptoManager(io_backend=io_backend, fsync_output=False)
+    with pytest.raises(ValueError):
+        crypto.decrypt(path, PASSWORD, str(tmp_path))
+    with pytest.raises(ValueError):
+        crypto.verify(path, PASSWORD)
+
+
+def test_truncated_file_is_reported_as_too_short(tmp_path, write_file, v2_file):
+    path, encrypted, header = v2_file
+    write_file(path, encrypted[:header.length + 3])
+    for io_backend in ('stream', 'mmap', 'pipeline'):
+        with pytest.raises(ValueError, match='too short'):
+            CryptoManager(io_backend=io_backend, fsync_output=False).decrypt(path, PASSWORD, str(tmp_path))
+
+
+def test_wrong_password_is_rejected(tmp_path, v2_file):
+    path, _, _ = v2_file
+    with pytest.raises(ValueError):
+        CryptoManager(fsync_output=False).decrypt(path, PASSWORD + '!', str(tmp_path))
+
+
+def test_pipeline_reports_no_bottleneck_for_empty_input(tmp_path, write_file):
+    crypto = CryptoManager(io_backend='pipeline', fsync_output=False)
+    crypto.encrypt(write_file(tmp_path / 'empty.bin', b''), PASSWORD, ITERATIONS, str(tmp_path))
+    assert crypto.pipeline_stats['chunks'] == 0
+    assert crypto.pipeline_stats['bottleneck'] is None
+
+
+@pytest.mark.parametrize('segment_workers', [1, 4])
+@pytest.mark.parametrize('size', [0, 1, SEGMENT_SIZE - 1, SEGMENT_SIZE, SEGMENT_SIZE + 1, 3 * SEGMENT_SIZE, 5 * SEGMENT_SIZE + 17])
+def test_segmented_round_trip(tmp_path, write_file, rng, segment_workers, size):
+    crypto = CryptoManager(segment_size=SEGMENT_SIZE, segment_workers=segment_workers, fsync_output=False)
+    plaintext = rng.randbytes(size)
+    path = crypto.encrypt(write_file(tmp_path / 'segmented.bin', plaintext), PASSWORD, ITERATIONS, str(tmp_path))
+
+    assert crypto.read_header(path).segment_size == SEGMENT_SIZE
+    assert crypto.verify(path, PASSWORD) == size
+    assert _decrypt(crypto, path, tmp_path) == plaintext
+
+
+@pytest.fixture
+def segmented_file(tmp_path, write_file, rng):
+    crypto = CryptoManager(segment_size=SEGMENT_SIZE, fsync_output=False)
+    plaintext = rng.randbytes(5 * SEGMENT_SIZE + 17)
+    path = crypto.encrypt(write_file(tmp_path / 'segmented.bin', plaintext), PASSWORD, ITERATIONS, str(tmp_path))
+    return crypto, path, plaintext
+
+
+def test_decrypt_range(segmented_file, rng):
+    crypto, path, plaintext = segmented_file
+    for _ in range(20):
+        offset = rng.randrange(len(plaintext) + 10)
+        length = rng.randrange(2 * SEGMENT_SIZE)
+        assert crypto.decrypt_range(path, PASSWORD, offset, length) == plaintext[offset:offset + length]
+    with pytest.raises(ValueError):
+        crypto.decrypt_range(path, PASSWORD, -1, 10)
+
+
+def test_segmented_rejects_tampering(write_file, segmented_file):
+    crypto, path, plaintext = segmented_file
+    encrypted = read_file(path)
+    header = crypto.read_header(path)
+    stride = SEGMENT_SIZE + crypto.tag_size
+
+    write_file(path, _flip(encrypted, header.length + 2 * stride + 100))
+    with pytest.raises(ValueError):
+        crypto.verify(path, PASSWORD)
+    with pytest.raises(ValueError):
+        crypto.decrypt_range(path, PASSWORD, 2 * SEGMENT_SIZE, 10)
+    # Segments are authenticated on their own, the untouched ones still read
+    assert crypto.decrypt_range(path, PASSWORD, 0, 10) == plaintext[:10]
+
+    segments = [encrypted[header.length + index * stride:header.length + (index + 1) * stride] for index in range(2)]
+    for data in (encrypted[:header.length + 5 * stride],          # Last segment dropped
+                 encrypted[:header.length + 2 * stride + 50],     # Cut inside a segment
+                 # Swapped segments, the index is part of every nonce
+                 encrypted[:header.length] + segments[1] + segments[0] + encrypted[header.length + 2 * stride:]):
+        write_file(path, data)
+        with pytest.raises(ValueError):
+            crypto.verify(path, PASSWORD)
+
+
+def test_forged_segment_size_is_rejected(write_file, segmented_file):
+    """The segment size is read before the header is authenticated, a forged one must not be allocated."""
+    crypto, path, _ = segmented_file
+    encrypted = read_file(path)
+    header = crypto.read_header(path)
+    options = dict(header.options)
+    options[OPT_SEGMENT_SIZE] = (2 ** 31).to_bytes(4, 'big')
+    forged = FileHeader(header.salt, header.nonce, header.iterations, header.file_ext, header.version, options)
+    write_file(path, forged.to_bytes() + encrypted[header.length:])
+    for check in (crypto.verify, lambda path, password: crypto.decrypt(path, password, os.path.dirname(path))):
+        with pytest.raises(ValueError):
+            check(path, PASSWORD)
+    with pytest.raises(ValueError):
+        CryptoManager(segment_size=2 ** 31)
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class _InterruptAfter:
+    """Progress reporter that interrupts an encryption once enough bytes were processed."""
+    def __init__(self, limit: int):
+        self.limit = limit
+
+    def update(self, done: int, total: int) -> None:
+        if done >= self.limit:
+            raise _Interrupted()
+
+
+class _Recorder:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, done: int, total: int) -> None:
+        self.updates.append(done)
+
+
+def _interrupted_encryption(tmp_path, write_file, plaintext: bytes) -> tuple[str, str, dict]:
+    """Starts a resumable encryption, interrupts it halfway and returns the input, the output and the journal."""
+    source = write_file(tmp_path / 'resume.bin', plaintext)
+    crypto = CryptoManager(segment_size=SEGMENT_SIZE, resumable=True, checkpoint_interval=0, fsync_output=False)
+    crypto.progress_reporter = _InterruptAfter(len(plaintext) // 2)
+    with pytest.raises(_Interrupted):
+        crypto.encrypt(source, PASSWORD, ITERATIONS, str(tmp_path))
+    output_path = str(tmp_path / 'resume.bin.encrypted')
+    assert not os.path.exists(output_path)
+    with open(output_path + JOURNAL_SUFFIX, 'r', encoding='utf-8') as journal_file:
+        journal = json.load(journal_file)
+    assert journal['segments'] > 0
+    return source, output_path, journal
+
+
+def test_resume_continues_from_checkpoint(tmp_path, write_file, rng):
+    plaintext = rng.randbytes(20 * SEGMENT_SIZE + 123)
+    source, output_path, journal = _interrupted_encryption(tmp_path, write_file, plaintext)
+
+    crypto = CryptoManager(segment_size=SEGMENT_SIZE, resumable=True, checkpoint_interval=0, fsync_output=False)
+    crypto.progress_reporter = _Recorder()
+    crypto.encrypt(source, PASSWORD, ITERATIONS, str(tmp_path))
+
+    header = bytes.fromhex(journal['header'])
+    assert read_file(output_path)[:len(header)] == header
+    assert crypto.progress_reporter.updates[0] >= journal['segments'] * SEGMENT_SIZE
+    assert not os.path.exists(output_path + JOURNAL_SUFFIX)
+    assert _decrypt(crypto, output_path, tmp_path / 'out') == plaintext
+
+
+def test_resume_starts_over_when_input_was_rewritten(tmp_path, write_file, rng):
+    """Same size and modification time, different content: resuming would reuse the nonces of the old plaintext."""
+    plaintext = rng.randbytes(20 * SEGMENT_SIZE + 123)
+    source, output_path, journal = _interrupted_encryption(tmp_path, write_file, plaintext)
+    stat = os.stat(source)
+    rewritten = rng.randbytes(len(plaintext))
+    write_file(source, rewritten)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    crypto = CryptoManager(segment_size=SEGMENT_SIZE, resumable=True, checkpoint_interval=0, fsync_output=False)
+    crypto.encrypt(source, PASSWORD, ITERATIONS, str(tmp_path))
+
+    header = bytes.fromhex(journal['header'])
+    assert read_file(output_path)[:len(header)] != header
+    assert _decrypt(crypto, output_path, tmp_path / 'out') == rewritten
+
+
+def test_resume_with_wrong_password_is_rejected(tmp_path, write_file, rng):
+    plaintext = rng.randbytes(20 * SEGMENT_SIZE)
+    source, _, _ = _interrupted_encryption(tmp_path, write_file, plaintext)
+    crypto = CryptoManager(segment_size=SEGMENT_SIZE, resumable=True, checkpoint_interval=0, fsync_output=False)
+    with pytest.raises(ValueError):
+        crypto.encrypt(source, PASSWORD + '!', ITERATIONS, str(tmp_path))